@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark bzip2 compression and decompression of a summary: bz2.compress() against parallel_bz2_compress(), and
+bz2.open() against open_bz2_for_read(), with increasing numbers of threads.
+
+Decompresses the 20250720T093135Z golden summary from test_data/ (about 75 MB of JSON) and compresses it again,
+checking that the multi-stream output decompresses to the same bytes.  The golden file itself, a single stream of
+900 kB blocks as written by rpki-client's archive, is used for the decompression timings.  Finding its blocks with
+bz2_block_spans() is timed separately, as that part of open_bz2_for_read() is serial; the rest scales with the
+number of CPUs.  With one CPU available, or workers=1, open_bz2_for_read() is simply bz2.open().
+
+Usage:
+    python benchmarks/bz2_compress.py [--workers 1 2 4 8]
+"""
+
+import argparse
+import bz2
+import os
+import time
+from pathlib import Path
+
+from rpkilog.parallel_bz2 import bz2_block_spans, default_workers, open_bz2_for_read, parallel_bz2_compress
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+SUMMARY_FILE = TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2'
+
+
+def timed(label: str, func, *args, **kwargs):
+    start = time.perf_counter()
+    retval = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f'{label:35s} {elapsed:8.2f}s {len(retval) / 1048576:8.2f} MB')
+    return elapsed, retval
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                    help='Thread counts to try (default: 1 2 4 8)')
+    args = ap.parse_args()
+    with bz2.open(SUMMARY_FILE, 'rb') as fh:
+        data = fh.read()
+    print(f'{len(data) / 1048576:.1f} MB of JSON, {os.cpu_count()} CPUs of which {default_workers()} available')
+
+    serial_time, _ = timed('bz2.compress', bz2.compress, data)
+    for workers in args.workers:
+        elapsed, compressed = timed(f'parallel_bz2_compress workers={workers}', parallel_bz2_compress, data,
+                                    workers=workers)
+        assert bz2.decompress(compressed) == data
+        print(f'{"":35s} speedup {serial_time / elapsed:.1f}x')
+
+    serial_time, _ = timed('bz2.open', lambda: bz2.open(SUMMARY_FILE, 'rb').read())
+    timed('bz2_block_spans', lambda: bz2_block_spans(open(SUMMARY_FILE, 'rb')))
+    for workers in args.workers:
+        elapsed, decompressed = timed(f'open_bz2_for_read workers={workers}',
+                                      lambda: open_bz2_for_read(SUMMARY_FILE, workers=workers).read())
+        assert decompressed == data
+        print(f'{"":35s} speedup {serial_time / elapsed:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
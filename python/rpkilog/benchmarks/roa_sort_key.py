@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark Roa.sortable() / Roa.__eq__ against the netaddr-based sort key rpkilog used to compute on every call.
+
+Loads the 20250720 golden snapshots from test_data/, builds Roa objects once, then times sorting both snapshots
+and comparing every pair of ROAs which share a primary key.
+
+Usage:
+    python benchmarks/roa_sort_key.py
+"""
+
+import bz2
+import json
+import time
+from pathlib import Path
+
+from rpkilog.roa import Roa
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+SNAPSHOT_FILES = [
+    TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2',
+    TEST_DATA_DIR / 'rpkiclient_summary_20250720T100145Z.json.bz2',
+]
+
+
+def legacy_sortable(roa: Roa) -> tuple:
+    """The sort key as it was computed before it was cached on the Roa: a fresh netaddr object each call."""
+    return roa.prefix.sort_key() + tuple([roa.maxLength, roa.asn, roa.ta, roa.expires])
+
+
+def legacy_eq(roa1: Roa, roa2: Roa) -> bool:
+    return legacy_sortable(roa1) == legacy_sortable(roa2)
+
+
+def timed(label: str, func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:40s} {elapsed:8.2f}s')
+    return elapsed
+
+
+def main():
+    snapshots = []
+    for path in SNAPSHOT_FILES:
+        with bz2.open(path) as fh:
+            snapshots.append([Roa(**roa_dict) for roa_dict in json.load(fh)['roas']])
+    old_roas, new_roas = snapshots
+    print(f'{len(old_roas)} old and {len(new_roas)} new ROAs')
+
+    def sort_both(key):
+        sorted(old_roas, key=key)
+        sorted(new_roas, key=key)
+
+    def eq_all(eq):
+        for roa1, roa2 in zip(old_sorted, new_sorted):
+            eq(roa1, roa2)
+
+    legacy_sort = timed('sort, legacy netaddr key', sort_both, legacy_sortable)
+    # the first pass fills the cache, the second shows the steady state seen by the merge loop
+    cached_sort_cold = timed('sort, Roa.sortable (cold cache)', sort_both, Roa.sortable)
+    cached_sort_warm = timed('sort, Roa.sortable (warm cache)', sort_both, Roa.sortable)
+    old_sorted = sorted(old_roas, key=Roa.sortable)
+    new_sorted = sorted(new_roas, key=Roa.sortable)
+    legacy_eq_time = timed('__eq__ x n, legacy netaddr key', eq_all, legacy_eq)
+    cached_eq_time = timed('__eq__ x n, Roa.__eq__', eq_all, Roa.__eq__)
+    print(f'sort speedup: {legacy_sort / cached_sort_cold:.1f}x cold, {legacy_sort / cached_sort_warm:.1f}x warm')
+    print(f'__eq__ speedup: {legacy_eq_time / cached_eq_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading Routinator jsonext ROAs: the per-record dateutil parsing rpkilog used to do, against
+Roa.new_from_routinator_jsonext, Roa.batch_from_routinator_jsonext and RoaTable.new_from_routinator_jsonext.
+
+The records in tests/roa_test.routinator_jsonext are replicated with distinct prefixes and stale times to make a
+dump of the size Routinator produces.
+
+Usage:
+    python benchmarks/routinator_load.py [--count 500000]
+"""
+
+import argparse
+import copy
+import json
+import time
+from pathlib import Path
+
+import dateutil.parser
+
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+
+FIXTURE_PATH = Path(__file__).resolve().parent.parent / 'tests' / 'roa_test.routinator_jsonext'
+
+
+def scaled_roas(count: int) -> list[dict]:
+    with open(FIXTURE_PATH) as fh:
+        templates = json.load(fh)['roas']
+    retlist = []
+    for idx in range(count):
+        roa = copy.deepcopy(templates[idx % len(templates)])
+        roa['prefix'] = f'{10 + (idx >> 16)}.{(idx >> 8) & 0xff}.{idx & 0xff}.0/24'
+        roa['maxLength'] = 24
+        roa['source'][0]['stale'] = f'2025-03-{1 + idx % 28:02d}T{idx % 24:02d}:{idx % 60:02d}:{idx // 60 % 60:02d}Z'
+        retlist.append(roa)
+    return retlist
+
+
+def legacy_new_from_routinator_jsonext(routinator_json: dict) -> Roa:
+    """Roa.new_from_routinator_jsonext as it was before the fixed-format timestamp parser."""
+    selected_source = routinator_json['source'][0]
+    return Roa(
+        asn=routinator_json['asn'],
+        prefix=routinator_json['prefix'],
+        maxLength=routinator_json['maxLength'],
+        ta=selected_source['tal'],
+        expires=int(dateutil.parser.parse(selected_source['stale']).timestamp()),
+    )
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    retval = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{label:45s} {elapsed:8.2f}s')
+    return elapsed, retval
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=500_000, help='Number of ROAs to load (default: 500000)')
+    args = ap.parse_args()
+    roas = scaled_roas(args.count)
+    print(f'{len(roas)} Routinator jsonext ROAs')
+
+    legacy_time, legacy_roas = timed(
+        'per record, dateutil', lambda: [legacy_new_from_routinator_jsonext(r) for r in roas])
+    scalar_time, scalar_roas = timed(
+        'Roa.new_from_routinator_jsonext', lambda: [Roa.new_from_routinator_jsonext(routinator_json=r) for r in roas])
+    batch_time, batch_roas = timed('Roa.batch_from_routinator_jsonext', Roa.batch_from_routinator_jsonext, roas)
+    table_time, table = timed(
+        'RoaTable.new_from_routinator_jsonext', RoaTable.new_from_routinator_jsonext, {'roas': roas})
+    assert scalar_roas == legacy_roas
+    assert batch_roas == legacy_roas
+    assert list(table) == legacy_roas
+    print(f'speedup over dateutil: {legacy_time / scalar_time:.1f}x per record, {legacy_time / batch_time:.1f}x batch,'
+          f' {legacy_time / table_time:.1f}x RoaTable')
+
+
+if __name__ == '__main__':
+    main()
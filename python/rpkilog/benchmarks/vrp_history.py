@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark VrpHistory: rebuild the VRP set at random times in a month of history from daily keyframes plus diffs.
+
+Starts from the 20250720T093135Z golden summary in test_data/ (about 723k ROAs) and writes a month of synthetic
+diffs, one per --step-minutes, each deleting, replacing (with a new expiry) and adding --changes / 3 ROAs.  No ROA
+is touched twice, so the diffs are a consistent chain.  Then builds keyframes every --keyframe-interval-hours and
+times vrp_set_at() at --samples random times, checking a few of them against a replay from the first keyframe.
+
+Usage:
+    python benchmarks/vrp_history.py [--days 30] [--step-minutes 30] [--changes 450] [--samples 20]
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rpkilog.parallel_bz2 import open_parallel_bz2
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import write_rpkisnap
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_reader import VrpDiffReader
+from rpkilog.vrp_diff_writer import VrpDiffNdjsonWriter
+from rpkilog.vrp_history import VrpHistory
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+SUMMARY_FILE = TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2'
+START = datetime(2025, 7, 20, 9, 31, 35, tzinfo=timezone.utc)
+
+
+def write_synthetic_diffs(table: RoaTable, diff_dir: Path, steps: int, step: timedelta, changes: int):
+    per_verb = changes // 3
+    if 2 * per_verb * steps > len(table):
+        raise SystemExit(F'{steps} steps of {changes} changes would touch more than the {len(table)} ROAs')
+    rng = np.random.default_rng(0)
+    untouched = rng.permutation(len(table))
+    new_asn = 4_200_000_000
+    for step_number in range(1, steps + 1):
+        old_datetime = START + step * (step_number - 1)
+        new_datetime = START + step * step_number
+        consumed = untouched[:2 * per_verb]
+        untouched = untouched[2 * per_verb:]
+        deleted = table.take(consumed[:per_verb])
+        replaced_old = table.take(consumed[per_verb:])
+        replaced_new = table.take(consumed[per_verb:])
+        replaced_new.expires = replaced_new.expires + step_number
+        added = table.take(rng.integers(len(table), size=per_verb))
+        added.asn = np.arange(new_asn, new_asn + per_verb, dtype=np.uint32)
+        new_asn += per_verb
+        diffs = (
+            [VrpDiff(old_roa=roa, new_roa=None) for roa in deleted]
+            + [VrpDiff(old_roa=old_roa, new_roa=new_roa) for old_roa, new_roa in zip(replaced_old, replaced_new)]
+            + [VrpDiff(old_roa=None, new_roa=roa) for roa in added]
+        )
+        metadata = {
+            'diff_count': len(diffs),
+            'vrp_cache_old': {'filename': F'{old_datetime:%Y%m%dT%H%M%SZ}.json.bz2', 'metadata': {}},
+            'vrp_cache_new': {'filename': F'{new_datetime:%Y%m%dT%H%M%SZ}.json.bz2', 'metadata': {}},
+        }
+        output_path = diff_dir / F'{new_datetime:%Y%m%dT%H%M%SZ}.vrpdiff.ndjson.bz2'
+        writer = VrpDiffNdjsonWriter(open_parallel_bz2(output_path, 'xt'), metadata=metadata)
+        writer.write_all(diffs)
+        writer.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--days', type=int, default=30, help='Length of the synthetic history (default: 30)')
+    ap.add_argument('--step-minutes', type=int, default=30, help='Time between snapshots (default: 30)')
+    ap.add_argument('--changes', type=int, default=450, help='Changed ROAs per diff (default: 450)')
+    ap.add_argument('--keyframe-interval-hours', type=float, default=24.0, help='Time between keyframes (default: 24)')
+    ap.add_argument('--samples', type=int, default=20, help='Number of random times to rebuild (default: 20)')
+    args = ap.parse_args()
+    step = timedelta(minutes=args.step_minutes)
+    steps = int(timedelta(days=args.days) / step)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        keyframe_dir = Path(work_dir, 'keyframes')
+        diff_dir = Path(work_dir, 'diffs')
+        keyframe_dir.mkdir()
+        diff_dir.mkdir()
+        table = RoaTable.new_from_file(SUMMARY_FILE).sorted()
+        write_rpkisnap(table, keyframe_dir / F'{START:%Y%m%dT%H%M%SZ}.rpkisnap')
+
+        start = time.perf_counter()
+        write_synthetic_diffs(table, diff_dir, steps=steps, step=step, changes=args.changes)
+        print(F'wrote {steps} diffs of {args.changes} changes in {time.perf_counter() - start:.1f}s')
+
+        history = VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir)
+        start = time.perf_counter()
+        keyframes = history.build_keyframes(interval=timedelta(hours=args.keyframe_interval_hours))
+        print(F'built {len(keyframes)} keyframes in {time.perf_counter() - start:.1f}s')
+
+        rng = random.Random(0)
+        elapsed = []
+        for sample in range(args.samples):
+            when = START + timedelta(seconds=rng.uniform(0, args.days * 86400))
+            start = time.perf_counter()
+            rebuilt = history.vrp_set_at(when)
+            elapsed.append(time.perf_counter() - start)
+            if sample < 3:
+                # the same time, replayed from the first keyframe alone
+                expected = VrpHistory.apply_changes(table, *replayed_changes(history, when))
+                assert all((getattr(rebuilt, cname) == getattr(expected, cname)).all()
+                           for cname in RoaTable.column_dtypes)
+        print(F'vrp_set_at over {args.samples} random times: min {min(elapsed):.2f}s'
+              F' median {statistics.median(elapsed):.2f}s max {max(elapsed):.2f}s')
+
+
+def replayed_changes(history: VrpHistory, when: datetime) -> tuple[RoaTable, RoaTable]:
+    """
+    (removed, added) for every diff up to when, read without VrpHistory's keyframe selection.
+    """
+    old_batches = []
+    new_batches = []
+    for diff_datetime, diff_path in history.diffs():
+        if diff_datetime > when:
+            break
+        with VrpDiffReader.new_from_path(diff_path) as reader:
+            for batch in reader.iter_batches():
+                old_batches.append([diff['old_roa'] for diff in batch if 'old_roa' in diff])
+                new_batches.append([diff['new_roa'] for diff in batch if 'new_roa' in diff])
+    return RoaTable.new_from_rpkiclient_batches(old_batches), RoaTable.new_from_rpkiclient_batches(new_batches)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,5 @@
 RPKI Log implementation utilities
 '''
 from .ingest_tar import IngestTar
+from .roa_table import RoaTable
 from .vrp_diff import Roa, VrpDiff
@@ -14,6 +14,10 @@ import boto3
 import dateutil.parser
 
 from rpkilog.local_storage_type import LocalStorageType
+from rpkilog.parallel_bz2 import open_bz2_for_read, open_parallel_bz2, parallel_bz2_compress
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import RPKISNAP_SUFFIX, write_rpkisnap
+from rpkilog.summary_reader import SummaryReader
 
 logger = logging.getLogger(__name__)
 
@@ -110,7 +114,7 @@ class DataFileSuper(ABC):
                 raise ValueError(f'unexpected value of local_storage_type: {self}')
 
         with open(self.local_filepath_uncompressed, mode='rb') as uncomp_fh:
-            with bz2.open(self.local_filepath_bz2, mode='xb') as bz2_fh:
+            with open_parallel_bz2(self.local_filepath_bz2, mode='xb') as bz2_fh:
                 shutil.copyfileobj(uncomp_fh, bz2_fh, length=1024*1024)
         self.local_storage_type = LocalStorageType.BZIP2
         os.unlink(self.local_filepath_uncompressed)
@@ -159,15 +163,16 @@ class DataFileSuper(ABC):
 
     def infer_local_storage_type(self, path) -> LocalStorageType:
         """
-        Examine the given file, trying to open as a bzip2 and then as a json.
-        Raise an exception if neither are successful (type of exception depends on how json.load() fails)
+        Examine the given file, trying to open as a bzip2 and then as a json.  The whole file is parsed with
+        SummaryReader, so it is validated without being held in memory.
+        Raise an exception if neither are successful (type of exception depends on how parsing fails)
 
         Update self.local_storage_type and self.local_filepath_uncompressed or self.local_filepath_bz2.
         """
         try:
-            fh = bz2.open(filename=path, mode='r')
-            _ = json.load(fh)
-            fh.close()
+            with SummaryReader(bz2.open(filename=path, mode='r')) as reader:
+                for _ in reader.iter_roas():
+                    pass
             self.local_storage_type = LocalStorageType.BZIP2
             self.local_filepath_bz2 = path
             return self.local_storage_type
@@ -175,15 +180,19 @@ class DataFileSuper(ABC):
             # bz2 raises OSError when you open a non-bz2 file and try to read from it.
             pass
 
-        fh = open(file=path, mode='rt')
-        _ = json.load(fh)
-        fh.close()
+        with SummaryReader(open(file=path, mode='rt')) as reader:
+            for _ in reader.iter_roas():
+                pass
         self.local_storage_type = LocalStorageType.UNCOMPRESSED
         self.local_filepath_uncompressed = path
         return self.local_storage_type
 
     @property
     def json_data_cache(self):
+        """
+        The whole decoded JSON document.  This holds every ROA as a dict; prefer roa_table() or SummaryReader where
+        only the ROAs are needed.
+        """
         if not self._json_data_cache:
             fh = self.open_for_read()
             self._json_data_cache = json.load(fh)
@@ -228,14 +237,39 @@ class DataFileSuper(ABC):
             case LocalStorageType.UNCOMPRESSED:
                 retfh = open(self.local_filepath_uncompressed)
             case LocalStorageType.BZIP2:
-                retfh = bz2.open(self.local_filepath_bz2, mode='rb')
+                retfh = open_bz2_for_read(self.local_filepath_bz2, mode='rb')
             case LocalStorageType.UNCACHED:
                 self.s3_download()
-                retfh = bz2.open(self.local_filepath_bz2, mode='rb')
+                retfh = open_bz2_for_read(self.local_filepath_bz2, mode='rb')
             case _:
                 raise ValueError(f'unexpected value of local_storage_type: {self}')
         return retfh
 
+    def roa_table(self) -> RoaTable:
+        """
+        Return the file's ROAs as a RoaTable.  The file is streamed with SummaryReader rather than loaded into
+        json_data_cache.
+        """
+        with SummaryReader(self.open_for_read()) as reader:
+            return RoaTable.new_from_summary_reader(reader)
+
+    def rpkisnap_path(self) -> Path:
+        """
+        Path of the file's .rpkisnap conversion in local_storage_dir, named by its timestamp alone, e.g.
+        20250720T100145Z.rpkisnap, which is the form VrpDiff expects of snapshot file names.
+        """
+        retpath = Path(self.local_storage_dir, F'{self.datetimestamp:%Y%m%dT%H%M%SZ}{RPKISNAP_SUFFIX}')
+        return retpath
+
+    def write_rpkisnap(self, path: Path = None) -> Path:
+        """
+        Convert the file to .rpkisnap format, by default alongside the local copy, and return the path written.
+        """
+        if path is None:
+            path = self.rpkisnap_path()
+        write_rpkisnap(table=self.roa_table(), path=path)
+        return path
+
     def s3_bucket(self) -> str:
         url = urllib.parse.urlparse(self.s3_url)
         return url.netloc
@@ -260,7 +294,7 @@ class DataFileSuper(ABC):
                 uncomp_fh = open(self.local_filepath_uncompressed, 'rb')
                 data_uncompressed = uncomp_fh.read()
                 uncomp_fh.close()
-                data_bz2 = bz2.compress(data_uncompressed)
+                data_bz2 = parallel_bz2_compress(data_uncompressed)
                 s3_object = bucket.put_object(Key=self.s3_path(), Body=data_bz2)
             case LocalStorageType.BZIP2:
                 bz2_fh = open(self.local_filepath_bz2, 'rb')
@@ -0,0 +1,13 @@
+from enum import StrEnum
+
+
+class DiffEngine(StrEnum):
+    MERGE = 'merge'
+    """Reference engine: sort lists of Roa objects and walk them one element at a time (VrpDiff.vrp_diff_list)."""
+
+    VECTORIZED = 'vectorized'
+    """Sort RoaTable columns with numpy.lexsort and classify all rows at once (VrpDiff.vrp_diff_table)."""
+
+    HASH_JOIN = 'hash-join'
+    """Index the old snapshot by Roa.primary_key(), probe it with the new one and sort only the changes
+    (VrpDiff.vrp_diff_hash_join)."""
@@ -0,0 +1,24 @@
+from enum import StrEnum
+from pathlib import Path
+
+
+class DiffFormat(StrEnum):
+    """
+    Layout of a VRP diff file.  The value is also the file extension, e.g. 20250720T100145Z.vrpdiff.ndjson.bz2.
+    Readers don't need to be told the format; VrpDiffReader detects it from the content.
+    """
+
+    JSON = 'json'
+    """One JSON document, `{"object_type": ..., "metadata": {...}, "vrp_diffs": [...]}` (VrpDiffWriter)."""
+
+    NDJSON = 'ndjson'
+    """A header line with object_type and metadata, then one diff per line (VrpDiffNdjsonWriter)."""
+
+    @classmethod
+    def for_path(cls, path: Path) -> 'DiffFormat':
+        """
+        The format a diff file should be written in, according to its name.
+        """
+        if '.ndjson' in Path(path).suffixes:
+            return cls.NDJSON
+        return cls.JSON
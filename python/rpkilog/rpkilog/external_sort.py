@@ -0,0 +1,193 @@
+"""
+External merge sort of VRP snapshots, so two snapshots can be diffed in a fixed amount of memory.
+
+A snapshot is read a batch at a time and cut into runs of at most run_rows VRPs.  Each run is sorted as a RoaTable
+and spilled to an .rpkisnap file in a temporary directory.  The runs are later read back a chunk at a time and
+merged with heapq.merge(), which yields Roa objects in Roa.sortable() order while holding only one chunk of each run
+at a time.  So memory use depends on run_rows and the number of runs, not on the size of the snapshot, and
+VrpDiff.vrp_diff_sorted_iter() can walk two merged snapshots just as the merge engine walks two sorted lists.
+
+    runs = SortedRuns.new_from_file(path, run_rows=run_rows_for_memory(128))
+    try:
+        for roa in runs:
+            ...
+    finally:
+        runs.cleanup()
+"""
+import heapq
+import logging
+from pathlib import Path
+import tempfile
+from typing import Iterator
+
+from rpkilog.fingerprint import RoaSetFingerprint
+from rpkilog.phase_timer import PhaseTimer, optional_phase
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import is_rpkisnap_path, iter_rpkisnap_chunks, read_rpkisnap, write_rpkisnap
+from rpkilog.summary_reader import SummaryReader
+
+logger = logging.getLogger(__name__)
+
+# Bytes per VRP while a run is built, sorted and written.  The run's columns are held three times (stacked batches,
+# sorted copy, rpkisnap records) along with the sort index; about 150 bytes were measured, so this leaves headroom.
+RUN_BYTES_PER_ROW = 256
+# Memory needed whatever the run size: a batch of decoded JSON, the decompressor, and a chunk of each run during the
+# merge.  About 20 MB was measured on a 700k VRP snapshot.  Not counting the interpreter and libraries.
+FIXED_MEMORY_MB = 24
+# Runs smaller than this would make the merge slower without saving much memory.
+MIN_RUN_ROWS = 16384
+
+
+def run_rows_for_memory(max_memory_mb: int) -> int:
+    """
+    Return the run size that keeps spilling and merging the snapshots within about max_memory_mb beyond what the
+    interpreter and libraries use.  Both snapshots are spilled one run at a time, and the merge holds only a chunk
+    of each run, so that is the most memory the diff needs apart from its output.  Below about FIXED_MEMORY_MB plus
+    MIN_RUN_ROWS worth of runs the budget can't be met, and the smallest runs are used.  Each run adds a chunk to
+    the merge, so very large snapshots with a small budget use somewhat more.
+    """
+    run_bytes = (max_memory_mb - FIXED_MEMORY_MB) * 1024 * 1024
+    retval = max(MIN_RUN_ROWS, run_bytes // RUN_BYTES_PER_ROW)
+    return retval
+
+
+class SortedRuns():
+    """
+    A snapshot split into sorted .rpkisnap runs.  len() is the total number of VRPs, and iterating yields each of
+    them as a Roa object, in Roa.sortable() order, by merging the runs.  Iteration may be repeated.
+
+    An .rpkisnap input is already sorted, so it is used as the only run and nothing is written.  Otherwise the runs
+    are in a tempfile.TemporaryDirectory, which is removed by cleanup() or else when this object is garbage
+    collected.
+    """
+    # VRPs read from each run at a time during the merge.  Every run holds a chunk of Roa objects, so keep it small.
+    merge_chunk_rows = 1024
+
+    def __init__(
+        self,
+        metadata: dict,
+        run_paths: list[Path],
+        row_count: int,
+        fingerprint: str,
+        run_dir: tempfile.TemporaryDirectory = None,
+    ):
+        self.metadata = metadata
+        self.run_paths = run_paths
+        self.row_count = row_count
+        self.fingerprint = fingerprint
+        self.run_dir = run_dir
+
+    def __iter__(self) -> Iterator[Roa]:
+        runs = [self._iter_run(path) for path in self.run_paths]
+        if len(runs) == 1:
+            return runs[0]
+        return heapq.merge(*runs, key=Roa.sortable)
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    @classmethod
+    def new_from_file(cls, path: Path, run_rows: int, tmp_dir: Path = None, phase_timer: PhaseTimer = None):
+        """
+        Split an rpki-client summary or Routinator jsonext file, optionally bzip2 compressed, into sorted runs of at
+        most run_rows VRPs, in a new temporary directory under tmp_dir (by default, tempfile's default).
+        phase_timer's decompress and parse phases are charged by the SummaryReader; building each run's table is
+        charged to construct, and sorting and writing it to sort.
+        """
+        if is_rpkisnap_path(path):
+            table = read_rpkisnap(path)
+            with optional_phase(phase_timer, 'fingerprint'):
+                fingerprint = RoaSetFingerprint()
+                fingerprint.update_table(table)
+            return cls(table.metadata, [Path(path)], row_count=len(table), fingerprint=fingerprint.hexdigest())
+        run_dir = tempfile.TemporaryDirectory(prefix='rpkilog-runs-', dir=tmp_dir)
+        try:
+            with SummaryReader.new_from_path(path, phase_timer=phase_timer) as reader:
+                metadata, run_paths, row_count, fingerprint = cls._spill_runs(
+                    reader,
+                    Path(run_dir.name),
+                    run_rows,
+                    phase_timer,
+                )
+        except BaseException:
+            run_dir.cleanup()
+            raise
+        logger.info(F'Spilled {row_count} VRPs from {str(path)} to {len(run_paths)} sorted runs in {run_dir.name}')
+        retval = cls(metadata, run_paths, row_count=row_count, fingerprint=fingerprint, run_dir=run_dir)
+        return retval
+
+    @classmethod
+    def _spill_runs(
+        cls,
+        reader: SummaryReader,
+        run_dir: Path,
+        run_rows: int,
+        phase_timer: PhaseTimer,
+    ) -> tuple[dict, list[Path], int, str]:
+        """
+        Back-end of new_from_file().  Returns (metadata, run_paths, row_count, fingerprint).
+        """
+        run_paths = []
+        row_count = 0
+        fingerprint = RoaSetFingerprint()
+        batch_tables = []
+        batch_rows = 0
+        table_func = None
+        for batch in reader.iter_batches():
+            with optional_phase(phase_timer, 'construct'):
+                if table_func is None:
+                    # ducktype, as RoaTable.new_from_summary_reader() does
+                    if 'source' in batch[0]:
+                        table_func = RoaTable.new_from_routinator_batches
+                    else:
+                        table_func = RoaTable.new_from_rpkiclient_batches
+                batch_tables.append(table_func([batch]))
+                batch_rows += len(batch)
+            if batch_rows >= run_rows:
+                run_paths.append(cls._write_run(batch_tables, run_dir, len(run_paths), fingerprint, phase_timer))
+                row_count += batch_rows
+                batch_tables = []
+                batch_rows = 0
+        if batch_tables or not run_paths:
+            run_paths.append(cls._write_run(batch_tables, run_dir, len(run_paths), fingerprint, phase_timer))
+            row_count += batch_rows
+        return reader.metadata, run_paths, row_count, fingerprint.hexdigest()
+
+    @classmethod
+    def _write_run(
+        cls,
+        batch_tables: list[RoaTable],
+        run_dir: Path,
+        run_number: int,
+        fingerprint: RoaSetFingerprint,
+        phase_timer: PhaseTimer,
+    ) -> Path:
+        """
+        Stack, sort and spill one run.  Returns its path.
+        """
+        with optional_phase(phase_timer, 'construct'):
+            table = RoaTable.new_from_tables(batch_tables)
+        with optional_phase(phase_timer, 'fingerprint'):
+            fingerprint.update_table(table)
+        retval = Path(run_dir, F'{run_number:05d}.rpkisnap')
+        with optional_phase(phase_timer, 'sort'):
+            write_rpkisnap(table.sorted(), retval)
+        return retval
+
+    def cleanup(self):
+        """
+        Remove the temporary directory holding the runs, if there is one.
+        """
+        if self.run_dir is not None:
+            self.run_dir.cleanup()
+            self.run_dir = None
+
+    @classmethod
+    def _iter_run(cls, path: Path) -> Iterator[Roa]:
+        """
+        Yield the VRPs of one run.  It is read a chunk at a time rather than memory-mapped, as the mapped pages of
+        every run would otherwise stay resident until the merge is done.
+        """
+        for chunk in iter_rpkisnap_chunks(path, chunk_rows=cls.merge_chunk_rows):
+            yield from chunk
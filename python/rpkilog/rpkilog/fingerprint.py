@@ -0,0 +1,203 @@
+"""
+Order-independent fingerprints of VRP sets, used to recognize a summary whose ROAs are identical to the previous
+summary's without diffing them.
+
+Each VRP's primary key and expires are hashed to two independent 64-bit values, and the fingerprint is the VRP count
+together with the sum of each of those modulo 2**64.  Summing makes the fingerprint independent of the order of the
+ROAs, and of the order of TA names in any particular table, while still counting duplicate VRPs.  It can be updated a
+batch at a time while a summary is streamed, before any Roa objects are built.
+
+A fingerprint can be kept in a small JSON sidecar next to its summary, named by appending SIDECAR_SUFFIX.  The
+sidecar also holds the summary's metadata and size, so a diff against an identical snapshot needs neither file to
+be parsed again.
+"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.fingerprint.json'
+# Two independent 64-bit lanes make up the 128-bit per-VRP hash.
+LANE_SEEDS = (0x243F6A8885A308D3, 0x13198A2E03707344)
+
+
+def _splitmix64(values: np.ndarray) -> np.ndarray:
+    """
+    The SplitMix64 finalizer, applied elementwise to a uint64 array.  Arithmetic wraps modulo 2**64.
+    """
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    retval = values ^ (values >> np.uint64(31))
+    return retval
+
+
+def _ta_hash(ta_name: str) -> int:
+    # hash() of a str differs between processes, so it can't be used for a fingerprint which is stored
+    retval = int.from_bytes(hashlib.blake2b(ta_name.encode('utf-8'), digest_size=8).digest(), 'little')
+    return retval
+
+
+class RoaSetFingerprint():
+    """
+    Accumulates the fingerprint of a set of VRPs.  Feed it every VRP exactly once, in any order and in any number of
+    batches, then call hexdigest():
+
+        fingerprint = RoaSetFingerprint()
+        for batch in reader.iter_batches():
+            fingerprint.update_columns(rpkiclient_columns(batch))
+        fingerprint.hexdigest()
+    """
+    def __init__(self):
+        self.roa_count = 0
+        self._lane_sums = [0] * len(LANE_SEEDS)
+        self._ta_hashes = {}
+
+    def hexdigest(self) -> str:
+        """
+        Return the fingerprint as a hex string, which includes the VRP count.
+        """
+        lanes = ''.join(F'{lane_sum:016x}' for lane_sum in self._lane_sums)
+        retval = F'{self.roa_count:x}-{lanes}'
+        return retval
+
+    def update_arrays(
+        self,
+        family: np.ndarray,
+        network_hi: np.ndarray,
+        network_lo: np.ndarray,
+        prefixlen: np.ndarray,
+        maxLength: np.ndarray,
+        asn: np.ndarray,
+        ta_hash: np.ndarray,
+        expires: np.ndarray,
+    ):
+        """
+        Add VRPs given as equal-length integer columns.  ta_hash holds the _ta_hash() of each row's TA name.
+        """
+        # family, prefixlen and maxLength each fit in 8 bits, so they share one word
+        small_fields = (
+            (family.astype(np.uint64) << np.uint64(16))
+            | (prefixlen.astype(np.uint64) << np.uint64(8))
+            | maxLength.astype(np.uint64)
+        )
+        fields = [
+            small_fields,
+            network_hi.astype(np.uint64),
+            network_lo.astype(np.uint64),
+            asn.astype(np.uint64),
+            ta_hash.astype(np.uint64),
+            # view, not astype, so negative timestamps keep their bits
+            np.ascontiguousarray(expires, dtype=np.int64).view(np.uint64),
+        ]
+        for lane, seed in enumerate(LANE_SEEDS):
+            row_hashes = np.full(len(small_fields), seed, dtype=np.uint64)
+            for field in fields:
+                row_hashes = _splitmix64(row_hashes ^ field)
+            # the sum of a uint64 array wraps modulo 2**64, which is what we want
+            self._lane_sums[lane] = (self._lane_sums[lane] + int(row_hashes.sum(dtype=np.uint64))) % 2 ** 64
+        self.roa_count += len(small_fields)
+
+    def update_columns(self, columns: dict[str, list]):
+        """
+        Add a batch of VRPs as returned by rpkiclient_columns() or routinator_columns().
+        """
+        network = columns['network']
+        ta_hash = [self._cached_ta_hash(ta_name) for ta_name in columns['ta']]
+        self.update_arrays(
+            family=np.array(columns['family'], dtype=np.uint64),
+            network_hi=np.array([n >> 64 for n in network], dtype=np.uint64),
+            network_lo=np.array([n & 0xFFFF_FFFF_FFFF_FFFF for n in network], dtype=np.uint64),
+            prefixlen=np.array(columns['prefixlen'], dtype=np.uint64),
+            maxLength=np.array(columns['maxLength'], dtype=np.uint64),
+            asn=np.array(columns['asn'], dtype=np.uint64),
+            ta_hash=np.array(ta_hash, dtype=np.uint64),
+            expires=np.array(columns['expires'], dtype=np.int64),
+        )
+
+    def update_table(self, table):
+        """
+        Add every VRP in a RoaTable.
+        """
+        ta_hashes = np.array([self._cached_ta_hash(ta_name) for ta_name in table.ta_names], dtype=np.uint64)
+        self.update_arrays(
+            family=table.family,
+            network_hi=table.network_hi,
+            network_lo=table.network_lo,
+            prefixlen=table.prefixlen,
+            maxLength=table.maxLength,
+            asn=table.asn,
+            ta_hash=ta_hashes[table.ta_code] if len(table) else np.zeros(0, dtype=np.uint64),
+            expires=table.expires,
+        )
+
+    def _cached_ta_hash(self, ta_name: str) -> int:
+        retval = self._ta_hashes.get(ta_name)
+        if retval is None:
+            retval = self._ta_hashes[ta_name] = _ta_hash(ta_name)
+        return retval
+
+
+def fingerprint_sidecar_path(summary_path: Path) -> Path:
+    retval = Path(str(summary_path) + SIDECAR_SUFFIX)
+    return retval
+
+
+def fingerprint_table(table) -> str:
+    """
+    Return the fingerprint of every VRP in a RoaTable.
+    """
+    fingerprint = RoaSetFingerprint()
+    fingerprint.update_table(table)
+    retval = fingerprint.hexdigest()
+    return retval
+
+
+def read_fingerprint_sidecar(summary_path: Path) -> dict | None:
+    """
+    Return the sidecar of a summary file, `{"fingerprint": ..., "metadata": {...}, "summary_size": ...,
+    "summary_mtime_ns": ...}`, or None if there is no sidecar or it was written for a file of a different size or
+    modification time.
+    """
+    sidecar_path = fingerprint_sidecar_path(summary_path)
+    try:
+        with open(sidecar_path) as fh:
+            sidecar = json.load(fh)
+        summary_stat = Path(summary_path).stat()
+    except FileNotFoundError:
+        return None
+    if (
+        sidecar.get('summary_size') != summary_stat.st_size
+        or sidecar.get('summary_mtime_ns') != summary_stat.st_mtime_ns
+    ):
+        logger.warning(F'Ignoring stale fingerprint sidecar {sidecar_path}')
+        return None
+    return sidecar
+
+
+def write_fingerprint_sidecar(summary_path: Path, fingerprint: str, metadata: dict):
+    """
+    Write the sidecar read by read_fingerprint_sidecar(), replacing any existing one.
+    """
+    summary_stat = Path(summary_path).stat()
+    sidecar = {
+        'fingerprint': fingerprint,
+        'metadata': metadata,
+        'summary_mtime_ns': summary_stat.st_mtime_ns,
+        'summary_size': summary_stat.st_size,
+    }
+    with open(fingerprint_sidecar_path(summary_path), 'w') as fh:
+        json.dump(sidecar, fh, indent=4, sort_keys=True)
+        fh.write('\n')
+
+
+def remove_summary_file(summary_path: Path):
+    """
+    Remove a summary file along with its fingerprint sidecar, if it has one.
+    """
+    Path(summary_path).unlink()
+    fingerprint_sidecar_path(summary_path).unlink(missing_ok=True)
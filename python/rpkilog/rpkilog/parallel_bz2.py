@@ -0,0 +1,356 @@
+"""
+Parallel bzip2 compression and decompression.  The bz2 module releases the GIL while it works, so both use threads.
+
+For compression, input is cut into blocks which are compressed independently and written in order, each as a
+complete bzip2 stream.  The result is a multi-stream bzip2 file, which bz2.open(), bz2.decompress() and the bzip2
+command line tool all read as if it were a single stream.
+
+    with open_parallel_bz2(path, 'xt') as fh:
+        fh.write(json_text)
+
+    data_bz2 = parallel_bz2_compress(data)
+
+For decompression, the compressed blocks of any bzip2 file (not just ones written here) are located by searching
+for the 48-bit block and end-of-stream magic numbers, which are not byte aligned.  Each block is re-wrapped as a
+single-block stream and decompressed on its own.  The block CRCs are checked against each stream's combined CRC
+before anything is decompressed, so a magic number which occurs by chance inside compressed data is detected and the
+file is read serially instead.  The search reads the file a chunk at a time, and each block is read again when it
+is about to be decompressed, so the compressed file is never held in memory as a whole.  With one CPU, or too few
+blocks to be worth splitting, the file is simply read with bz2.open().
+
+    with open_bz2_for_read(path) as fh:
+        data = json.load(fh)
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import bz2
+import io
+import os
+from pathlib import Path
+from typing import IO
+
+import numpy as np
+
+BLOCK_MAGIC = 0x314159265359
+END_OF_STREAM_MAGIC = 0x177245385090
+# Big enough that the per-stream overhead and the restart of bzip2's 900 kB blocks cost next to nothing in
+# compression ratio, small enough that a 50 MB summary is spread over a dozen threads.
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+# Below this many blocks (of up to 900 kB uncompressed each) finding them costs more than decompressing them in
+# parallel saves.
+MIN_PARALLEL_BLOCKS = 8
+
+
+def default_workers() -> int:
+    """
+    The number of CPUs this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        retval = len(os.sched_getaffinity(0))
+    else:
+        retval = os.cpu_count() or 1
+    return retval
+
+
+class ParallelBZ2Writer(io.BufferedIOBase):
+    """
+    Binary file object which bzip2 compresses everything written to it in parallel, writing a multi-stream bzip2
+    file to fh.  At most 2 * workers blocks are buffered at a time.  fh is closed by close() if close_fh is true.
+    """
+    def __init__(
+        self,
+        fh: io.RawIOBase | io.BufferedIOBase,
+        workers: int = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        compresslevel: int = 9,
+        close_fh: bool = True,
+    ):
+        super().__init__()
+        self.fh = fh
+        self.workers = workers or default_workers()
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        self.close_fh = close_fh
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._streams_written = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bz2')
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+            while self._pending:
+                self._write_next()
+            if self._streams_written == 0:
+                # nothing was written at all; an empty stream keeps the output a valid bzip2 file
+                self.fh.write(bz2.compress(b'', self.compresslevel))
+        finally:
+            self._executor.shutdown()
+            if self.close_fh:
+                self.fh.close()
+            super().close()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError('write to closed file')
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes):
+        if not block:
+            return
+        self._pending.append(self._executor.submit(bz2.compress, block, self.compresslevel))
+        while len(self._pending) > 2 * self.workers:
+            self._write_next()
+
+    def _write_next(self):
+        self.fh.write(self._pending.popleft().result())
+        self._streams_written += 1
+
+
+def open_parallel_bz2(
+    path: Path,
+    mode: str = 'xb',
+    workers: int = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    compresslevel: int = 9,
+    encoding: str = 'utf-8',
+) -> ParallelBZ2Writer | io.TextIOWrapper:
+    """
+    Like bz2.open() for writing ('w', 'x' or 'a', with 'b' or 't'), but compressing in parallel.  Appending adds
+    more streams to an existing file, just as bz2.open() does.
+    """
+    if 'r' in mode or '+' in mode:
+        raise ValueError(F'open_parallel_bz2 only supports writing, not mode {mode!r}')
+    binary_mode = mode.replace('t', '').replace('b', '') + 'b'
+    writer = ParallelBZ2Writer(
+        open(path, binary_mode),
+        workers=workers,
+        block_size=block_size,
+        compresslevel=compresslevel,
+    )
+    if 't' in mode:
+        return io.TextIOWrapper(writer, encoding=encoding)
+    return writer
+
+
+def parallel_bz2_compress(
+    data: bytes,
+    workers: int = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    compresslevel: int = 9,
+) -> bytes:
+    """
+    Like bz2.compress(), but compressing in parallel.  The result is a multi-stream bzip2 file.
+    """
+    if len(data) <= block_size:
+        return bz2.compress(data, compresslevel)
+    workers = workers or default_workers()
+    view = memoryview(data)
+    blocks = [view[start:start + block_size] for start in range(0, len(data), block_size)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bz2') as executor:
+        retval = b''.join(executor.map(lambda block: bz2.compress(block, compresslevel), blocks))
+    return retval
+
+
+class ParallelBZ2Reader(io.RawIOBase):
+    """
+    Raw binary file object which decompresses the given blocks of the bzip2 file open as fh, as found by
+    bz2_block_spans(), on a thread pool.  Each block's bytes are read from fh when it is submitted, so at most
+    2 * workers compressed and decompressed blocks are held at a time; they are returned in order.  fh is closed by
+    close().  Normally used through open_bz2_for_read().
+    """
+    def __init__(self, fh: io.BufferedIOBase, block_spans: list[tuple[int, int, int]], workers: int = None):
+        super().__init__()
+        self.fh = fh
+        self.workers = workers or default_workers()
+        self._block_spans = iter(block_spans)
+        self._pending = deque()
+        self._current = memoryview(b'')
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bunzip2')
+        for _ in range(2 * self.workers):
+            self._submit_next()
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(cancel_futures=True)
+            self.fh.close()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            if not self._pending:
+                return 0
+            self._current = memoryview(self._pending.popleft().result())
+            self._submit_next()
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def _submit_next(self):
+        block_span = next(self._block_spans, None)
+        if block_span is None:
+            return
+        start_bit, end_bit, block_crc = block_span
+        self.fh.seek(start_bit // 8)
+        block = self.fh.read((end_bit + 7) // 8 - start_bit // 8)
+        self._pending.append(
+            self._executor.submit(_decompress_block, block, start_bit % 8, end_bit - start_bit, block_crc)
+        )
+
+
+def _bits(data: bytes, start_bit: int, bit_count: int) -> int:
+    """
+    Return bit_count bits of data, starting at bit offset start_bit, as an int.  Only for short fields.
+    """
+    end_bit = start_bit + bit_count
+    value = int.from_bytes(data[start_bit // 8:(end_bit + 7) // 8], 'big')
+    retval = (value >> (-end_bit % 8)) & ((1 << bit_count) - 1)
+    return retval
+
+
+def _decompress_block(block: bytes, shift: int, block_bits: int, block_crc: int) -> bytes:
+    """
+    Decompress the block_bits bits of a block, starting with its magic number, which begin shift bits into block.
+    """
+    # Realign the block to a byte boundary with NumPy, which releases the GIL, so the other threads keep working.
+    aligned = np.frombuffer(block, dtype=np.uint8)
+    if shift:
+        aligned = (aligned << shift) | np.append(aligned[1:] >> (8 - shift), np.uint8(0))
+    aligned = aligned[:(block_bits + 7) // 8]
+    # A single-block stream: header, the block, then the end-of-stream marker with the stream CRC, which for one
+    # block is the block CRC, padded to a whole byte.
+    tail_bits = block_bits % 8
+    trailer = ((END_OF_STREAM_MAGIC << 32 | block_crc) << 8) >> tail_bits
+    if tail_bits:
+        # the block's last, partial byte is shared with the start of the trailer
+        trailer |= (int(aligned[-1]) & (0xFF << (8 - tail_bits)) & 0xFF) << 80
+        aligned = aligned[:-1]
+        trailer_bytes = trailer.to_bytes(11, 'big')
+    else:
+        trailer_bytes = trailer.to_bytes(11, 'big')[:10]
+    retval = bz2.decompress(b''.join((b'BZh9', aligned.tobytes(), trailer_bytes)))
+    return retval
+
+
+def _find_magic(data: bytes, magic: int) -> list[int]:
+    """
+    Return the bit offsets of every occurrence of a 48-bit magic number in data.
+    """
+    retlist = []
+    for shift in range(8):
+        # Starting shift bits into a byte, the magic fills the 5 bytes after that byte, which can be found with
+        # bytes.find(); the bits in the bytes either side are then checked.
+        window = magic << (8 - shift)
+        middle = window.to_bytes(7, 'big')[1:6]
+        mask = ((1 << 48) - 1) << (8 - shift)
+        position = data.find(middle, 1)
+        while position != -1:
+            window_start = position - 1
+            if int.from_bytes(data[window_start:window_start + 7].ljust(7, b'\0'), 'big') & mask == window:
+                retlist.append(window_start * 8 + shift)
+            position = data.find(middle, position + 1)
+    return retlist
+
+
+def _find_markers(fh: IO[bytes], chunk_size: int) -> list[tuple[int, int, int]] | None:
+    """
+    Return (bit, magic, crc) for every block and end-of-stream magic number in fh, read chunk_size bytes at a time,
+    in order of bit.  Returns None if the file ends before the CRC after a magic number.
+    """
+    retlist = []
+    # A marker and its CRC take at most 11 bytes, so the bytes where one could start without ending inside the
+    # chunk are searched again with the next chunk.
+    overlap = 11
+    data = b''
+    data_offset = 0
+    while True:
+        chunk = fh.read(chunk_size)
+        data = data + chunk
+        # positions from here on are searched again with the next chunk, unless this is the last
+        limit = len(data) - overlap if chunk else len(data)
+        for magic in (BLOCK_MAGIC, END_OF_STREAM_MAGIC):
+            for bit in _find_magic(data, magic):
+                if bit // 8 >= limit:
+                    continue
+                if (bit + 80 + 7) // 8 > len(data):
+                    return None
+                retlist.append((data_offset * 8 + bit, magic, _bits(data, bit + 48, 32)))
+        if not chunk:
+            break
+        data_offset += max(limit, 0)
+        data = data[max(limit, 0):]
+    retlist.sort()
+    return retlist
+
+
+def bz2_block_spans(
+    source: bytes | IO[bytes],
+    chunk_size: int = DEFAULT_BLOCK_SIZE,
+) -> list[tuple[int, int, int]] | None:
+    """
+    Locate the compressed blocks of a bzip2 file, given as bytes or as a binary file object which is read from its
+    current position chunk_size bytes at a time.  Returns a (start_bit, end_bit, block_crc) tuple for each block,
+    in order, or None if the magic numbers found are not consistent with the CRCs, i.e. if the data is not bzip2, is
+    truncated, or contains a magic number by chance.  Bit offsets are relative to where the search started.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    markers = _find_markers(source, chunk_size)
+    if not markers or markers[-1][1] != END_OF_STREAM_MAGIC:
+        return None
+    retlist = []
+    combined_crc = 0
+    for (bit, magic, crc), (next_bit, _, _) in zip(markers, markers[1:] + [(None, None, None)]):
+        if magic == BLOCK_MAGIC:
+            retlist.append((bit, next_bit, crc))
+            combined_crc = (((combined_crc << 1) | (combined_crc >> 31)) & 0xFFFF_FFFF) ^ crc
+        else:
+            if crc != combined_crc:
+                return None
+            combined_crc = 0
+    return retlist
+
+
+def open_bz2_for_read(
+    path: Path,
+    mode: str = 'rb',
+    workers: int = None,
+    encoding: str = None,
+) -> IO[bytes] | IO[str]:
+    """
+    Like bz2.open() for reading ('rb' or 'rt'), but decompressing blocks in parallel.  With a single worker (by
+    default, a single available CPU), for files with fewer than MIN_PARALLEL_BLOCKS blocks, and for files which
+    bz2_block_spans() can't split, this is just bz2.open(), as splitting the file would only cost time.  Neither
+    the compressed nor the decompressed data is held in memory more than a few blocks at a time.
+    """
+    if mode not in ('r', 'rb', 'rt'):
+        raise ValueError(F'open_bz2_for_read only supports reading, not mode {mode!r}')
+    workers = workers or default_workers()
+    if workers > 1:
+        fh = open(path, 'rb')
+        try:
+            block_spans = bz2_block_spans(fh)
+        except BaseException:
+            fh.close()
+            raise
+        if block_spans is not None and len(block_spans) >= MIN_PARALLEL_BLOCKS:
+            retval = io.BufferedReader(ParallelBZ2Reader(fh, block_spans, workers=workers), buffer_size=1024 * 1024)
+            if mode == 'rt':
+                return io.TextIOWrapper(retval, encoding=encoding)
+            return retval
+        fh.close()
+    return bz2.open(path, mode, encoding=encoding)
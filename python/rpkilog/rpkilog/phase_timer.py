@@ -0,0 +1,126 @@
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+import resource
+import time
+import tracemalloc
+from typing import IO, Iterable, Iterator
+
+import psutil
+
+MIB = 1024 * 1024
+
+
+class PhaseTimer():
+    """
+    Accumulates wall-clock time, CPU time and memory use for named phases of a job, such as the decompress, parse,
+    diff and compress phases of vrp_diff_from_files.
+
+    Phases nest, and time spent in an inner phase is charged only to the inner phase, so the phases add up to the
+    time spent inside any of them.  Entering a phase again adds to its totals.  For each phase as_json_obj() reports:
+
+    - realtime, cpu: seconds.  cpu is this process's user + system time; worker processes are not included.
+    - rss_mb: the largest resident set size sampled when entering or leaving the phase.
+    - max_rss_mb: the process's high-water RSS when the phase was last left.  The first phase in which it reaches
+      its final value is where the process peaked.
+    - tracemalloc_peak_mb: the peak memory traced by tracemalloc during the phase, only if tracing was started
+      (e.g. PYTHONTRACEMALLOC=1).  Tracing is slow, so it is left to the caller.
+
+        timer = PhaseTimer()
+        with timer.phase('parse'):
+            ...
+        result_metadata['phases'] = timer.as_json_obj()
+    """
+    def __init__(self):
+        self.phases = {}
+        self._stack = []
+        self._process = psutil.Process()
+        self._started_realtime = None
+        self._started_cpu = None
+
+    def as_json_obj(self) -> dict:
+        retval = {
+            name: {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()}
+            for name, totals in self.phases.items()
+        }
+        return retval
+
+    def iter_phase(self, name: str, iterable: Iterable, chunk_size: int = 1024) -> Iterator:
+        """
+        Yield from iterable, charging the time spent producing its items to the named phase.  Items are fetched
+        chunk_size at a time, so that timing each item does not cost more than producing it.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield from chunk
+
+    @contextmanager
+    def phase(self, name: str):
+        self._switch()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def wrap_file(self, name: str, fh: IO) -> 'PhaseTimedFile':
+        """
+        Return fh with its read() and write() calls charged to the named phase.
+        """
+        retval = PhaseTimedFile(phase_timer=self, name=name, fh=fh)
+        return retval
+
+    def _switch(self):
+        """
+        Charge the time and memory since the last switch to the innermost phase, and restart the clocks.
+        """
+        now_realtime = time.perf_counter()
+        now_cpu = time.process_time()
+        if self._stack:
+            totals = self.phases.setdefault(self._stack[-1], {'realtime': 0.0, 'cpu': 0.0, 'rss_mb': 0})
+            totals['realtime'] += now_realtime - self._started_realtime
+            totals['cpu'] += now_cpu - self._started_cpu
+            totals['rss_mb'] = max(totals['rss_mb'], self._process.memory_info().rss // MIB)
+            # ru_maxrss is in KiB on Linux
+            totals['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+            if tracemalloc.is_tracing():
+                traced_peak_mb = tracemalloc.get_traced_memory()[1] / MIB
+                totals['tracemalloc_peak_mb'] = max(totals.get('tracemalloc_peak_mb', 0.0), traced_peak_mb)
+                tracemalloc.reset_peak()
+        self._started_realtime = now_realtime
+        self._started_cpu = now_cpu
+
+
+class PhaseTimedFile():
+    """
+    File wrapper returned by PhaseTimer.wrap_file().
+    """
+    def __init__(self, phase_timer: PhaseTimer, name: str, fh: IO):
+        self.phase_timer = phase_timer
+        self.name = name
+        self.fh = fh
+
+    def close(self):
+        with self.phase_timer.phase(self.name):
+            self.fh.close()
+
+    def read(self, *args):
+        with self.phase_timer.phase(self.name):
+            return self.fh.read(*args)
+
+    def write(self, data):
+        with self.phase_timer.phase(self.name):
+            return self.fh.write(data)
+
+
+def optional_phase(phase_timer: PhaseTimer | None, name: str):
+    """
+    phase_timer.phase(name), or a context manager which does nothing if phase_timer is None.
+    """
+    if phase_timer is None:
+        return nullcontext()
+    return phase_timer.phase(name)
@@ -1,11 +1,239 @@
-from datetime import datetime
+from datetime import datetime, timezone
+import functools
 import re
+import socket
+import sys
 
 import dateutil.parser
 import netaddr
+import numpy as np
+
+
+def parse_prefix(prefix: str) -> tuple[int, int, int]:
+    '''
+    Parse a prefix string such as '192.0.2.0/24' or '2001:db8::/32' into (version, network, prefixlen) without
+    going through netaddr.  Host bits are masked off.  Raises ValueError if the prefix is not valid.
+
+    >>> parse_prefix('192.0.2.0/24')
+    (4, 3221225984, 24)
+    '''
+    addr, _, prefixlen_str = prefix.partition('/')
+    if ':' in addr:
+        version, family, width = 6, socket.AF_INET6, 128
+    else:
+        version, family, width = 4, socket.AF_INET, 32
+    try:
+        value = int.from_bytes(socket.inet_pton(family, addr))
+    except OSError:
+        raise ValueError(F'Invalid prefix {prefix}')
+    if prefixlen_str:
+        if not prefixlen_str.isdigit():
+            raise ValueError(F'Invalid prefix {prefix}')
+        prefixlen = int(prefixlen_str)
+        if prefixlen > width:
+            raise ValueError(F'Invalid prefix {prefix}')
+    else:
+        prefixlen = width
+    network = value >> (width - prefixlen) << (width - prefixlen)
+    return version, network, prefixlen
+
+
+@functools.lru_cache(maxsize=65536)
+def canonical_prefix(prefix: str) -> tuple[int, int, str]:
+    '''
+    Return (version, prefixlen, canonical) for a prefix string, where canonical is str(roa.prefix) of a Roa built
+    from it: host bits masked off and formatted by netaddr.  Raises ValueError if the prefix is not valid.  Results
+    are cached, since the same prefixes turn up in diff after diff.
+
+    >>> canonical_prefix('2001:DB8:0:0::1/32')
+    (6, 32, '2001:db8::/32')
+    '''
+    version, network, prefixlen = parse_prefix(prefix)
+    canonical = str(netaddr.IPNetwork((network, prefixlen), version=version))
+    return version, prefixlen, canonical
+
+
+def format_utc_timestamp(timestamp: int) -> str:
+    '''
+    Inverse of parse_utc_timestamp().  Returns the same string as
+    datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'), but only the date goes
+    through datetime, once per day, and the time of day is formatted arithmetically.
+
+    >>> format_utc_timestamp(1742048251)
+    '2025-03-15T14:17:31Z'
+    '''
+    days, seconds = divmod(timestamp, 86400)
+    date = _utc_date_cache.get(days)
+    if date is None:
+        date = datetime.fromtimestamp(days * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+        _utc_date_cache[days] = date
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    retval = F'{date}T{hours:02d}:{minutes:02d}:{seconds:02d}Z'
+    return retval
+
+
+# format_utc_timestamp()'s formatted dates, by days since the epoch.  Expiry times fall on a few hundred days.
+_utc_date_cache = {}
+
+
+# Routinator writes every timestamp in exactly this form, e.g. 2025-03-15T14:17:31Z
+ISO8601_UTC_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z')
+
+
+def parse_utc_timestamp(timestamp: str) -> int:
+    '''
+    Convert an ISO-8601 timestamp to integer seconds since the epoch.  Timestamps in Routinator's fixed
+    YYYY-MM-DDTHH:MM:SSZ form are parsed directly; anything else is handed to dateutil, which is around 100
+    times slower.
+
+    >>> parse_utc_timestamp('2025-03-15T14:17:31Z')
+    1742048251
+    '''
+    if rem := ISO8601_UTC_RE.fullmatch(timestamp):
+        retval = int(datetime(*map(int, rem.groups()), tzinfo=timezone.utc).timestamp())
+    else:
+        retval = int(dateutil.parser.parse(timestamp).timestamp())
+    return retval
+
+
+def parse_utc_timestamps(timestamps: list[str]) -> list[int]:
+    '''
+    Vectorized parse_utc_timestamp().  Timestamps in the fixed YYYY-MM-DDTHH:MM:SSZ form are converted all at
+    once by NumPy's datetime64 parser; only the rest go through dateutil.  Raises ValueError for out-of-range
+    fields such as month 13.
+    '''
+    strict = [ISO8601_UTC_RE.fullmatch(timestamp) is not None for timestamp in timestamps]
+    # NumPy deprecates time zone designators, so strip the Z; NaT stands in for the timestamps parsed below.
+    retlist = np.array(
+        [timestamp[:-1] if is_strict else 'NaT' for timestamp, is_strict in zip(timestamps, strict)],
+        dtype='datetime64[s]',
+    ).astype(np.int64).tolist()
+    for row, is_strict in enumerate(strict):
+        if not is_strict:
+            retlist[row] = int(dateutil.parser.parse(timestamps[row]).timestamp())
+    return retlist
+
+
+def routinator_columns(routinator_roas: list[dict], first_row: int = 0) -> dict[str, list]:
+    '''
+    Routinator jsonext equivalent of rpkiclient_columns().  As in Roa.new_from_routinator_jsonext(), the TA and
+    expiry time are taken from the first source attestation, expires being its "stale" time.
+    '''
+    rpkiclient_roas = []
+    stale = []
+    for row, roa in enumerate(routinator_roas, start=first_row):
+        if missing := {'asn', 'prefix', 'maxLength', 'source'} - roa.keys():
+            raise KeyError(F'row {row}: Routinator ROA is missing required keys: {missing}')
+        selected_source = roa['source'][0]
+        rpkiclient_roas.append({
+            'asn': roa['asn'],
+            'prefix': roa['prefix'],
+            'maxLength': roa['maxLength'],
+            'ta': selected_source['tal'],
+        })
+        stale.append(selected_source['stale'])
+    retval = rpkiclient_columns(rpkiclient_roas, first_row=first_row)
+    retval['expires'] = parse_utc_timestamps(stale)
+    return retval
+
+
+def rpkiclient_columns(rpkiclient_roas: list[dict], first_row: int = 0) -> dict[str, list]:
+    '''
+    Parse a list of rpki-client ROA dicts into per-field lists of Python values: family, network, prefixlen,
+    maxLength, asn, ta and expires.  Prefixes are parsed with parse_prefix() and "AS64496" style asn strings are
+    converted.  Parse and type errors are raised with the offending row index, counting from first_row when the
+    list is one batch of a larger snapshot.  Bounds are not checked here; pass the numeric columns to
+    validate_columns() for that.
+    '''
+    family = []
+    network = []
+    prefixlen = []
+    asn = []
+    for row, roa in enumerate(rpkiclient_roas, start=first_row):
+        try:
+            v, n, p = parse_prefix(roa['prefix'])
+        except ValueError as exc:
+            raise ValueError(F'row {row}: {exc}') from exc
+        family.append(v)
+        network.append(n)
+        prefixlen.append(p)
+        roa_asn = roa['asn']
+        if isinstance(roa_asn, str):
+            # tolerate old VRP Cache files with asn="AS64496" instead of asn=64496
+            rem = re.match(r'^AS(?P<asn>\d+)$', roa_asn)
+            if not rem:
+                raise ValueError(F'row {row}: Cannot get integer ASN from asn passed as string: {roa_asn}')
+            roa_asn = int(rem.group('asn'))
+        asn.append(roa_asn)
+        if not isinstance(roa['ta'], str):
+            raise TypeError(F'row {row}: Expecting ta to be a str but got a {type(roa["ta"])}: {roa["ta"]}')
+    retval = {
+        'family': family,
+        'network': network,
+        'prefixlen': prefixlen,
+        'maxLength': [roa['maxLength'] for roa in rpkiclient_roas],
+        'asn': asn,
+        'ta': [roa['ta'] for roa in rpkiclient_roas],
+        'expires': [roa.get('expires', 0) for roa in rpkiclient_roas],
+    }
+    return retval
+
+
+def validate_columns(
+        family: np.ndarray,
+        prefixlen: np.ndarray,
+        maxLength: np.ndarray,
+        asn: np.ndarray,
+        expires: np.ndarray,
+):
+    '''
+    Perform the bounds checks of Roa.__init__ on whole columns at once.  Raises ValueError naming the offending
+    row indexes (up to 10 of them).  Signed arrays wide enough to hold the unchecked values should be passed, so
+    that out-of-range values are not wrapped before they are checked.
+    '''
+    columns = {'family': family, 'prefixlen': prefixlen, 'maxLength': maxLength, 'asn': asn, 'expires': expires}
+    width = np.where(family == 6, 128, 32)
+    checks = [
+        ('family', (family != 4) & (family != 6)),
+        ('prefixlen', (prefixlen < 0) | (prefixlen > width)),
+        ('maxLength', (maxLength < prefixlen) | (maxLength > width)),
+        ('asn', (asn < 0) | (asn > 2 ** 32 - 1)),
+        ('expires', expires < 0),
+    ]
+    for cname, invalid in checks:
+        if invalid.any():
+            rows = np.flatnonzero(invalid)
+            raise ValueError(
+                F'Invalid {cname} in {len(rows)} rows: '
+                + ', '.join(F'row {row} {cname}={columns[cname][row]}' for row in rows[:10])
+            )
 
 
 class Roa():
+    """
+    A single VRP (prefix, maxLength, asn, ta) along with its expiry time.
+
+    Hundreds of thousands of these are held in memory during a diff, so the class uses __slots__ and keeps the
+    prefix as plain integers (prefix_version, prefix_network, prefixlen).  The netaddr.IPNetwork is only
+    materialized when the prefix property is accessed.  Prefixes are stored in their canonical CIDR form, so
+    '192.0.2.5/24' is kept as 192.0.2.0/24.
+
+    The sort key is computed on first use and cached, so Roa objects should be treated as immutable.
+    """
+    __slots__ = (
+        '_sortable',
+        'asn',
+        'expires',
+        'maxLength',
+        'prefix_network',
+        'prefix_version',
+        'prefixlen',
+        'source_host',
+        'source_time',
+        'ta',
+    )
+
     def __init__(
             self,
             asn: int,
@@ -27,24 +255,26 @@ class Roa():
         self.asn = int(asn)
         if not isinstance(prefix, netaddr.IPNetwork):
             prefix = netaddr.IPNetwork(prefix)
-        self.prefix = prefix
+        self.prefix_version = prefix.version
+        self.prefix_network = prefix.first
+        self.prefixlen = prefix.prefixlen
         if maxLength < prefix.prefixlen:
             raise ValueError(F'Invalid maxLength {maxLength} for prefix {prefix}')
-        if self.prefix.version == 4 and maxLength > 32:
+        if self.prefix_version == 4 and maxLength > 32:
             raise ValueError(F'Invalid maxLength {maxLength} for prefix {prefix}')
-        if self.prefix.version == 6 and maxLength > 128:
+        if self.prefix_version == 6 and maxLength > 128:
             raise ValueError(F'Invalid maxLength {maxLength} for prefix {prefix}')
         self.maxLength = maxLength
         if not isinstance(ta, str):
             raise TypeError(F'Expecting ta to be a str but got a {type(ta)}: {ta}')
-        self.ta = ta
+        # There are only a handful of distinct TA names; share one str object between all the Roa objects.
+        self.ta = sys.intern(ta)
         if expires < 0:
             raise ValueError(F'Invalid expires {expires}')
         self.expires = expires
-        if source_host is not None:
-            self.source_host = source_host
-        if source_time is not None:
-            self.source_time = source_time
+        self.source_host = source_host
+        self.source_time = source_time
+        self._sortable = None
 
     def __eq__(self, other):
         if not isinstance(other, Roa):
@@ -65,7 +295,7 @@ class Roa():
         retval['asn'] = self.asn
         retval['expires'] = self.expires
         retval['maxLength'] = self.maxLength
-        retval['prefix'] = str(self.prefix.cidr)
+        retval['prefix'] = str(self.prefix)
         retval['ta'] = self.ta
         return retval
 
@@ -75,7 +305,7 @@ class Roa():
         '''
         retstr = (
             F'{{'
-            F' "prefix": "{str(self.prefix.cidr)}",'
+            F' "prefix": "{str(self.prefix)}",'
             F' "maxLength": {self.maxLength},'
             F' "asn": {self.asn},'
             F' "expires": {self.expires},'
@@ -84,6 +314,83 @@ class Roa():
         )
         return retstr
 
+    @classmethod
+    def batch_from_columns(cls, columns: dict[str, list]) -> list:
+        '''
+        Validate the columns returned by rpkiclient_columns() or routinator_columns() and build a Roa per row.
+        '''
+        validate_columns(
+            family=np.array(columns['family'], dtype=np.int64),
+            prefixlen=np.array(columns['prefixlen'], dtype=np.int64),
+            maxLength=np.array(columns['maxLength'], dtype=np.int64),
+            asn=np.array(columns['asn'], dtype=np.int64),
+            expires=np.array(columns['expires'], dtype=np.int64),
+        )
+        retlist = list(map(
+            cls.new_from_int_prefix,
+            columns['asn'],
+            columns['family'],
+            columns['network'],
+            columns['prefixlen'],
+            columns['maxLength'],
+            columns['ta'],
+            columns['expires'],
+        ))
+        return retlist
+
+    @classmethod
+    def batch_from_routinator_jsonext(cls, routinator_roas: list[dict]) -> list:
+        '''
+        Build Roa objects from a list of Routinator jsonext ROA dicts.  Equivalent to calling
+        new_from_routinator_jsonext() on each of them, but parsed a column at a time like batch_from_rpkiclient().
+        '''
+        retlist = cls.batch_from_columns(routinator_columns(routinator_roas))
+        return retlist
+
+    @classmethod
+    def batch_from_rpkiclient(cls, rpkiclient_roas: list[dict]) -> list:
+        '''
+        Build Roa objects from a list of rpki-client ROA dicts, e.g. the "roas" array of a summary file.
+
+        This is equivalent to [Roa(**roa_dict) for roa_dict in rpkiclient_roas] but much faster: prefixes are
+        parsed without netaddr and the bounds checks are performed on whole columns by validate_columns().  Errors
+        are reported by row index.
+        '''
+        retlist = cls.batch_from_columns(rpkiclient_columns(rpkiclient_roas))
+        return retlist
+
+    @classmethod
+    def new_from_int_prefix(
+            cls,
+            asn: int,
+            prefix_version: int,
+            prefix_network: int,
+            prefixlen: int,
+            maxLength: int,
+            ta: str,
+            expires: int = 0,
+    ):
+        '''
+        Build a Roa from fields which have already been parsed and validated, e.g. a row of a RoaTable.
+        No validation is performed, so only use this for trusted input.
+
+        >>> roa = Roa.new_from_int_prefix(64496, 4, 3221225984, 24, 24, 'test', 372920400)
+        >>> str(roa.prefix)
+        '192.0.2.0/24'
+        '''
+        retval = cls.__new__(cls)
+        retval.asn = asn
+        retval.prefix_version = prefix_version
+        retval.prefix_network = prefix_network
+        retval.prefixlen = prefixlen
+        retval.maxLength = maxLength
+        retval.ta = sys.intern(ta)
+        retval.expires = expires
+        retval.source_host = None
+        retval.source_time = None
+        retval._sortable = None
+        return retval
+
     @classmethod
     def new_from_routinator_jsonext(
             cls,
@@ -129,7 +436,7 @@ class Roa():
             constructor_args['asn'] = rem.group('asn')
         else:
             raise ValueError(f'unrecognizable asn field in ROA: {routinator_json}')
-        constructor_args['expires'] = int(dateutil.parser.parse(selected_source['stale']).timestamp())
+        constructor_args['expires'] = parse_utc_timestamp(selected_source['stale'])
 
         if source_host:
             constructor_args['source_host'] = source_host
@@ -153,30 +460,41 @@ class Roa():
         retval = cls(**constructor_args)
         return retval
 
+    @property
+    def prefix(self) -> netaddr.IPNetwork:
+        '''
+        Materialize a netaddr.IPNetwork from the integer prefix fields.  A new object is returned on each access.
+        '''
+        retval = netaddr.IPNetwork((self.prefix_network, self.prefixlen), version=self.prefix_version)
+        return retval
+
     def primary_key(self):
         '''
         Return a tuple which can be used to compare ROAs and determine if they are for the same
-        prefix, maxLength, asn, and ta.  For example:
+        prefix, maxLength, asn, and ta.  It holds the same fields as sortable() without expires, but as they are,
+        so that hashing Roa objects by primary key (as the hash-join engine does) doesn't compute the sort key.  Only
+        use it for equality, not for ordering.  For example:
 
-        >>> roa1 = Roa(asn=64496, prefix='192.0.2.0/24', maxLength=24, ta='test', expires='372920400')
-        >>> roa2 = Roa(asn=64496, prefix='192.0.2.0/24', maxLength=24, ta='test', expires='1000000000')
+        >>> roa1 = Roa(asn=64496, prefix='192.0.2.0/24', maxLength=24, ta='test', expires=372920400)
+        >>> roa2 = Roa(asn=64496, prefix='192.0.2.0/24', maxLength=24, ta='test', expires=1000000000)
         >>> roa1.primary_key() == roa2.primary_key()
         True
-        >>> roa1.primary_key()
-        ('192.0.2.0/24', 24, 64496, 'test')
-        '''
-        retval = tuple([
-            self.prefix.cidr,
-            self.maxLength,
-            self.asn,
-            self.ta
-        ])
+        '''
+        retval = (self.prefix_version, self.prefix_network, self.prefixlen, self.maxLength, self.asn, self.ta)
         return retval
 
     def sortable(self):
         '''
-        Return a containing: netaddr.IPNetwork(prefix).sort_key(), maxLength, asn, ta, expires.
-        This is usable by sorted() and our comparison methods __eq__, __lt__, __le__, __ge__, __gt__.
+        Return a tuple (packed_key, ta, expires) usable by sorted() and our comparison methods.
+
+        packed_key is a single int holding prefix version, network, prefixlen, maxLength and asn, from most to
+        least significant, so comparing it orders ROAs the same way as comparing the tuple
+        netaddr.IPNetwork(prefix).sort_key() + (maxLength, asn) would.  The tuple is built once and cached.
         '''
-        rettu = self.prefix.sort_key() + tuple([self.maxLength, self.asn, self.ta, self.expires])
-        return rettu
+        if self._sortable is None:
+            packed_key = self.prefix_version << 128 | self.prefix_network
+            packed_key = packed_key << 8 | self.prefixlen
+            packed_key = packed_key << 8 | self.maxLength
+            packed_key = packed_key << 32 | self.asn
+            self._sortable = (packed_key, self.ta, self.expires)
+        return self._sortable
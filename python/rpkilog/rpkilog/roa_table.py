@@ -0,0 +1,417 @@
+import itertools
+import logging
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+import sys
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from rpkilog.phase_timer import PhaseTimer
+from rpkilog.roa import Roa, routinator_columns, rpkiclient_columns, validate_columns
+from rpkilog.summary_reader import SummaryReader
+
+logger = logging.getLogger(__name__)
+
+
+class RoaTable():
+    """
+    Columnar representation of a whole VRP snapshot.  Instead of one Roa object per VRP, each field is kept in
+    its own contiguous NumPy array:
+
+        family      uint8   4 or 6
+        network_hi  uint64  upper 64 bits of the prefix's network address (always 0 for IPv4)
+        network_lo  uint64  lower 64 bits of the prefix's network address
+        prefixlen   uint8
+        maxLength   uint8
+        asn         uint32
+        ta_code     uint16  index into ta_names
+        expires     int64
+
+    ta_names is kept sorted, so ordering by ta_code is the same as ordering by the TA name.  is_sorted records
+    that the rows are already in sort_order(), e.g. because the table was loaded from an .rpkisnap file.
+
+    Iterating over a RoaTable yields Roa objects, built lazily, so it may be passed to existing code which
+    expects a list of Roa objects.
+    """
+    column_dtypes = {
+        'family': np.uint8,
+        'network_hi': np.uint64,
+        'network_lo': np.uint64,
+        'prefixlen': np.uint8,
+        'maxLength': np.uint8,
+        'asn': np.uint32,
+        'ta_code': np.uint16,
+        'expires': np.int64,
+    }
+    # Columns which identify a VRP, in Roa.sortable() order.  Two rows with equal key columns have equal
+    # Roa.primary_key() values.
+    key_columns = ('family', 'network_hi', 'network_lo', 'prefixlen', 'maxLength', 'asn', 'ta_code')
+    # number of rows converted to Python objects at a time while iterating
+    iter_chunk_size = 4096
+
+    def __init__(
+            self,
+            family: np.ndarray,
+            network_hi: np.ndarray,
+            network_lo: np.ndarray,
+            prefixlen: np.ndarray,
+            maxLength: np.ndarray,
+            asn: np.ndarray,
+            ta_code: np.ndarray,
+            expires: np.ndarray,
+            ta_names: list[str],
+            metadata: dict = None,
+            is_sorted: bool = False,
+    ):
+        self.family = family
+        self.network_hi = network_hi
+        self.network_lo = network_lo
+        self.prefixlen = prefixlen
+        self.maxLength = maxLength
+        self.asn = asn
+        self.ta_code = ta_code
+        self.expires = expires
+        self.ta_names = list(ta_names)
+        self.metadata = metadata
+        self.is_sorted = is_sorted
+        row_counts = {len(getattr(self, cname)) for cname in self.column_dtypes}
+        if len(row_counts) > 1:
+            raise ValueError(F'RoaTable columns have differing lengths: {row_counts}')
+
+    def __getitem__(self, index: int) -> Roa:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(F'RoaTable index out of range: {index}')
+        return next(self.iter_roas(start=index, stop=index + 1))
+
+    def __iter__(self) -> Iterator[Roa]:
+        return self.iter_roas()
+
+    def __len__(self) -> int:
+        return len(self.family)
+
+    def __repr__(self):
+        return F'{self.__class__.__name__}(rows={len(self)}, ta_names={self.ta_names}, nbytes={self.nbytes})'
+
+    @classmethod
+    def new_from_columns(
+            cls,
+            family: Iterable[int],
+            network: Iterable[int],
+            prefixlen: Iterable[int],
+            maxLength: Iterable[int],
+            asn: Iterable[int],
+            ta: Iterable[str],
+            expires: Iterable[int],
+            metadata: dict = None,
+    ):
+        """
+        Build a RoaTable from per-field sequences of Python values (network as a full-width int, ta as a str)
+        and validate it.  This is the common back-end of the other constructors.
+        """
+        network = list(network)
+        ta = list(ta)
+        ta_names = sorted(set(ta))
+        ta_code_map = {name: code for code, name in enumerate(ta_names)}
+        # Build wide signed arrays first so out-of-range values are caught by validate() rather than wrapping.
+        columns = {
+            'family': np.array(family, dtype=np.int64),
+            'network_hi': np.array([n >> 64 for n in network], dtype=np.uint64),
+            'network_lo': np.array([n & 0xFFFF_FFFF_FFFF_FFFF for n in network], dtype=np.uint64),
+            'prefixlen': np.array(prefixlen, dtype=np.int64),
+            'maxLength': np.array(maxLength, dtype=np.int64),
+            'asn': np.array(asn, dtype=np.int64),
+            'ta_code': np.array([ta_code_map[name] for name in ta], dtype=np.int64),
+            'expires': np.array(expires, dtype=np.int64),
+        }
+        table = cls._new_validated(columns=columns, ta_names=ta_names, metadata=metadata)
+        return table
+
+    @classmethod
+    def new_from_file(cls, path: Path, phase_timer: PhaseTimer = None):
+        """
+        Load an rpki-client summary or Routinator jsonext file, optionally bzip2 compressed.  phase_timer is passed
+        to the SummaryReader.
+        """
+        with SummaryReader.new_from_path(path, phase_timer=phase_timer) as reader:
+            return cls.new_from_summary_reader(reader)
+
+    @classmethod
+    def new_from_roas(cls, roas: Iterable[Roa], metadata: dict = None):
+        """
+        Build a RoaTable from Roa objects.
+        """
+        roas = list(roas)
+        table = cls.new_from_columns(
+            family=[roa.prefix_version for roa in roas],
+            network=[roa.prefix_network for roa in roas],
+            prefixlen=[roa.prefixlen for roa in roas],
+            maxLength=[roa.maxLength for roa in roas],
+            asn=[roa.asn for roa in roas],
+            ta=[roa.ta for roa in roas],
+            expires=[roa.expires for roa in roas],
+            metadata=metadata,
+        )
+        return table
+
+    @classmethod
+    def new_from_routinator_batches(cls, batches: Iterable[list[dict]], metadata: dict = None):
+        """
+        Routinator jsonext equivalent of new_from_rpkiclient_batches().  Each record is interpreted the same way as
+        Roa.new_from_routinator_jsonext.
+        """
+        table = cls._new_from_column_batches(batches, columns_func=routinator_columns, metadata=metadata)
+        return table
+
+    @classmethod
+    def new_from_routinator_jsonext(cls, routinator_json: dict):
+        """
+        Build a RoaTable from a whole Routinator jsonext document.
+        """
+        table = cls.new_from_routinator_batches([routinator_json['roas']], metadata=routinator_json.get('metadata'))
+        return table
+
+    @classmethod
+    def new_from_rpkiclient_batches(cls, batches: Iterable[list[dict]], metadata: dict = None):
+        """
+        Build a RoaTable from rpki-client ROA dicts arriving in batches, e.g. from SummaryReader.iter_batches().
+        Each batch is packed into NumPy arrays as it arrives, so only one batch of dicts needs to exist at once.
+        """
+        table = cls._new_from_column_batches(batches, columns_func=rpkiclient_columns, metadata=metadata)
+        return table
+
+    @classmethod
+    def new_from_rpkiclient_json(cls, rpkiclient_json: dict):
+        """
+        Build a RoaTable from a whole rpki-client summary document, i.e. `{"metadata": {...}, "roas": [...]}`.
+        The prefix is parsed without netaddr; all bounds checks are done on whole columns by validate().
+        """
+        table = cls.new_from_rpkiclient_batches([rpkiclient_json['roas']], metadata=rpkiclient_json.get('metadata'))
+        return table
+
+    @classmethod
+    def new_from_shared_memory(cls, spec: dict):
+        """
+        Attach to a table published by to_shared_memory() in another process.  Returns (SharedMemory, RoaTable);
+        the columns are views into the shared block, so the table must be discarded before the block is closed.
+        """
+        if sys.version_info >= (3, 13):
+            # the creating process owns the block; don't let this process's resource tracker unlink it
+            shm = SharedMemory(name=spec['name'], track=False)
+        else:
+            shm = SharedMemory(name=spec['name'])
+        columns = {
+            cname: np.ndarray(spec['rows'], dtype=dtype, buffer=shm.buf, offset=spec['offsets'][cname])
+            for cname, dtype in cls.column_dtypes.items()
+        }
+        table = cls(**columns, ta_names=spec['ta_names'], is_sorted=spec['is_sorted'])
+        return shm, table
+
+    @classmethod
+    def new_from_summary_reader(cls, reader: SummaryReader):
+        """
+        Build a RoaTable from an rpki-client summary or Routinator jsonext document as it is read, without ever
+        holding the whole decoded document in memory.
+        """
+        batches = reader.iter_batches()
+        first_batch = next(batches, [])
+        batches = itertools.chain([first_batch], batches)
+        # ducktype
+        if len(first_batch) and 'source' in first_batch[0]:
+            return cls.new_from_routinator_batches(batches, metadata=reader.metadata)
+        return cls.new_from_rpkiclient_batches(batches, metadata=reader.metadata)
+
+    @classmethod
+    def new_from_tables(cls, tables: Iterable['RoaTable'], metadata: dict = None):
+        """
+        Stack the rows of several tables into one, in the given order, remapping ta_code to the union of their
+        ta_names.  The result is not sorted.
+        """
+        tables = list(tables)
+        ta_names = sorted(set().union(*(table.ta_names for table in tables)))
+        tables = [table.with_ta_names(ta_names) for table in tables]
+        columns = {
+            cname: np.concatenate([getattr(table, cname) for table in tables]).astype(dtype, copy=False)
+            if tables else np.zeros(0, dtype=dtype)
+            for cname, dtype in cls.column_dtypes.items()
+        }
+        table = cls(**columns, ta_names=ta_names, metadata=metadata)
+        return table
+
+    @classmethod
+    def _new_from_column_batches(
+            cls,
+            batches: Iterable[list[dict]],
+            columns_func: Callable[[list[dict], int], dict[str, list]],
+            metadata: dict,
+    ):
+        """
+        Common back-end of new_from_rpkiclient_batches() and new_from_routinator_batches().  columns_func is
+        rpkiclient_columns() or routinator_columns().
+        """
+        parts = {cname: [] for cname in cls.column_dtypes}
+        # TA codes are assigned in order of first appearance, then renumbered once all TA names are known
+        ta_code_map = {}
+        first_row = 0
+        for batch in batches:
+            columns = columns_func(batch, first_row=first_row)
+            first_row += len(batch)
+            network = columns.pop('network')
+            parts['network_hi'].append(np.array([n >> 64 for n in network], dtype=np.uint64))
+            parts['network_lo'].append(np.array([n & 0xFFFF_FFFF_FFFF_FFFF for n in network], dtype=np.uint64))
+            ta_codes = [ta_code_map.setdefault(name, len(ta_code_map)) for name in columns.pop('ta')]
+            parts['ta_code'].append(np.array(ta_codes, dtype=np.int64))
+            # Wide signed arrays so out-of-range values are caught by validate() rather than wrapping.
+            for cname, values in columns.items():
+                parts[cname].append(np.array(values, dtype=np.int64))
+        ta_names = sorted(ta_code_map)
+        ta_code_remap = np.array([ta_names.index(name) for name in ta_code_map], dtype=np.int64)
+        columns = {
+            cname: np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+            for cname, arrays in parts.items()
+        }
+        columns['ta_code'] = ta_code_remap[columns['ta_code']]
+        table = cls._new_validated(columns=columns, ta_names=ta_names, metadata=metadata)
+        return table
+
+    @classmethod
+    def _new_validated(cls, columns: dict[str, np.ndarray], ta_names: list[str], metadata: dict):
+        """
+        Build a RoaTable from wide signed columns, validate it, then narrow the columns to column_dtypes.
+        """
+        table = cls(**columns, ta_names=ta_names, metadata=metadata)
+        table.validate()
+        for cname, dtype in cls.column_dtypes.items():
+            setattr(table, cname, getattr(table, cname).astype(dtype, copy=False))
+        return table
+
+    def iter_roas(self, start: int = 0, stop: int = None) -> Iterator[Roa]:
+        """
+        Yield a Roa object for each row in [start, stop).  Rows are converted to Python values a chunk at a time
+        so only one chunk's worth of Python objects exists at once (plus whatever the caller keeps).
+        """
+        if stop is None:
+            stop = len(self)
+        for chunk_start in range(start, stop, self.iter_chunk_size):
+            chunk = slice(chunk_start, min(chunk_start + self.iter_chunk_size, stop))
+            columns = zip(
+                self.family[chunk].tolist(),
+                self.network_hi[chunk].tolist(),
+                self.network_lo[chunk].tolist(),
+                self.prefixlen[chunk].tolist(),
+                self.maxLength[chunk].tolist(),
+                self.asn[chunk].tolist(),
+                self.ta_code[chunk].tolist(),
+                self.expires[chunk].tolist(),
+            )
+            for family, network_hi, network_lo, prefixlen, maxLength, asn, ta_code, expires in columns:
+                yield Roa.new_from_int_prefix(
+                    asn=asn,
+                    prefix_version=family,
+                    prefix_network=network_hi << 64 | network_lo,
+                    prefixlen=prefixlen,
+                    maxLength=maxLength,
+                    ta=self.ta_names[ta_code],
+                    expires=expires,
+                )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Total size of the column buffers.
+        """
+        retval = sum(getattr(self, cname).nbytes for cname in self.column_dtypes)
+        return retval
+
+    def slice(self, start: int, stop: int):
+        """
+        Return a RoaTable of rows [start, stop) whose columns are views into this table's columns.
+        """
+        columns = {cname: getattr(self, cname)[start:stop] for cname in self.column_dtypes}
+        retval = self.__class__(**columns, ta_names=self.ta_names, metadata=self.metadata, is_sorted=self.is_sorted)
+        return retval
+
+    def sort_order(self) -> np.ndarray:
+        """
+        Return the row indexes which would sort the table in the same order as sorted(roas, key=Roa.sortable).
+        """
+        # np.lexsort uses the LAST key as the primary sort key
+        sort_keys = [self.expires] + [getattr(self, cname) for cname in reversed(self.key_columns)]
+        retval = np.lexsort(sort_keys)
+        return retval
+
+    def sorted(self):
+        """
+        Return this table in sort_order(), without re-sorting it if it is already known to be sorted.
+        """
+        if self.is_sorted:
+            return self
+        retval = self.take(self.sort_order())
+        retval.is_sorted = True
+        return retval
+
+    def take(self, indices: np.ndarray):
+        """
+        Return a new RoaTable containing the given rows, in the given order.
+        """
+        columns = {cname: getattr(self, cname)[indices] for cname in self.column_dtypes}
+        retval = self.__class__(**columns, ta_names=self.ta_names, metadata=self.metadata)
+        return retval
+
+    def to_shared_memory(self) -> tuple[SharedMemory, dict]:
+        """
+        Copy the columns into a new SharedMemory block so worker processes can use them without pickling.  Returns
+        the block, which the caller must close() and unlink() when the workers are done, and a small picklable spec
+        to pass to new_from_shared_memory().
+        """
+        offsets = {}
+        size = 0
+        for cname, dtype in self.column_dtypes.items():
+            offsets[cname] = size
+            # keep every column 8-byte aligned
+            size += -(-len(self) * np.dtype(dtype).itemsize // 8) * 8
+        # SharedMemory refuses a size of zero
+        shm = SharedMemory(create=True, size=max(size, 1))
+        for cname, dtype in self.column_dtypes.items():
+            shared_column = np.ndarray(len(self), dtype=dtype, buffer=shm.buf, offset=offsets[cname])
+            shared_column[:] = getattr(self, cname)
+            del shared_column
+        spec = {
+            'name': shm.name,
+            'rows': len(self),
+            'offsets': offsets,
+            'ta_names': self.ta_names,
+            'is_sorted': self.is_sorted,
+        }
+        return shm, spec
+
+    def validate(self):
+        """
+        Bounds-check every column at once with validate_columns().  Raises ValueError naming the offending rows.
+        """
+        validate_columns(
+            family=self.family,
+            prefixlen=self.prefixlen,
+            maxLength=self.maxLength,
+            asn=self.asn,
+            expires=self.expires,
+        )
+
+    def with_ta_names(self, ta_names: list[str]):
+        """
+        Return a RoaTable whose ta_code column indexes into the given ta_names, which must be sorted and must
+        include every TA name present in this table.  Used to give two tables comparable ta_code columns.
+        """
+        ta_names = list(ta_names)
+        if ta_names != sorted(ta_names):
+            raise ValueError(F'ta_names must be sorted: {ta_names}')
+        if ta_names == self.ta_names:
+            return self
+        ta_code_map = np.array([ta_names.index(name) for name in self.ta_names], dtype=np.uint16)
+        columns = {cname: getattr(self, cname) for cname in self.column_dtypes}
+        columns['ta_code'] = ta_code_map[self.ta_code]
+        # ta_names is a sorted superset of self.ta_names, so remapping preserves the order of ta_code
+        retval = self.__class__(**columns, ta_names=ta_names, metadata=self.metadata, is_sorted=self.is_sorted)
+        return retval
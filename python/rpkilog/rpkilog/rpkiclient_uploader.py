@@ -3,7 +3,6 @@ This is being written in a bit of a rush to start sourcing snapshots from our ow
 There is opportunity for re-use being ignored here.
 """
 import argparse
-import bz2
 from datetime import datetime, timezone, UTC
 import json
 import logging
@@ -14,6 +13,8 @@ import boto3
 import dateutil.parser
 import psutil
 
+from rpkilog.parallel_bz2 import parallel_bz2_compress
+
 
 logger = logging.getLogger(__name__)
 MINIMUM_JSON_SIZE = 8_500_000
@@ -50,7 +51,7 @@ def s3_upload(rpkiclient_json: Path, s3_bucket_name: str) -> str | None:
         logger.info(f'Currently available rpkiclient json file {json_datetime} has already been uploaded.')
         return None
     logger.info(f'Preparing to upload {len(json_buffer)/1048576:.1f} MB by compressing to {bz2_filename}')
-    bz2_buffer = bz2.compress(json_buffer)
+    bz2_buffer = parallel_bz2_compress(json_buffer)
     bucket = boto3.resource('s3').Bucket(s3_bucket_name)
     logger.info(f'Uploading {bz2_filename} to {s3_bucket_name} uncompressed: {len(json_buffer)/1048576:.1f} MB'
                 f' compressed: {len(bz2_buffer)/1048576:.1f} MB')
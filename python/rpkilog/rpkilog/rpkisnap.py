@@ -0,0 +1,183 @@
+"""
+.rpkisnap is a binary VRP snapshot format which can be memory-mapped and used by NumPy without parsing or copying.
+
+Layout, all integers little-endian:
+
+    offset  size  field
+    0       8     magic b'RPKISNAP'
+    8       4     format version (uint32)
+    12      4     header length in bytes (uint32)
+    16      8     record count (uint64)
+    24      8     offset of the first record (uint64), a multiple of RECORD_ALIGNMENT
+    32      n     header: UTF-8 JSON object {"metadata": {...}, "ta_names": [...]}
+    ...           zero padding up to the record offset
+            40*N  fixed-width records, RECORD_DTYPE, in RoaTable.sort_order()
+
+ta_names is the string table for the TAs.  It is sorted, and each record's ta_code is an index into it.  metadata is
+the rpki-client summary's metadata, unchanged.  Nothing else from the summary (aspas, bgpsec_keys, etc.) is kept.
+"""
+import argparse
+import bz2
+import json
+import logging
+import mmap
+from pathlib import Path
+import struct
+from typing import BinaryIO, Iterator
+
+import numpy as np
+
+from rpkilog.roa_table import RoaTable
+
+logger = logging.getLogger(__name__)
+
+RPKISNAP_MAGIC = b'RPKISNAP'
+RPKISNAP_VERSION = 1
+RPKISNAP_SUFFIX = '.rpkisnap'
+# magic, version, header length, record count, record offset
+PREAMBLE_STRUCT = struct.Struct('<8sIIQQ')
+RECORD_ALIGNMENT = 64
+# Explicit offsets so the record layout never depends on the platform's struct alignment rules.
+RECORD_DTYPE = np.dtype({
+    'names': ['network_hi', 'network_lo', 'expires', 'asn', 'ta_code', 'family', 'prefixlen', 'maxLength'],
+    'formats': ['<u8', '<u8', '<i8', '<u4', '<u2', 'u1', 'u1', 'u1'],
+    'offsets': [0, 8, 16, 24, 28, 30, 31, 32],
+    'itemsize': 40,
+})
+
+
+def is_rpkisnap_path(path: Path) -> bool:
+    retval = Path(path).suffix == RPKISNAP_SUFFIX
+    return retval
+
+
+def read_rpkisnap(path: Path) -> RoaTable:
+    """
+    Memory-map an .rpkisnap file and return a RoaTable whose columns are views into the mapping.  Nothing is
+    copied; pages are read from disk as the columns are used.  The mapping stays open as long as any column does.
+    """
+    with open(path, 'rb') as fh:
+        header, record_count, record_offset = _read_preamble(fh, path)
+        if record_count:
+            # the mapping is kept alive by the arrays which reference it, so fh may be closed
+            buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # mmap refuses to map zero bytes, which is all an empty snapshot has after its header
+            buffer = b''
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPE, count=record_count, offset=record_offset if record_count else 0)
+    columns = {cname: records[cname] for cname in RoaTable.column_dtypes}
+    retval = RoaTable(**columns, ta_names=header['ta_names'], metadata=header['metadata'], is_sorted=True)
+    return retval
+
+
+def iter_rpkisnap_chunks(path: Path, chunk_rows: int = RoaTable.iter_chunk_size) -> Iterator[RoaTable]:
+    """
+    Yield an .rpkisnap file as sorted RoaTables of up to chunk_rows rows, in order.  Unlike read_rpkisnap() the
+    records are read rather than memory-mapped, so only one chunk is resident at a time however much of the file
+    has been consumed.
+    """
+    with open(path, 'rb') as fh:
+        header, record_count, record_offset = _read_preamble(fh, path)
+        fh.seek(record_offset)
+        for chunk_start in range(0, record_count, chunk_rows):
+            count = min(chunk_rows, record_count - chunk_start)
+            records = np.fromfile(fh, dtype=RECORD_DTYPE, count=count)
+            if len(records) != count:
+                raise ValueError(F'{path} is truncated: expected {record_count} records')
+            columns = {cname: records[cname] for cname in RoaTable.column_dtypes}
+            yield RoaTable(**columns, ta_names=header['ta_names'], metadata=header['metadata'], is_sorted=True)
+
+
+def _read_preamble(fh: BinaryIO, path: Path) -> tuple[dict, int, int]:
+    """
+    Read and check the preamble and header of an .rpkisnap file open at offset 0.  Returns (header, record count,
+    record offset).
+    """
+    preamble = fh.read(PREAMBLE_STRUCT.size)
+    if len(preamble) < PREAMBLE_STRUCT.size:
+        raise ValueError(F'{path} is too short to be an rpkisnap file')
+    magic, version, header_length, record_count, record_offset = PREAMBLE_STRUCT.unpack(preamble)
+    if magic != RPKISNAP_MAGIC:
+        raise ValueError(F'{path} is not an rpkisnap file (magic {magic!r})')
+    if version != RPKISNAP_VERSION:
+        raise ValueError(F'{path} is rpkisnap version {version}; only version {RPKISNAP_VERSION} is supported')
+    header = json.loads(fh.read(header_length).decode('utf-8'))
+    return header, record_count, record_offset
+
+
+def write_rpkisnap(table: RoaTable, path: Path, open_mode: str = 'xb'):
+    """
+    Write a RoaTable to an .rpkisnap file, sorting it first if necessary.
+    """
+    table = table.sorted()
+    header = json.dumps({'metadata': table.metadata, 'ta_names': table.ta_names}, sort_keys=True).encode('utf-8')
+    header_end = PREAMBLE_STRUCT.size + len(header)
+    record_offset = -(-header_end // RECORD_ALIGNMENT) * RECORD_ALIGNMENT
+    records = np.zeros(len(table), dtype=RECORD_DTYPE)
+    for cname in RoaTable.column_dtypes:
+        records[cname] = getattr(table, cname)
+    with open(path, open_mode) as fh:
+        fh.write(PREAMBLE_STRUCT.pack(RPKISNAP_MAGIC, RPKISNAP_VERSION, len(header), len(table), record_offset))
+        fh.write(header)
+        fh.write(b'\0' * (record_offset - header_end))
+        # a byte view rather than tobytes(), which would hold a second copy of the records
+        fh.write(records.view(np.uint8))
+
+
+def json_from_rpkisnap(rpkisnap_path: Path, json_path: Path, open_mode: str = 'xt'):
+    """
+    Convert an .rpkisnap file back into an rpki-client style summary `{"metadata": {...}, "roas": [...]}`, bzip2
+    compressed if json_path ends in .bz2.  ROAs are written in sorted order, not the order rpki-client used.
+    """
+    table = read_rpkisnap(rpkisnap_path)
+    write_summary_json(table=table, json_path=json_path, open_mode=open_mode)
+
+
+def write_summary_json(table: RoaTable, json_path: Path, open_mode: str = 'xt'):
+    """
+    Write a RoaTable as an rpki-client style summary, bzip2 compressed if json_path ends in .bz2.  ROAs are
+    written in the table's row order.
+    """
+    if json_path.suffix == '.bz2':
+        fh = bz2.open(json_path, open_mode)
+    else:
+        fh = open(json_path, open_mode)
+    with fh:
+        fh.write(F'{{\n"metadata": {json.dumps(table.metadata, sort_keys=True)},\n"roas": [\n')
+        for idx, roa in enumerate(table):
+            separator = ',\n' if idx else ''
+            fh.write(separator + json.dumps(roa.as_json_obj(), sort_keys=True))
+        fh.write('\n]\n}\n')
+
+
+def rpkisnap_from_json(json_path: Path, rpkisnap_path: Path, open_mode: str = 'xb'):
+    """
+    Convert an rpki-client summary or Routinator jsonext file, optionally bzip2 compressed, to an .rpkisnap file.
+    """
+    table = RoaTable.new_from_file(json_path)
+    write_rpkisnap(table=table, path=rpkisnap_path, open_mode=open_mode)
+    logger.info(F'Wrote {len(table)} records from {json_path} to {rpkisnap_path}')
+
+
+def cli_entry_point():
+    logging.basicConfig(level='INFO')
+    ap = argparse.ArgumentParser(
+        description='Convert between rpki-client JSON summaries and the memory-mappable .rpkisnap format.'
+                    '  The direction is chosen by the input file suffix.',
+    )
+    ap.add_argument('input_path', type=Path, help='.json, .json.bz2 or .rpkisnap file')
+    ap.add_argument('output_path', type=Path, help='.rpkisnap, or .json / .json.bz2 when the input is .rpkisnap')
+    ap.add_argument('--overwrite', action='store_true', help='Overwrite output_path if it exists')
+    args = ap.parse_args()
+    if is_rpkisnap_path(args.input_path):
+        json_from_rpkisnap(
+            rpkisnap_path=args.input_path,
+            json_path=args.output_path,
+            open_mode='wt' if args.overwrite else 'xt',
+        )
+    else:
+        rpkisnap_from_json(
+            json_path=args.input_path,
+            rpkisnap_path=args.output_path,
+            open_mode='wb' if args.overwrite else 'xb',
+        )
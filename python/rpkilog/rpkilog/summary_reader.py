@@ -0,0 +1,229 @@
+import codecs
+from itertools import islice
+import json
+import logging
+from pathlib import Path
+import re
+from typing import IO, Iterator
+
+from rpkilog.parallel_bz2 import open_bz2_for_read
+from rpkilog.phase_timer import PhaseTimer, optional_phase
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class SummaryReader():
+    """
+    Incremental reader for rpki-client summary JSON, i.e. `{"metadata": {...}, "roas": [...], ...}`.
+
+    The document is read from fh a block at a time and each ROA is decoded on its own, so memory use is bounded by
+    the block size and the caller's batch size, not by the size of the snapshot.  metadata is available as soon as
+    the reader is constructed, because rpki-client writes it before roas.  (If a file has them the other way round,
+    metadata is None until iter_roas() has been exhausted.)
+
+    Top-level keys other than metadata and roas (aspas, bgpsec_keys, etc.) are parsed and discarded, an array
+    element at a time.
+
+    If a PhaseTimer is given, reading (and decompressing) input is charged to its "decompress" phase and decoding
+    JSON to its "parse" phase.
+
+    The ROAs can only be iterated once:
+
+        with SummaryReader.new_from_path(path) as reader:
+            print(reader.metadata['buildtime'])
+            for batch in reader.iter_batches():
+                roas = Roa.batch_from_rpkiclient(batch)
+    """
+    # the top-level key whose array elements are yielded; subclasses may read other documents of the same shape
+    array_key = 'roas'
+    batch_size = 4096
+    read_size = 1024 * 1024
+
+    def __init__(self, fh: IO[bytes] | IO[str], phase_timer: PhaseTimer = None):
+        self.fh = fh if phase_timer is None else phase_timer.wrap_file('decompress', fh)
+        self.phase_timer = phase_timer
+        self.metadata = None
+        self._buffer = ''
+        self._pos = 0
+        self._bulk_decode_after = 0
+        self._eof = False
+        self._text_decoder = None
+        self._json_decoder = json.JSONDecoder()
+        self._roas_consumed = False
+        self._document = self._iter_document()
+        # Advance to the first ROA, which has the side effect of parsing metadata.
+        with optional_phase(phase_timer, 'parse'):
+            self._first_roa = next(self._document, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def new_from_path(cls, path: Path, phase_timer: PhaseTimer = None):
+        """
+        Open a summary file, bzip2-decompressing it (in parallel) if the name ends in .bz2.
+        """
+        if Path(path).suffix == '.bz2':
+            fh = open_bz2_for_read(path, mode='rb')
+        else:
+            fh = open(path, mode='rb')
+        return cls(fh, phase_timer=phase_timer)
+
+    def close(self):
+        self.fh.close()
+
+    def iter_batches(self, batch_size: int = None) -> Iterator[list[dict]]:
+        """
+        Yield lists of up to batch_size ROA dicts, suitable for Roa.batch_from_rpkiclient() or rpkiclient_columns().
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+        roas = self.iter_roas()
+        while True:
+            with optional_phase(self.phase_timer, 'parse'):
+                batch = list(islice(roas, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def iter_roas(self) -> Iterator[dict]:
+        """
+        Yield each ROA dict in file order.
+        """
+        if self._roas_consumed:
+            raise RuntimeError('SummaryReader ROAs can only be iterated once')
+        self._roas_consumed = True
+        if self._first_roa is None:
+            return
+        yield self._first_roa
+        self._first_roa = None
+        yield from self._document
+
+    def _decode_elements(self) -> list:
+        """
+        Decode one or more consecutive array elements starting at the current position.
+
+        Decoding ROAs one at a time costs far more in Python overhead than the decoding itself, so first try to
+        decode everything up to the last '}' in the buffer as a single JSON array.  That only succeeds if the '}'
+        ends an element of this array; a '}' inside an element, a string, or past the end of the array leaves
+        unbalanced brackets or quotes and fails to parse.  After a failure, elements are decoded one at a time until
+        the position passes that '}', so each part of the buffer is tried in bulk at most once.
+        """
+        if self._pos >= self._bulk_decode_after:
+            last_close = self._buffer.rfind('}', self._pos)
+            if last_close > self._pos:
+                try:
+                    retlist = json.loads('[' + self._buffer[self._pos:last_close + 1] + ']')
+                    self._pos = last_close + 1
+                    return retlist
+                except json.JSONDecodeError:
+                    self._bulk_decode_after = last_close
+        retlist = [self._decode_value()]
+        return retlist
+
+    def _decode_value(self):
+        """
+        Decode the JSON value at the current position, reading more input until it is complete.
+        """
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # A number or literal which runs to the end of the buffer may be continued in the next block.
+            if end == len(self._buffer) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(F'Expected {char!r} at offset {self._pos} of the buffer but found {self._peek()!r}')
+        self._pos += 1
+
+    def _fill(self):
+        """
+        Discard the consumed part of the buffer and append the next block of input.
+        """
+        block = self.fh.read(self.read_size)
+        self._eof = not block
+        if isinstance(block, bytes):
+            if self._text_decoder is None:
+                self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+            block = self._text_decoder.decode(block, final=self._eof)
+        self._buffer = self._buffer[self._pos:] + block
+        self._bulk_decode_after -= self._pos
+        self._pos = 0
+
+    def _iter_array(self) -> Iterator:
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield from self._decode_elements()
+            match self._peek():
+                case ',':
+                    self._pos += 1
+                case ']':
+                    self._pos += 1
+                    return
+                case other:
+                    raise ValueError(F'Expected "," or "]" after array element but found {other!r}')
+
+    def _iter_document(self) -> Iterator[dict]:
+        """
+        Parse the top-level object, setting self.metadata and yielding the elements of the array_key array.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                key = self._decode_value()
+                if not isinstance(key, str):
+                    raise ValueError(F'Expected a top-level key but found {key!r}')
+                self._expect(':')
+                if key == self.array_key:
+                    yield from self._iter_array()
+                elif key == 'metadata':
+                    self.metadata = self._decode_value()
+                elif self._peek() == '[':
+                    for _ in self._iter_array():
+                        pass
+                else:
+                    self._decode_value()
+                match self._peek():
+                    case ',':
+                        self._pos += 1
+                    case '}':
+                        self._pos += 1
+                        break
+                    case other:
+                        raise ValueError(F'Expected "," or "}}" after top-level value but found {other!r}')
+        if self._peek() != '':
+            raise ValueError('Extra data after the top-level JSON object')
+
+    def _peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it, or '' at the end of input.
+        """
+        self._skip_whitespace()
+        return self._buffer[self._pos:self._pos + 1]
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or self._eof:
+                return
+            self._fill()
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 import argparse
-import bz2
+from bisect import bisect_left
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 import getpass
 import glob
 import importlib.metadata
+from itertools import groupby, islice
 import json
 import logging
 import operator
@@ -16,27 +19,58 @@ import tempfile
 import time
 import urllib.parse
 import urllib3
+import weakref
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import boto3
 from botocore.exceptions import ClientError
 import dateutil.parser
 import netaddr
+import numpy as np
 import opensearchpy.helpers
 from opensearchpy import OpenSearch, RequestsHttpConnection
 from requests_aws4auth import AWS4Auth
 from tqdm import tqdm
 
 from rpkilog.collision_behavior import CollisionBehavior
+from rpkilog.diff_engine import DiffEngine
+from rpkilog.diff_format import DiffFormat
+from rpkilog.external_sort import SortedRuns, run_rows_for_memory
+from rpkilog.fingerprint import (
+    RoaSetFingerprint,
+    fingerprint_table,
+    read_fingerprint_sidecar,
+    remove_summary_file,
+    write_fingerprint_sidecar,
+)
+from rpkilog.parallel_bz2 import open_parallel_bz2, parallel_bz2_compress
+from rpkilog.phase_timer import PhaseTimer, optional_phase
 from rpkilog.process_snapshot_summary_queue import receive_all_messages, s3_events_from_message
-from rpkilog.roa import Roa
+from rpkilog.roa import Roa, canonical_prefix, format_utc_timestamp, rpkiclient_columns, validate_columns
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import is_rpkisnap_path, read_rpkisnap
+from rpkilog.summary_reader import SummaryReader
+from rpkilog.vrp_diff_reader import VrpDiffReader
+from rpkilog.vrp_diff_writer import VrpDiffNdjsonWriter, VrpDiffWriter
 from rpkilog.util import list_s3_object_previous
 
 logger = logging.getLogger(__name__)
 
 
 class VrpDiff():
+    # vrp_diff_parallel_iter() splits the snapshots into this many partitions per worker, to even out the load
+    parallel_partitions_per_worker = 4
+    # passed to every opensearchpy.helpers.streaming_bulk() call, so rejected (HTTP 429) requests are retried
+    es_bulk_retry_kwargs = {'initial_backoff': 5, 'max_backoff': 20, 'max_retries': 5}
+    # index settings for es_backfill_mode(): no refreshes, and the translog is not fsynced on every bulk request
+    es_backfill_settings = {'index.refresh_interval': '-1', 'index.translog.durability': 'async'}
+    # get_cached_es_client()'s clients by their arguments, kept for the life of the process (or warm Lambda)
+    _es_clients = {}
+    # es_create_diff_index_for_datetime()'s set of index names known to exist, by the client they were created with
+    _es_known_indices = weakref.WeakKeyDictionary()
+
     def __init__(self, old_roa:Roa, new_roa:Roa):
         if not (isinstance(old_roa, Roa) or old_roa==None):
             raise TypeError(F'Argument old_roa should be an Roa (or None) but it is a {type(old_roa)}')
@@ -139,6 +173,78 @@ class VrpDiff():
             body['new_roa'] = self.new_roa.as_json_obj()
         return body
 
+    @classmethod
+    def batch_from_json_obj(cls, json_objs:list[dict]) -> list:
+        '''
+        Instantiate VrpDiff objects from a list of their JSON representations, e.g. a slice of a diff file's
+        vrp_diffs.  Equivalent to calling from_json_obj() on each, but the Roa objects are built in bulk by
+        Roa.batch_from_rpkiclient().
+        '''
+        old_roas = iter(Roa.batch_from_rpkiclient([j['old_roa'] for j in json_objs if j.get('old_roa')]))
+        new_roas = iter(Roa.batch_from_rpkiclient([j['new_roa'] for j in json_objs if j.get('new_roa')]))
+        retlist = []
+        for j in json_objs:
+            old_roa = next(old_roas) if j.get('old_roa') else None
+            new_roa = next(new_roas) if j.get('new_roa') else None
+            retlist.append(cls(old_roa=old_roa, new_roa=new_roa))
+        return retlist
+
+    @classmethod
+    def es_bulk_insertable_dicts_from_json_obj(
+        cls,
+        json_objs:list[dict],
+        es_index:str,
+        diff_datetime:datetime,
+    ) -> list[dict]:
+        '''
+        Return es_bulk_insertable_dict() of each diff in json_objs, a slice of a diff file's vrp_diffs, without
+        building VrpDiff or Roa objects.  The result is identical to batch_from_json_obj() followed by
+        es_bulk_insertable_dict(), and invalid ROAs are rejected by the same checks.  Prefixes are canonicalized
+        with canonical_prefix() and expiry times formatted with format_utc_timestamp(), both of which cache.
+        '''
+        observation_timestamp = diff_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')
+        id_timestamp = int(diff_datetime.timestamp())
+        columns = {'family': [], 'prefixlen': [], 'maxLength': [], 'asn': [], 'expires': []}
+        pairs = []
+        for j in json_objs:
+            old_roa = cls._es_roa_source(j.get('old_roa'), columns)
+            new_roa = cls._es_roa_source(j.get('new_roa'), columns)
+            pairs.append((old_roa, new_roa))
+        validate_columns(**{cname: np.array(column, dtype=np.int64) for cname, column in columns.items()})
+
+        retlist = []
+        for old_roa, new_roa in pairs:
+            if old_roa and new_roa:
+                verb = 'UNCHANGED' if old_roa == new_roa else 'REPLACE'
+            elif old_roa:
+                verb = 'DELETE'
+            elif new_roa:
+                verb = 'NEW'
+            else:
+                raise KeyError('Missing both old_roa and new_roa.  Invalid object!')
+            roa = new_roa or old_roa
+            body = {
+                'observation_timestamp': observation_timestamp,
+                'verb': verb,
+                'prefix': roa['prefix'],
+                'maxLength': roa['maxLength'],
+                'asn': roa['asn'],
+                'ta': roa['ta'],
+            }
+            if old_roa:
+                body['old_expires'] = format_utc_timestamp(old_roa['expires'])
+                body['old_roa'] = old_roa
+            if new_roa:
+                body['new_expires'] = format_utc_timestamp(new_roa['expires'])
+                body['new_roa'] = new_roa
+            retlist.append({
+                '_op_type': 'index',
+                '_index': es_index,
+                '_id': F'{id_timestamp}+{roa["prefix"]}+{roa["maxLength"]}+{roa["asn"]}+{roa["ta"]}',
+                '_source': body,
+            })
+        return retlist
+
     @classmethod
     def from_json_obj(cls, j:dict):
         '''
@@ -203,6 +309,71 @@ class VrpDiff():
             logger.info(F'LIMIT_CPU sleeping for {sleep_for} to stay within CPU budget of {limit*100}%')
             time.sleep(sleep_for)
 
+    @classmethod
+    def roa_table_from_file(cls, path:Path, phase_timer:PhaseTimer=None) -> RoaTable:
+        """
+        Load a snapshot file as a RoaTable: memory-mapped if it is .rpkisnap, otherwise parsed from JSON.  The work
+        is charged to phase_timer's "construct" phase, apart from the reader's "decompress" and "parse" phases.
+        """
+        with optional_phase(phase_timer, 'construct'):
+            if is_rpkisnap_path(path):
+                return read_rpkisnap(path)
+            return RoaTable.new_from_file(path, phase_timer=phase_timer)
+
+    @classmethod
+    def roa_columns_from_file(
+        cls,
+        path:Path,
+        fingerprint:RoaSetFingerprint=None,
+        phase_timer:PhaseTimer=None,
+    ) -> tuple[dict, list[dict[str, list]]]:
+        """
+        Stream an rpki-client summary file, optionally bzip2 compressed, into the rpkiclient_columns() of each batch,
+        without building Roa objects.  Returns (metadata, column_batches).  If a fingerprint is given, each batch is
+        added to it.  If a phase_timer is given, building the columns is charged to its "construct" phase.
+        """
+        column_batches = []
+        with SummaryReader.new_from_path(path, phase_timer=phase_timer) as reader:
+            first_row = 0
+            for batch in reader.iter_batches():
+                with optional_phase(phase_timer, 'construct'):
+                    columns = rpkiclient_columns(batch, first_row=first_row)
+                    first_row += len(batch)
+                    if fingerprint is not None:
+                        with optional_phase(phase_timer, 'fingerprint'):
+                            fingerprint.update_columns(columns)
+                    column_batches.append(columns)
+            return reader.metadata, column_batches
+
+    @classmethod
+    def roas_from_columns(cls, column_batches:list[dict[str, list]], phase_timer:PhaseTimer=None) -> list[Roa]:
+        """
+        Build the Roa objects of the column batches returned by roa_columns_from_file().  column_batches is emptied
+        as it goes, so each batch's columns can be freed once its Roa objects exist.
+        """
+        retlist = []
+        with optional_phase(phase_timer, 'construct'):
+            column_batches.reverse()
+            while column_batches:
+                retlist.extend(Roa.batch_from_columns(column_batches.pop()))
+        return retlist
+
+    @classmethod
+    def roas_from_file(
+        cls,
+        path:Path,
+        fingerprint:RoaSetFingerprint=None,
+        phase_timer:PhaseTimer=None,
+    ) -> tuple[dict, list[Roa]]:
+        """
+        Stream an rpki-client summary file, optionally bzip2 compressed, into Roa objects a batch at a time.
+        Returns (metadata, roas).  If a fingerprint is given, each batch is added to it before its Roa objects are
+        built.  If a phase_timer is given, building Roa objects is charged to its "construct" phase.
+        """
+        metadata, column_batches = cls.roa_columns_from_file(path, fingerprint=fingerprint, phase_timer=phase_timer)
+        retval = metadata, cls.roas_from_columns(column_batches, phase_timer=phase_timer)
+        return retval
+
     @classmethod
     def vrp_diff_from_files(
         cls,
@@ -211,91 +382,309 @@ class VrpDiff():
         output_file_path:Path,
         realtime_initial:float,
         output_open_mode:str='xt',
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+        streaming:bool=False,
+        workers:int=1,
+        fingerprint_sidecars:bool=False,
+        max_memory_mb:int=None,
     ) -> dict:
         '''
         Largely a wrapper around vrp_diff_list.  Writes result metadata and diff objects to output_file_path.
         Returns result metadata.
+
+        With streaming=True each diff is written as soon as the engine produces it and the metadata is written after
+        vrp_diffs instead of before, so the diffs are never all held in memory.
+
+        Either input may be an .rpkisnap file, in which case both inputs are loaded as RoaTables and diffed with the
+        vectorized engine regardless of diff_engine.
+
+        With workers > 1 the two JSON inputs are parsed in parallel and the diff is partitioned across that many
+        worker processes by vrp_diff_parallel_iter().  The output is identical to workers=1.
+
+        The fingerprint (see rpkilog.fingerprint) of each snapshot is recorded in the result metadata.  If they are
+        equal the snapshots hold the same VRPs, and an empty diff is written without running the diff engine.  With
+        fingerprint_sidecars=True each input's fingerprint is also kept in a sidecar file next to it.  When the old
+        file already has one (typically written when it was the new file of the previous diff) the new file is
+        loaded first, and the old one is not loaded at all if the fingerprints match.
+
+        The result metadata has a "phases" key with the time and memory spent in each phase of the work (see
+        PhaseTimer): decompress, parse, construct, fingerprint, sort, diff, serialize and compress.  Sorting is
+        only a separate phase for RoaTables; the merge engine's sort is part of diff.  Without streaming the diffs
+        are serialized and compressed before the metadata header is, so only compressing the header is not counted.
+
+        With max_memory_mb set, diff_engine and workers are ignored.  Each input is instead spilled to sorted runs on
+        disk (see rpkilog.external_sort) and the runs are merged and diffed as they are read, so memory use is set by
+        max_memory_mb rather than by the size of the snapshots.  It is a budget beyond what the interpreter and
+        libraries use, and can't be met below a floor of about 30 MB (see run_rows_for_memory()).  Combine it with
+        streaming=True, or else the diffs themselves are collected in memory.
         '''
+        phase_timer = PhaseTimer()
         logger.info(F'Loading data from {str(old_file_path)} and {str(new_file_path)}')
-        # load JSON data from both files
-        if old_file_path.suffix == '.bz2':
-            old_file = bz2.open(old_file_path)
-        else:
-            old_file = open(old_file_path)
-        old_data = json.load(old_file)
-        if new_file_path.suffix == '.bz2':
-            new_file = bz2.open(new_file_path)
-        else:
-            new_file = open(new_file_path)
-        new_data = json.load(new_file)
-        # open the output file
-        if output_file_path.suffix == '.bz2':
-            output_file = bz2.open(output_file_path, output_open_mode)
-        else:
-            output_file = open(output_file_path, output_open_mode)
-        # execute vrp_diff_list
-        logger.info(F'Diff-ing {len(old_data["roas"])} old and {len(new_data["roas"])} new records...')
-        diff_objs = cls.vrp_diff_list(
-            old_roas=old_data['roas'],
-            new_roas=new_data['roas'],
-        )
-        # generate metadata
-        realtime_delta = time.time() - realtime_initial
-        times = os.times()
-        result_metadata = {
-            'diff_count': len(diff_objs),
-            'diff_program': sys.argv[0],
-            'hostname': socket.gethostname(),
-            'times': {
-                'realtime': realtime_delta,
-                'user': times.user,
-                'system': times.system,
-            },
-            'timestamp': int(time.time()),
-            'user': getpass.getuser(),
-            'vrp_cache_old': {
-                'filename': old_file_path.name,
-                'metadata': old_data['metadata'],
-            },
-            'vrp_cache_new': {
-                'filename': new_file_path.name,
-                'metadata': new_data['metadata'],
-            },
-        }
+        diff_engine = cls._diff_engine_for_paths([old_file_path, new_file_path], diff_engine=diff_engine)
+        diff_engine, workers, run_rows = cls._external_sort_settings(diff_engine, workers, max_memory_mb)
+        old_roas = new_roas = None
         try:
-            import psutil
-            memory_use_rss = psutil.Process().memory_info().rss
-            result_metadata['memory_use_rss_mb'] = int(memory_use_rss / 1048576)
-        except:
-            logger.info(F'Unable to invoke psutil.Process().memory_info() to get RAM use.  Omitting it from metadata.')
-            pass
-        # write result bz2
-        logger.info(F'Writing results to JSON file {str(output_file_path)}')
-        output_file.write(
-            F'{{\n'
-            F'"object_type": "rpkilog_vrp_cache_diff_set",\n'
-            F'"metadata": {json.dumps(result_metadata, indent=4, sort_keys=True)},\n'
-            F'"vrp_diffs": [\n'
-        )
-        for idx in range(len(diff_objs)):
-            diff_obj = diff_objs[idx]
-            if idx < len(diff_objs) - 1:
-                separator = ',\n'
+            old_sidecar = read_fingerprint_sidecar(old_file_path) if fingerprint_sidecars else None
+            # Both inputs are streamed, so the decoded JSON documents are never held in memory all at once.
+            if workers > 1 and old_sidecar is None:
+                # the parsing is done by the worker processes, so it can only be timed as a whole
+                with phase_timer.phase('load_parallel'):
+                    old_roas, new_roas = cls._roa_tables_from_files_parallel(old_file_path, new_file_path)
+                with phase_timer.phase('sort'):
+                    old_roas, new_roas = old_roas.sorted(), new_roas.sorted()
+                with phase_timer.phase('fingerprint'):
+                    old_metadata, old_fingerprint = old_roas.metadata, fingerprint_table(old_roas)
+                    new_metadata, new_fingerprint = new_roas.metadata, fingerprint_table(new_roas)
             else:
-                separator = '\n'
-            diff_str = diff_obj.as_json_str()
-            output_file.write('    ' + diff_str + separator)
-        output_file.write(']\n}\n')
-        output_file.close()
-        # return result_metadata
+                # the parallel diff works on RoaTables whichever engine the workers use
+                as_table = diff_engine == DiffEngine.VECTORIZED or workers > 1
+                # Roa objects are only built once the fingerprints show the snapshots differ.
+                defer_roas = not as_table and run_rows is None
+                # Sorting a RoaTable up front costs nothing extra, since the engines then find it already sorted.
+                new_metadata, new_roas, new_fingerprint = cls._snapshot_from_file(
+                    new_file_path,
+                    as_table=as_table,
+                    sort=as_table,
+                    phase_timer=phase_timer,
+                    run_rows=run_rows,
+                    defer_roas=defer_roas,
+                )
+                if old_sidecar is not None and old_sidecar['fingerprint'] == new_fingerprint:
+                    logger.info(F'{str(old_file_path)} has the same fingerprint per its sidecar, so it is not loaded')
+                    old_metadata, old_roas, old_fingerprint = old_sidecar['metadata'], None, old_sidecar['fingerprint']
+                else:
+                    old_metadata, old_roas, old_fingerprint = cls._snapshot_from_file(
+                        old_file_path,
+                        as_table=as_table,
+                        sort=as_table,
+                        phase_timer=phase_timer,
+                        run_rows=run_rows,
+                        defer_roas=defer_roas,
+                    )
+                if defer_roas and old_fingerprint != new_fingerprint:
+                    old_roas = cls._roas_from_deferred(old_roas, phase_timer=phase_timer)
+                    new_roas = cls._roas_from_deferred(new_roas, phase_timer=phase_timer)
+            if fingerprint_sidecars:
+                cls._update_fingerprint_sidecar(old_file_path, fingerprint=old_fingerprint, metadata=old_metadata)
+                cls._update_fingerprint_sidecar(new_file_path, fingerprint=new_fingerprint, metadata=new_metadata)
+            result_metadata = cls._write_vrp_diff(
+                old_file_path=old_file_path,
+                old_metadata=old_metadata,
+                old_roas=old_roas,
+                old_fingerprint=old_fingerprint,
+                new_file_path=new_file_path,
+                new_metadata=new_metadata,
+                new_roas=new_roas,
+                new_fingerprint=new_fingerprint,
+                output_file_path=output_file_path,
+                realtime_initial=realtime_initial,
+                phase_timer=phase_timer,
+                output_open_mode=output_open_mode,
+                diff_engine=diff_engine,
+                streaming=streaming,
+                workers=workers,
+                max_memory_mb=max_memory_mb,
+            )
+        finally:
+            # spilled runs are otherwise only removed when garbage collected
+            for roas in (old_roas, new_roas):
+                if isinstance(roas, SortedRuns):
+                    roas.cleanup()
         return result_metadata
 
     @classmethod
-    def vrp_diff_list(cls, old_roas:list[dict], new_roas:list[dict]) -> list:
+    def vrp_diff_chain_from_files(
+        cls,
+        file_paths:Iterable[Path],
+        output_dir:Path,
+        output_open_mode:str='xt',
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+        streaming:bool=False,
+        workers:int=1,
+        fingerprint_sidecars:bool=False,
+        diff_format:DiffFormat=DiffFormat.JSON,
+        max_memory_mb:int=None,
+    ) -> Iterator[tuple[Path, Path, Path, dict]]:
         """
-        Given two lists of VRPs, return a list of VrpDiff objects.
+        Diff each consecutive pair of an ordered run of snapshot files, writing one
+        get_diff_filename_from_summary_filename() file per step into output_dir.  Each snapshot is loaded once and
+        then kept as the "old" side of the next step, so reprocessing N snapshots parses N files instead of 2*(N-1).
+        The output files are bzip2 compressed, in diff_format.
+
+        Yields (old_file_path, new_file_path, output_file_path, result_metadata) after each step, at which point
+        old_file_path is no longer needed and may be deleted.  file_paths may be a generator which downloads each
+        file as it is requested.  Each output file is identical to what vrp_diff_from_files() writes for that pair.
+
+        If file_paths is a list containing any .rpkisnap file, every step uses the vectorized engine.  Fingerprints
+        are handled as in vrp_diff_from_files(), except that every file is loaded regardless of sidecars.  So is
+        max_memory_mb; each snapshot's sorted runs are kept on disk until it has been the old side of a step.
+        """
+        if isinstance(file_paths, list):
+            diff_engine = cls._diff_engine_for_paths(file_paths, diff_engine=diff_engine)
+        diff_engine, workers, run_rows = cls._external_sort_settings(diff_engine, workers, max_memory_mb)
+        # the parallel diff works on RoaTables whichever engine the workers use
+        as_table = diff_engine == DiffEngine.VECTORIZED or workers > 1
+        # Roa objects are only built once the fingerprints show a snapshot differs from its neighbour.
+        defer_roas = not as_table and run_rows is None
+        # Sorting each snapshot once makes the engines' own sorts linear, but the hash join doesn't sort its inputs.
+        sort = as_table or diff_engine == DiffEngine.MERGE
+        file_paths = iter(file_paths)
+        old_file_path = next(file_paths, None)
+        if old_file_path is None:
+            return
+        logger.info(F'Loading data from {str(old_file_path)}')
+        # the first step's phases include loading the first snapshot
+        phase_timer = PhaseTimer()
+        old_metadata, old_roas, old_fingerprint = cls._snapshot_from_file(
+            old_file_path,
+            as_table=as_table,
+            sort=sort,
+            phase_timer=phase_timer,
+            run_rows=run_rows,
+            defer_roas=defer_roas,
+        )
+        old_deferred = defer_roas
+        if fingerprint_sidecars:
+            cls._update_fingerprint_sidecar(old_file_path, fingerprint=old_fingerprint, metadata=old_metadata)
+        for new_file_path in file_paths:
+            realtime_initial = time.time()
+            logger.info(F'Loading data from {str(new_file_path)}')
+            new_metadata, new_roas, new_fingerprint = cls._snapshot_from_file(
+                new_file_path,
+                as_table=as_table,
+                sort=sort,
+                phase_timer=phase_timer,
+                run_rows=run_rows,
+                defer_roas=defer_roas,
+            )
+            new_deferred = defer_roas
+            if new_deferred and old_fingerprint != new_fingerprint:
+                if old_deferred:
+                    old_roas = cls._roas_from_deferred(old_roas, sort=sort, phase_timer=phase_timer)
+                    old_deferred = False
+                new_roas = cls._roas_from_deferred(new_roas, sort=sort, phase_timer=phase_timer)
+                new_deferred = False
+            if fingerprint_sidecars:
+                cls._update_fingerprint_sidecar(new_file_path, fingerprint=new_fingerprint, metadata=new_metadata)
+            output_file_name = cls.get_diff_filename_from_summary_filename(new_file_path.name, diff_format=diff_format)
+            output_file_path = Path(output_dir, output_file_name)
+            result_metadata = cls._write_vrp_diff(
+                old_file_path=old_file_path,
+                old_metadata=old_metadata,
+                old_roas=old_roas,
+                old_fingerprint=old_fingerprint,
+                new_file_path=new_file_path,
+                new_metadata=new_metadata,
+                new_roas=new_roas,
+                new_fingerprint=new_fingerprint,
+                output_file_path=output_file_path,
+                realtime_initial=realtime_initial,
+                phase_timer=phase_timer,
+                output_open_mode=output_open_mode,
+                diff_engine=diff_engine,
+                streaming=streaming,
+                workers=workers,
+                max_memory_mb=max_memory_mb,
+            )
+            yield old_file_path, new_file_path, output_file_path, result_metadata
+            if isinstance(old_roas, SortedRuns):
+                old_roas.cleanup()
+            old_file_path, old_metadata, old_roas = new_file_path, new_metadata, new_roas
+            old_fingerprint, old_deferred = new_fingerprint, new_deferred
+            phase_timer = PhaseTimer()
+
+    @classmethod
+    def vrp_diff_hash_join(cls, old_roas:list[dict] | list[Roa], new_roas:list[dict] | list[Roa]) -> list:
+        """
+        List-returning wrapper around vrp_diff_hash_join_iter().
+        """
+        retlist = list(cls.vrp_diff_hash_join_iter(old_roas=old_roas, new_roas=new_roas))
+        return retlist
+
+    @classmethod
+    def vrp_diff_hash_join_iter(
+        cls,
+        old_roas:list[dict] | list[Roa],
+        new_roas:list[dict] | list[Roa],
+    ) -> Iterator['VrpDiff']:
+        """
+        Given two lists of VRPs, yield the same VrpDiff objects as vrp_diff_list_iter() without sorting the
+        full inputs.  The old snapshot is indexed by Roa.primary_key() and probed with the new one; only the
+        changed entries are sorted to produce the output order.
+
+        Like vrp_diff_list(), when several entries share a primary key the k-th old entry (in Roa.sortable()
+        order) is paired with the k-th new entry.
+        """
+        old_index = {}
+        for roa in cls._roa_objs(old_roas):
+            old_index.setdefault(roa.primary_key(), []).append(roa)
+        new_index = {}
+        for roa in cls._roa_objs(new_roas):
+            new_index.setdefault(roa.primary_key(), []).append(roa)
+        logger.info(F'Indexed {len(old_index)} old and {len(new_index)} new primary keys')
+
+        count_delete = 0
+        count_new = 0
+        count_replace = 0
+        count_unchanged = 0
+        # (sort key, VrpDiff) where the sort key is (Roa.sortable() without expires, rank within primary key)
+        changes = []
+        for pk, new_group in new_index.items():
+            old_group = old_index.pop(pk, [])
+            if len(old_group) == 1 and len(new_group) == 1 and old_group[0].expires == new_group[0].expires:
+                # by far the most common case, decided without computing either Roa's sort key
+                count_unchanged += 1
+                continue
+            old_group.sort(key=Roa.sortable)
+            new_group.sort(key=Roa.sortable)
+            pk_sortable = new_group[0].sortable()[:-1]
+            for rank in range(max(len(old_group), len(new_group))):
+                old_roa = old_group[rank] if rank < len(old_group) else None
+                new_roa = new_group[rank] if rank < len(new_group) else None
+                diff = VrpDiff(old_roa=old_roa, new_roa=new_roa)
+                match diff.verb:
+                    case 'UNCHANGED':
+                        count_unchanged += 1
+                        continue
+                    case 'REPLACE':
+                        count_replace += 1
+                    case 'DELETE':
+                        count_delete += 1
+                    case 'NEW':
+                        count_new += 1
+                changes.append(((pk_sortable, rank), diff))
+        # whatever is left in old_index has no counterpart in the new snapshot
+        for old_group in old_index.values():
+            old_group.sort(key=Roa.sortable)
+            pk_sortable = old_group[0].sortable()[:-1]
+            for rank, old_roa in enumerate(old_group):
+                count_delete += 1
+                changes.append(((pk_sortable, rank), VrpDiff(old_roa=old_roa, new_roa=None)))
+        logger.info(F'Found {count_delete} DELETE, {count_new} NEW, {count_replace} REPLACE and'
+                    F' {count_unchanged} UNCHANGED')
+        # Unlike the other engines, nothing can be yielded until every change has been found and sorted.
+        changes.sort(key=operator.itemgetter(0))
+        for _, diff in changes:
+            yield diff
+
+    @classmethod
+    def vrp_diff_list(cls, old_roas:list[dict] | list[Roa], new_roas:list[dict] | list[Roa]) -> list:
+        """
+        Given two lists of VRPs (rpki-client JSON dicts or Roa objects), return a list of VrpDiff objects.
+        """
+        retlist = list(cls.vrp_diff_list_iter(old_roas=old_roas, new_roas=new_roas))
+        return retlist
+
+    @classmethod
+    def vrp_diff_list_iter(
+        cls,
+        old_roas:list[dict] | list[Roa],
+        new_roas:list[dict] | list[Roa],
+    ) -> Iterator['VrpDiff']:
+        """
+        Given two lists of VRPs (rpki-client JSON dicts or Roa objects), yield VrpDiff objects in primary key order
+        as the sorted inputs are merged.  Entries are dropped from the inputs as they are consumed.
         """
-        retlist = []
         count_delete = 0
         count_new = 0
         count_replace = 0
@@ -309,13 +698,9 @@ class VrpDiff():
         input_roa_count = len(old_roas) + len(new_roas) + 1
 
         # Convert input dicts to Roa objects and sort into deques (popleft() is O(1) vs O(n) for pop(0)).
-        old_roa_objs = []
-        for roa_dict in old_roas:
-            old_roa_objs.append(Roa(**roa_dict))
+        old_roa_objs = cls._roa_objs(old_roas)
         old_deque = deque(sorted(old_roa_objs, key=Roa.sortable))
-        new_roa_objs = []
-        for roa_dict in new_roas:
-            new_roa_objs.append(Roa(**roa_dict))
+        new_roa_objs = cls._roa_objs(new_roas)
         new_deque = deque(sorted(new_roa_objs, key=Roa.sortable))
 
         process_time_progress = time.process_time()
@@ -351,7 +736,7 @@ class VrpDiff():
                     count_replace += 1
                     logger.debug('REPLACE found: {old_list_next} -> {new_list_next}')
                     diff = VrpDiff(old_roa=old_next, new_roa=new_next)
-                    retlist.append(diff)
+                    yield diff
                 old_deque.popleft()
                 new_deque.popleft()
                 continue
@@ -360,14 +745,14 @@ class VrpDiff():
                 count_delete += 1
                 logger.debug('DELETE found: {old_list_next}')
                 diff = VrpDiff(old_roa=old_next, new_roa=None)
-                retlist.append(diff)
+                yield diff
                 old_deque.popleft()
                 continue
             else:
                 count_new += 1
                 logger.debug('NEW found: {new_list_next}')
                 diff = VrpDiff(old_roa=None, new_roa=new_next)
-                retlist.append(diff)
+                yield diff
                 new_deque.popleft()
                 continue
         if initial_count_old + initial_count_new == count_unchanged * 2 + count_replace * 2 + count_delete + count_new:
@@ -383,15 +768,864 @@ class VrpDiff():
             logger.critical(F'diff_counts:       {count_unchanged * 2 + count_replace * 2 + count_delete + count_new}')
             logger.critical(F'initial_counts and diff_counts SHOULD BE EQUAL')
             raise SystemExit(1)
+
+    @classmethod
+    def vrp_diff_parallel_iter(
+        cls,
+        old_table:RoaTable,
+        new_table:RoaTable,
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+        workers:int=2,
+    ) -> Iterator['VrpDiff']:
+        """
+        Diff two snapshots with the given engine in a pool of worker processes.  Yields the same VrpDiff objects in
+        the same order as the serial engines.
+
+        Both sorted tables are split at the same network addresses into non-overlapping prefix ranges.  Every row
+        sharing a primary key has the same network address, so each partition can be diffed on its own, and because
+        the address leads the sort order the partitions' results simply concatenate.  (Partitioning by TA would
+        not work that way: the TA is the last part of the sort key, so per-TA results would have to be merged.)
+        The tables are handed to the workers through shared memory; only the partitions' VrpDiffs are pickled.
+        """
+        ta_names = sorted(set(old_table.ta_names) | set(new_table.ta_names))
+        old_table = old_table.with_ta_names(ta_names).sorted()
+        new_table = new_table.with_ta_names(ta_names).sorted()
+        bounds = cls._partition_bounds(old_table, new_table, partitions=workers * cls.parallel_partitions_per_worker)
+        logger.info(F'Diff-ing {len(bounds)} partitions in {workers} worker processes')
+        old_shm, old_spec = old_table.to_shared_memory()
+        new_shm, new_spec = new_table.to_shared_memory()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(cls._diff_partition, old_spec, new_spec, partition_bounds, diff_engine)
+                    for partition_bounds in bounds
+                ]
+                for future in futures:
+                    yield from future.result()
+        finally:
+            for shm in (old_shm, new_shm):
+                shm.close()
+                shm.unlink()
+
+    @classmethod
+    def vrp_diff_roas(
+        cls,
+        old_roas:list[dict] | list[Roa],
+        new_roas:list[dict] | list[Roa],
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+    ) -> list:
+        """
+        Given two lists of VRPs (rpki-client JSON dicts or Roa objects), return a list of VrpDiff objects using the
+        given engine.
+        Every engine returns the same diffs in the same order.
+        """
+        retlist = list(cls.vrp_diff_roas_iter(old_roas=old_roas, new_roas=new_roas, diff_engine=diff_engine))
+        return retlist
+
+    @classmethod
+    def vrp_diff_roas_iter(
+        cls,
+        old_roas:list[dict] | list[Roa],
+        new_roas:list[dict] | list[Roa],
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+    ) -> Iterator['VrpDiff']:
+        """
+        Like vrp_diff_roas(), but return an iterator which yields the diffs as the engine produces them.
+        """
+        match diff_engine:
+            case DiffEngine.MERGE:
+                retiter = cls.vrp_diff_list_iter(old_roas=old_roas, new_roas=new_roas)
+            case DiffEngine.HASH_JOIN:
+                retiter = cls.vrp_diff_hash_join_iter(old_roas=old_roas, new_roas=new_roas)
+            case DiffEngine.VECTORIZED:
+                retiter = cls.vrp_diff_table_iter(
+                    old_table=cls._roa_table(old_roas),
+                    new_table=cls._roa_table(new_roas),
+                )
+            case _:
+                raise ValueError(f'Unexpected diff_engine value: {diff_engine!r}')
+        return retiter
+
+    @classmethod
+    def vrp_diff_sorted_iter(cls, old_roas:Iterable[Roa], new_roas:Iterable[Roa]) -> Iterator['VrpDiff']:
+        """
+        Like vrp_diff_list_iter(), but for two iterables which already yield Roa objects in Roa.sortable() order,
+        such as SortedRuns.  Only the next Roa of each input is held, so the inputs need not fit in memory.
+        """
+        count_delete = 0
+        count_new = 0
+        count_replace = 0
+        count_unchanged = 0
+        old_iter = iter(old_roas)
+        new_iter = iter(new_roas)
+        old_next = next(old_iter, None)
+        new_next = next(new_iter, None)
+        while old_next is not None or new_next is not None:
+            if old_next is not None and new_next is not None and old_next.primary_key() == new_next.primary_key():
+                if old_next == new_next:
+                    count_unchanged += 1
+                else:
+                    count_replace += 1
+                    yield VrpDiff(old_roa=old_next, new_roa=new_next)
+                old_next = next(old_iter, None)
+                new_next = next(new_iter, None)
+            elif new_next is None or (old_next is not None and old_next.sortable() < new_next.sortable()):
+                count_delete += 1
+                yield VrpDiff(old_roa=old_next, new_roa=None)
+                old_next = next(old_iter, None)
+            else:
+                count_new += 1
+                yield VrpDiff(old_roa=None, new_roa=new_next)
+                new_next = next(new_iter, None)
+        logger.info(F'Found {count_delete} DELETE, {count_new} NEW, {count_replace} REPLACE and'
+                    F' {count_unchanged} UNCHANGED')
+
+    @classmethod
+    def vrp_diff_table(cls, old_table:RoaTable, new_table:RoaTable) -> list:
+        """
+        List-returning wrapper around vrp_diff_table_iter().
+        """
+        retlist = list(cls.vrp_diff_table_iter(old_table=old_table, new_table=new_table))
+        return retlist
+
+    @classmethod
+    def vrp_diff_table_iter(cls, old_table:RoaTable, new_table:RoaTable) -> Iterator['VrpDiff']:
+        """
+        Vectorized equivalent of vrp_diff_list_iter() operating on RoaTable snapshots.  Yields the same VrpDiff
+        objects in the same order; Roa objects are only built for the rows which changed, as they are yielded.
+
+        vrp_diff_list() pairs the k-th old and k-th new entry sharing a primary key (there is normally only one)
+        and emits everything in primary key order.  Here each row is tagged with its rank among the rows sharing
+        its primary key, both tables are stacked and lexsorted by (primary key, rank, side), and a pair is any
+        old row immediately followed by a new row with an equal (primary key, rank).
+        """
+        ta_names = sorted(set(old_table.ta_names) | set(new_table.ta_names))
+        old_table = old_table.with_ta_names(ta_names).sorted()
+        new_table = new_table.with_ta_names(ta_names).sorted()
+        initial_count_old = len(old_table)
+        initial_count_new = len(new_table)
+        logger.info(F'Sorted {initial_count_old} old and {initial_count_new} new records')
+
+        # Stack both tables.  side is 0 for old rows and 1 for new rows; row is the index within its own table.
+        side = np.concatenate([
+            np.zeros(initial_count_old, dtype=np.uint8),
+            np.ones(initial_count_new, dtype=np.uint8),
+        ])
+        row = np.concatenate([np.arange(initial_count_old), np.arange(initial_count_new)])
+        keys = {
+            cname: np.concatenate([getattr(old_table, cname), getattr(new_table, cname)])
+            for cname in RoaTable.key_columns
+        }
+        keys['rank'] = np.concatenate([cls._primary_key_rank(old_table), cls._primary_key_rank(new_table)])
+        expires = np.concatenate([old_table.expires, new_table.expires])
+        # np.lexsort uses the LAST key as the primary sort key
+        order = np.lexsort([side, keys['rank']] + [keys[cname] for cname in reversed(RoaTable.key_columns)])
+        side = side[order]
+        row = row[order]
+        expires = expires[order]
+        same_as_next = np.ones(max(len(order) - 1, 0), dtype=bool)
+        for key in keys.values():
+            key = key[order]
+            same_as_next &= key[:-1] == key[1:]
+        # (primary key, rank) is unique within each side, so equal neighbours are always an old row then a new row
+        pair_head = np.zeros(len(order), dtype=bool)
+        pair_head[:-1] = same_as_next
+        pair_tail = np.zeros(len(order), dtype=bool)
+        pair_tail[1:] = same_as_next
+        unchanged = np.zeros(len(order), dtype=bool)
+        unchanged[:-1] = same_as_next & (expires[:-1] == expires[1:])
+        # Each emitted diff is represented by one position in the stacked order: the old row of a pair or the
+        # only row of a DELETE/NEW.
+        emit = np.flatnonzero(~pair_tail & ~unchanged)
+        emit_replace = pair_head[emit]
+        emit_old = np.where(side[emit] == 0, row[emit], -1)
+        emit_new = np.where(side[emit] == 1, row[emit], -1)
+        emit_new[emit_replace] = row[emit[emit_replace] + 1]
+
+        count_pairs = int(pair_head.sum())
+        count_unchanged = int(unchanged.sum())
+        count_replace = count_pairs - count_unchanged
+        count_delete = initial_count_old - count_pairs
+        count_new = initial_count_new - count_pairs
+        logger.info(F'Found {count_delete} DELETE, {count_new} NEW, {count_replace} REPLACE and'
+                    F' {count_unchanged} UNCHANGED')
+
+        old_roas = old_table.take(emit_old[emit_old >= 0]).iter_roas()
+        new_roas = new_table.take(emit_new[emit_new >= 0]).iter_roas()
+        for has_old, has_new in zip((emit_old >= 0).tolist(), (emit_new >= 0).tolist()):
+            old_roa = next(old_roas) if has_old else None
+            new_roa = next(new_roas) if has_new else None
+            yield VrpDiff(old_roa=old_roa, new_roa=new_roa)
+
+    @classmethod
+    def _diff_partition(
+        cls,
+        old_spec:dict,
+        new_spec:dict,
+        bounds:tuple[int, int, int, int],
+        diff_engine:DiffEngine,
+    ) -> list:
+        """
+        Worker process side of vrp_diff_parallel_iter(): attach to both shared tables and diff one partition.
+        """
+        old_start, old_stop, new_start, new_stop = bounds
+        old_shm, old_table = RoaTable.new_from_shared_memory(old_spec)
+        new_shm, new_table = RoaTable.new_from_shared_memory(new_spec)
+        old_table = old_table.slice(old_start, old_stop)
+        new_table = new_table.slice(new_start, new_stop)
+        if diff_engine == DiffEngine.VECTORIZED:
+            retlist = cls.vrp_diff_table(old_table=old_table, new_table=new_table)
+        else:
+            retlist = cls.vrp_diff_roas(old_roas=list(old_table), new_roas=list(new_table), diff_engine=diff_engine)
+        # the Roa objects hold plain Python values, so the views into shared memory can go before it is closed
+        del old_table, new_table
+        old_shm.close()
+        new_shm.close()
+        return retlist
+
+    @classmethod
+    def _diff_engine_for_paths(cls, file_paths:list[Path], diff_engine:DiffEngine) -> DiffEngine:
+        """
+        Return the engine to use for the given snapshot files: the vectorized engine if any of them is .rpkisnap,
+        since those are loaded straight into RoaTables, otherwise diff_engine.
+        """
+        if diff_engine != DiffEngine.VECTORIZED and any(is_rpkisnap_path(path) for path in file_paths):
+            logger.info(F'Using the {DiffEngine.VECTORIZED} engine instead of {diff_engine} for .rpkisnap input')
+            return DiffEngine.VECTORIZED
+        return diff_engine
+
+    @classmethod
+    def _es_bulk_actions(
+        cls,
+        diff_batches:Iterable[list[dict]],
+        es_index:str,
+        diff_datetime:datetime,
+    ) -> Iterator[dict]:
+        """
+        Yield an es_bulk_insertable_dict() for each diff record in diff_batches, e.g. VrpDiffReader.iter_batches(),
+        converting one batch at a time with es_bulk_insertable_dicts_from_json_obj() as the consumer asks for more.
+        """
+        for batch in diff_batches:
+            yield from cls.es_bulk_insertable_dicts_from_json_obj(batch, es_index=es_index, diff_datetime=diff_datetime)
+
+    @classmethod
+    def _es_bulk_chunk(cls, es_client:OpenSearch, chunk:list[dict]) -> list[tuple[bool, dict]]:
+        """
+        Worker thread side of _es_parallel_bulk(): send one chunk of actions as a single bulk request.
+        """
+        retlist = list(opensearchpy.helpers.streaming_bulk(
+            client=es_client,
+            actions=chunk,
+            chunk_size=len(chunk),
+            **cls.es_bulk_retry_kwargs,
+        ))
         return retlist
 
+    @classmethod
+    def _es_parallel_bulk(
+        cls,
+        es_client:OpenSearch,
+        actions:Iterable[dict],
+        chunk_size:int,
+        workers:int,
+    ) -> Iterator[tuple[bool, dict]]:
+        """
+        Like opensearchpy.helpers.streaming_bulk(), but keeping up to workers bulk requests of chunk_size actions in
+        flight on a thread pool while the next chunks are built.  Yields (ok, result) in action order.
+
+        opensearchpy.helpers.parallel_bulk() would do the same, but it does not retry rejected requests.  Here each
+        chunk goes through streaming_bulk() with es_bulk_retry_kwargs, as the serial import does.  The first error
+        raised by a chunk propagates once the chunks ahead of it have been yielded.  Nothing more is submitted after
+        that, or after the consumer stops early, and the pool waits only for the requests already in flight.
+        """
+        actions = iter(actions)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk') as executor:
+
+            def submit_chunks():
+                while len(pending) < workers:
+                    chunk = list(islice(actions, chunk_size))
+                    if not chunk:
+                        return
+                    pending.append(executor.submit(cls._es_bulk_chunk, es_client, chunk))
+
+            submit_chunks()
+            while pending:
+                retlist = pending.popleft().result()
+                # replace the finished request before handing its results to the consumer
+                submit_chunks()
+                yield from retlist
+
+    @classmethod
+    def _es_roa_source(cls, roa:dict | None, columns:dict[str, list]) -> dict | None:
+        """
+        Back-end of es_bulk_insertable_dicts_from_json_obj(): return what Roa.as_json_obj() would for a diff file's
+        old_roa or new_roa, or None if it is absent.  Its numeric fields are appended to columns for
+        validate_columns(), and parse and type errors are raised as rpkiclient_columns() raises them.
+        """
+        if not roa:
+            return None
+        version, prefixlen, prefix = canonical_prefix(roa['prefix'])
+        asn = roa['asn']
+        if isinstance(asn, str):
+            # tolerate old VRP Cache files with asn="AS64496" instead of asn=64496
+            rem = re.match(r'^AS(?P<asn>\d+)$', asn)
+            if not rem:
+                raise ValueError(F'Cannot get integer ASN from asn passed as string: {asn}')
+            asn = int(rem.group('asn'))
+        if not isinstance(roa['ta'], str):
+            raise TypeError(F'Expecting ta to be a str but got a {type(roa["ta"])}: {roa["ta"]}')
+        retval = {
+            'asn': asn,
+            'expires': roa.get('expires', 0),
+            'maxLength': roa['maxLength'],
+            'prefix': prefix,
+            'ta': roa['ta'],
+        }
+        columns['family'].append(version)
+        columns['prefixlen'].append(prefixlen)
+        columns['maxLength'].append(retval['maxLength'])
+        columns['asn'].append(asn)
+        columns['expires'].append(retval['expires'])
+        return retval
+
+    @classmethod
+    def _external_sort_settings(
+        cls,
+        diff_engine:DiffEngine,
+        workers:int,
+        max_memory_mb:int | None,
+    ) -> tuple[DiffEngine, int, int | None]:
+        """
+        Return (diff_engine, workers, run_rows) for the given max_memory_mb.  If it is set, the snapshots are external
+        merge sorted in runs of run_rows and diffed by vrp_diff_sorted_iter(), which is the merge engine working from
+        disk, in this process.  Otherwise diff_engine and workers are returned unchanged, with run_rows None.
+        """
+        if max_memory_mb is None:
+            return diff_engine, workers, None
+        if diff_engine != DiffEngine.MERGE or workers > 1:
+            logger.info(F'Using an external merge sort instead of the {diff_engine} engine with {workers} workers'
+                        F' to stay within max_memory_mb={max_memory_mb}')
+        return DiffEngine.MERGE, 1, run_rows_for_memory(max_memory_mb)
+
+    @classmethod
+    def _import_files(
+        cls,
+        import_jobs:list[tuple[datetime, str, dict]],
+        file_workers:int=1,
+        month_order:bool=False,
+        limit_cpu:float=None,
+        invocation_time:float=None,
+    ) -> int:
+        """
+        Back-end of cli_entry_point_import() --all-files and --import-from-disk.  Call
+        generic_entry_point_import(**kwargs) for each (diff_datetime, name, kwargs) of import_jobs, in order, and log
+        each result.  Returns the number of files imported.  limit_cpu is a fraction, as for limit_cpu_sleep().
+
+        With file_workers > 1 that many files are imported at once by a process pool, so one file's JSON parsing
+        and transformation overlaps the others' bulk requests.  Each worker process makes its own OpenSearch
+        client, and is given this process's log levels.  Files are started in order but results are logged as they finish.  The first failure is raised
+        once the files in flight have finished, and no more are started.  With month_order=True every file of one
+        month's index is imported before the next month's are started, so the months are filled one at a time in
+        import_jobs order.  limit_cpu is not supported, since the workers' CPU time is not counted.
+        """
+        import_file_count = 0
+        if file_workers <= 1:
+            for diff_datetime, name, kwargs in import_jobs:
+                logger.info(F'Importing {name}')
+                result = cls.generic_entry_point_import(**kwargs)
+                import_file_count += 1
+                logger.info(F'Imported file count {import_file_count} name {name} result: {json.dumps(result)}')
+                if limit_cpu is not None:
+                    cls.limit_cpu_sleep(invocation_time=invocation_time, limit=limit_cpu)
+            return import_file_count
+        if limit_cpu is not None:
+            raise ValueError('limit_cpu is not supported with file_workers > 1')
+
+        if month_order:
+            job_groups = [list(group) for _, group in groupby(import_jobs, key=lambda job: job[0].strftime('%Y%m'))]
+        else:
+            job_groups = [import_jobs]
+        logger.info(F'Importing {len(import_jobs)} files with {file_workers} file workers')
+        with ProcessPoolExecutor(
+            max_workers=file_workers,
+            initializer=cls._init_import_worker,
+            initargs=(logging.getLogger().level, logger.level),
+        ) as executor:
+            for job_group in job_groups:
+                futures = {
+                    executor.submit(cls.generic_entry_point_import, **kwargs): name
+                    for diff_datetime, name, kwargs in job_group
+                }
+                try:
+                    for future in as_completed(futures):
+                        result = future.result()
+                        import_file_count += 1
+                        name = futures[future]
+                        logger.info(F'Imported file count {import_file_count} name {name} result: {json.dumps(result)}')
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        return import_file_count
+
+    @classmethod
+    def _init_import_worker(cls, root_log_level:int, log_level:int):
+        """
+        ProcessPoolExecutor initializer for the _import_files() workers.  A worker started by forkserver or spawn,
+        rather than fork, doesn't inherit the log levels cli_entry_point_import() set from --log-level, so they are
+        set again.
+        """
+        logging.getLogger().setLevel(root_log_level)
+        logger.setLevel(log_level)
+
+    @classmethod
+    def _partition_bounds(
+        cls,
+        old_table:RoaTable,
+        new_table:RoaTable,
+        partitions:int,
+    ) -> list[tuple[int, int, int, int]]:
+        """
+        Given two sorted tables, return up to the given number of (old_start, old_stop, new_start, new_stop) row
+        ranges which cover both tables and split them at the same network addresses.
+        """
+        def network_key(table:RoaTable, row:int) -> tuple[int, int, int]:
+            return int(table.family[row]), int(table.network_hi[row]), int(table.network_lo[row])
+
+        larger_table = max(old_table, new_table, key=len)
+        split_keys = sorted({
+            network_key(larger_table, len(larger_table) * partition // partitions)
+            for partition in range(1, partitions)
+        })
+        splits = []
+        for table in (old_table, new_table):
+            splits.append(
+                [0]
+                + [bisect_left(range(len(table)), key, key=lambda row: network_key(table, row)) for key in split_keys]
+                + [len(table)]
+            )
+        old_splits, new_splits = splits
+        retlist = [
+            (old_splits[idx], old_splits[idx + 1], new_splits[idx], new_splits[idx + 1])
+            for idx in range(len(old_splits) - 1)
+            if old_splits[idx] < old_splits[idx + 1] or new_splits[idx] < new_splits[idx + 1]
+        ]
+        return retlist
+
+    @classmethod
+    def _primary_key_rank(cls, table:RoaTable) -> np.ndarray:
+        """
+        Given a sorted RoaTable, return each row's position among the consecutive rows sharing its primary key.
+        """
+        if len(table) == 0:
+            return np.zeros(0, dtype=np.int64)
+        group_start = np.ones(len(table), dtype=bool)
+        same_as_previous = np.ones(len(table) - 1, dtype=bool)
+        for cname in RoaTable.key_columns:
+            column = getattr(table, cname)
+            same_as_previous &= column[1:] == column[:-1]
+        group_start[1:] = ~same_as_previous
+        index = np.arange(len(table))
+        retval = index - np.maximum.accumulate(np.where(group_start, index, 0))
+        return retval
+
+    @classmethod
+    def _result_metadata(
+        cls,
+        diff_count:int,
+        diff_engine:DiffEngine,
+        realtime_initial:float,
+        old_file_path:Path,
+        old_metadata:dict,
+        old_fingerprint:str,
+        new_file_path:Path,
+        new_metadata:dict,
+        new_fingerprint:str,
+        phases:dict,
+        max_memory_mb:int=None,
+    ) -> dict:
+        '''
+        Build the metadata vrp_diff_from_files writes into a diff file.
+        '''
+        realtime_delta = time.time() - realtime_initial
+        times = os.times()
+        result_metadata = {
+            'diff_count': diff_count,
+            'diff_engine': str(diff_engine),
+            'diff_program': sys.argv[0],
+            'hostname': socket.gethostname(),
+            'phases': phases,
+            'times': {
+                'realtime': realtime_delta,
+                'user': times.user,
+                'system': times.system,
+            },
+            'timestamp': int(time.time()),
+            'user': getpass.getuser(),
+            'vrp_cache_old': {
+                'filename': old_file_path.name,
+                'fingerprint': old_fingerprint,
+                'metadata': old_metadata,
+            },
+            'vrp_cache_new': {
+                'filename': new_file_path.name,
+                'fingerprint': new_fingerprint,
+                'metadata': new_metadata,
+            },
+        }
+        if max_memory_mb is not None:
+            result_metadata['max_memory_mb'] = max_memory_mb
+        try:
+            import psutil
+            memory_use_rss = psutil.Process().memory_info().rss
+            result_metadata['memory_use_rss_mb'] = int(memory_use_rss / 1048576)
+        except:
+            logger.info(F'Unable to invoke psutil.Process().memory_info() to get RAM use.  Omitting it from metadata.')
+            pass
+        return result_metadata
+
+    @classmethod
+    def _roa_objs(cls, roas:list[dict] | list[Roa]) -> list[Roa]:
+        """
+        Return the given VRPs as Roa objects, converting them if they are rpki-client JSON dicts.
+        """
+        if len(roas) and isinstance(roas[0], Roa):
+            return roas
+        return Roa.batch_from_rpkiclient(roas)
+
+    @classmethod
+    def _roa_table(cls, roas:list[dict] | list[Roa]) -> RoaTable:
+        """
+        Return the given VRPs as a RoaTable, whether they are rpki-client JSON dicts or Roa objects.
+        """
+        if len(roas) and isinstance(roas[0], Roa):
+            return RoaTable.new_from_roas(roas)
+        return RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': roas})
+
+    @classmethod
+    def _roa_tables_from_files_parallel(cls, old_file_path:Path, new_file_path:Path) -> tuple[RoaTable, RoaTable]:
+        """
+        Load both snapshots with roa_table_from_file(), parsing JSON inputs in two processes at once.  .rpkisnap
+        inputs are memory-mapped in this process, since there is nothing to parse and pickling would copy them.
+        """
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(cls.roa_table_from_file, path) if not is_rpkisnap_path(path) else None
+                for path in (old_file_path, new_file_path)
+            ]
+            old_table, new_table = [
+                future.result() if future else cls.roa_table_from_file(path)
+                for future, path in zip(futures, (old_file_path, new_file_path))
+            ]
+        return old_table, new_table
+
+    @classmethod
+    def _s3_chain_keys(cls, src_bucket, summary_keys:list[str]) -> list[str]:
+        '''
+        Return summary_keys, in chronological order, preceded by the key of the summary before the first of them, so
+        that generic_entry_point_chain() diffs every one of summary_keys as generic_entry_point() would.  If there
+        is no earlier summary in src_bucket the first key can't be diffed, and summary_keys is returned as is.
+        '''
+        if not summary_keys:
+            return summary_keys
+        first_datetime = dateutil.parser.parse(re.search(r'\d{8}T\d{4,6}Z', summary_keys[0]).group())
+        try:
+            previous_key = list_s3_object_previous(bucket=src_bucket, subject_datetime=first_datetime)
+        except KeyError:
+            logger.warning(F'No file found in {src_bucket.name} older than {first_datetime}.'
+                           F' Cannot produce diff for {summary_keys[0]}.')
+            return summary_keys
+        retlist = [previous_key] + summary_keys
+        return retlist
+
+    @classmethod
+    def _s3_diff_collision(
+        cls,
+        s3,
+        diff_bucket_name:str,
+        output_file_key:str,
+        diff_collision_behavior: Exception | CollisionBehavior,
+    ) -> bool:
+        '''
+        Return True if output_file_key already exists in the diff bucket and should not be overwritten.  Raises
+        diff_collision_behavior if it is an exception.
+        '''
+        collision = False
+        if diff_collision_behavior is not CollisionBehavior.OVERWRITE:
+            try:
+                s3.head_object(Bucket=diff_bucket_name, Key=output_file_key)
+                collision = True
+            except ClientError as exc:
+                if exc.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                    raise
+            if collision:
+                if isinstance(diff_collision_behavior, Exception):
+                    raise diff_collision_behavior
+                logger.info(
+                    F'Collision: {output_file_key} already exists in {diff_bucket_name}; '
+                    F'diff will be generated but not uploaded (diff_collision_behavior={diff_collision_behavior})'
+                )
+        return collision
+
+    @classmethod
+    def _s3_fetch_summary(cls, s3, src_bucket_name:str, key:str, summary_cache:Path, tmp_dir:Path) -> Path:
+        '''
+        Return the local path of a summary file, downloading it from S3 unless summary_cache already has it.
+        '''
+        if summary_cache:
+            file_path = Path(summary_cache, key)
+        else:
+            file_path = Path(tmp_dir, key)
+        if summary_cache and file_path.exists():
+            logger.info(F'Using cache to access {key}')
+        else:
+            logger.info(F'Downloading {key} from S3')
+            s3.download_file(Bucket=src_bucket_name, Key=key, Filename=str(file_path))
+        return file_path
+
+    @classmethod
+    def _snapshot_from_file(
+        cls,
+        path:Path,
+        as_table:bool,
+        sort:bool=False,
+        phase_timer:PhaseTimer=None,
+        run_rows:int=None,
+        defer_roas:bool=False,
+    ) -> tuple[dict, RoaTable | list[Roa] | list[dict[str, list]] | SortedRuns, str]:
+        """
+        Load a snapshot as a RoaTable, or else as a list of Roa objects.  Returns (metadata, roas, fingerprint).
+        With sort=True the snapshot is sorted up front, which saves work when it is diffed more than once.
+        If run_rows is given the snapshot is instead spilled to SortedRuns of that size, and as_table and sort are
+        ignored.  With defer_roas=True a snapshot which would be a list of Roa objects is returned as the column
+        batches of roa_columns_from_file() instead, so that _roas_from_deferred() only builds the Roa objects if
+        the fingerprints show they are needed.
+        """
+        if run_rows is not None:
+            runs = SortedRuns.new_from_file(path, run_rows=run_rows, phase_timer=phase_timer)
+            return runs.metadata, runs, runs.fingerprint
+        if as_table:
+            table = cls.roa_table_from_file(path, phase_timer=phase_timer)
+            if sort:
+                with optional_phase(phase_timer, 'sort'):
+                    table = table.sorted()
+            with optional_phase(phase_timer, 'fingerprint'):
+                fingerprint = fingerprint_table(table)
+            return table.metadata, table, fingerprint
+        fingerprint = RoaSetFingerprint()
+        if defer_roas:
+            metadata, column_batches = cls.roa_columns_from_file(path, fingerprint=fingerprint, phase_timer=phase_timer)
+            return metadata, column_batches, fingerprint.hexdigest()
+        metadata, roas = cls.roas_from_file(path, fingerprint=fingerprint, phase_timer=phase_timer)
+        if sort:
+            # the engines' own sorted() calls are then linear
+            with optional_phase(phase_timer, 'sort'):
+                roas.sort(key=Roa.sortable)
+        return metadata, roas, fingerprint.hexdigest()
+
+    @classmethod
+    def _roas_from_deferred(
+        cls,
+        column_batches:list[dict[str, list]],
+        sort:bool=False,
+        phase_timer:PhaseTimer=None,
+    ) -> list[Roa]:
+        """
+        Finish loading a snapshot returned by _snapshot_from_file(defer_roas=True), as it would otherwise have been.
+        """
+        retlist = cls.roas_from_columns(column_batches, phase_timer=phase_timer)
+        if sort:
+            with optional_phase(phase_timer, 'sort'):
+                retlist.sort(key=Roa.sortable)
+        return retlist
+
+    @classmethod
+    def _update_fingerprint_sidecar(cls, summary_path:Path, fingerprint:str, metadata:dict):
+        """
+        Write the fingerprint sidecar of a summary unless it already has an up to date one.  Failure to write it,
+        e.g. because the summary is in a read-only directory, is logged and otherwise ignored.
+        """
+        sidecar = read_fingerprint_sidecar(summary_path)
+        if sidecar is not None and sidecar['fingerprint'] == fingerprint:
+            return
+        try:
+            write_fingerprint_sidecar(summary_path, fingerprint=fingerprint, metadata=metadata)
+        except OSError as exc:
+            logger.warning(F'Could not write fingerprint sidecar for {str(summary_path)}: {exc}')
+
+    @classmethod
+    def _write_vrp_diff(
+        cls,
+        old_file_path:Path,
+        old_metadata:dict,
+        old_roas:RoaTable | list[Roa] | SortedRuns | None,
+        old_fingerprint:str,
+        new_file_path:Path,
+        new_metadata:dict,
+        new_roas:RoaTable | list[Roa] | SortedRuns,
+        new_fingerprint:str,
+        output_file_path:Path,
+        realtime_initial:float,
+        phase_timer:PhaseTimer,
+        output_open_mode:str,
+        diff_engine:DiffEngine,
+        streaming:bool,
+        workers:int,
+        max_memory_mb:int=None,
+    ) -> dict:
+        """
+        Diff two loaded snapshots, which must be RoaTables if workers > 1 or diff_engine is vectorized, or SortedRuns
+        if max_memory_mb is set, and write the result to output_file_path.  Returns result metadata.  If the
+        fingerprints match the diff is empty and old_roas is not used, so it may be None.  The work
+        behind vrp_diff_from_files() and vrp_diff_chain_from_files().
+        """
+        # open the output file, before the diff so that an output_open_mode='x' collision fails fast
+        if not streaming:
+            # written in binary, as the body is compressed before the metadata header is written
+            output_file = open(output_file_path, output_open_mode.replace('t', '') + 'b')
+        elif output_file_path.suffix == '.bz2':
+            output_file = phase_timer.wrap_file('compress', open_parallel_bz2(output_file_path, output_open_mode))
+        else:
+            output_file = phase_timer.wrap_file('compress', open(output_file_path, output_open_mode))
+        if DiffFormat.for_path(output_file_path) == DiffFormat.NDJSON:
+            writer_class = VrpDiffNdjsonWriter
+        else:
+            writer_class = VrpDiffWriter
+        # execute the selected diff engine, unless the snapshots are known to be identical
+        if old_fingerprint == new_fingerprint:
+            logger.info(F'Old and new snapshots have the same fingerprint {new_fingerprint}; the diff is empty')
+            diffs = iter(())
+        else:
+            logger.info(
+                F'Diff-ing {len(old_roas)} old and {len(new_roas)} new records using the {diff_engine} engine...'
+            )
+            if max_memory_mb is not None:
+                diffs = cls.vrp_diff_sorted_iter(old_roas=old_roas, new_roas=new_roas)
+            elif workers > 1:
+                diffs = cls.vrp_diff_parallel_iter(
+                    old_table=old_roas,
+                    new_table=new_roas,
+                    diff_engine=diff_engine,
+                    workers=workers,
+                )
+            elif diff_engine == DiffEngine.VECTORIZED:
+                diffs = cls.vrp_diff_table_iter(old_table=old_roas, new_table=new_roas)
+            else:
+                diffs = cls.vrp_diff_roas_iter(old_roas=old_roas, new_roas=new_roas, diff_engine=diff_engine)
+        diffs = phase_timer.iter_phase('diff', diffs)
+        result_metadata_args = {
+            'diff_engine': diff_engine,
+            'realtime_initial': realtime_initial,
+            'old_file_path': old_file_path,
+            'old_metadata': old_metadata,
+            'old_fingerprint': old_fingerprint,
+            'new_file_path': new_file_path,
+            'new_metadata': new_metadata,
+            'new_fingerprint': new_fingerprint,
+            'max_memory_mb': max_memory_mb,
+        }
+        if streaming:
+            # Write each diff as the engine yields it.  The metadata, which needs the final count, is the trailer.
+            logger.info(F'Streaming results to JSON file {str(output_file_path)}')
+            with phase_timer.phase('serialize'):
+                writer = writer_class(output_file)
+                diff_count = writer.write_all(diffs)
+            result_metadata = cls._result_metadata(
+                diff_count=diff_count,
+                phases=phase_timer.as_json_obj(),
+                **result_metadata_args,
+            )
+            writer.close(metadata=result_metadata)
+        else:
+            # The metadata goes in the header, so serialize and compress the body first for its phases to include
+            # that work.  A bzip2 file may be made of several streams, so the header is compressed on its own.
+            diff_objs = list(diffs)
+            compressed = output_file_path.suffix == '.bz2'
+            with phase_timer.phase('serialize'):
+                body = writer_class.serialize_body(diff_objs).encode()
+            if compressed:
+                with phase_timer.phase('compress'):
+                    body = parallel_bz2_compress(body)
+            result_metadata = cls._result_metadata(
+                diff_count=len(diff_objs),
+                phases=phase_timer.as_json_obj(),
+                **result_metadata_args,
+            )
+            logger.info(F'Writing results to JSON file {str(output_file_path)}')
+            header = writer_class.serialize_header(result_metadata).encode()
+            if compressed:
+                header = parallel_bz2_compress(header)
+            with output_file:
+                output_file.write(header)
+                output_file.write(body)
+        return result_metadata
+
+    @classmethod
+    @contextmanager
+    def es_backfill_mode(
+        cls,
+        es_client:OpenSearch,
+        index_datetimes:Iterable[datetime],
+        force_merge_segments:int=None,
+    ) -> Iterator[list[str]]:
+        '''
+        Context manager which makes sure the diff index of each of index_datetimes exists and applies
+        es_backfill_settings to them, for a bulk load.  Yields the index names.  On leaving the block, even by an
+        exception or KeyboardInterrupt, each index's original values of those settings are put back and the index
+        is refreshed.  An index which can't be restored is logged and doesn't stop the others; its error is raised
+        once they have all been tried, unless the block raised an exception of its own.  If the block completed
+        and force_merge_segments is given, the indices are then force-merged down to that many segments each.
+        '''
+        index_names = sorted({cls.es_create_diff_index_for_datetime(index_datetime=dt, es_client=es_client)
+                              for dt in index_datetimes})
+        original_settings = {}
+        block_failed = False
+        try:
+            for index_name in index_names:
+                settings = es_client.indices.get_settings(index=index_name, flat_settings=True)[index_name]['settings']
+                # a setting which was never set is restored to its default by putting None
+                original_settings[index_name] = {name: settings.get(name) for name in cls.es_backfill_settings}
+                es_client.indices.put_settings(index=index_name, body=cls.es_backfill_settings)
+                logger.info(F'Backfill mode: {index_name} settings {cls.es_backfill_settings}')
+            yield index_names
+        except BaseException:
+            # sys.exc_info() can't tell this in the finally clause: it also reports an exception being handled by
+            # whoever entered this context manager.
+            block_failed = True
+            raise
+        finally:
+            # Every index is restored even if another can't be.  The first failure is raised afterwards, unless
+            # the block itself raised, in which case that exception is the one propagated.
+            restore_error = None
+            for index_name, settings in original_settings.items():
+                try:
+                    es_client.indices.put_settings(index=index_name, body=settings)
+                    es_client.indices.refresh(index=index_name)
+                except Exception as exc:
+                    logger.error(F'Backfill mode: {index_name} settings could not be restored to {settings}: {exc}')
+                    if restore_error is None:
+                        restore_error = exc
+                else:
+                    logger.info(F'Backfill mode: {index_name} settings restored to {settings} and refreshed')
+            if restore_error is not None and not block_failed:
+                raise restore_error
+        if force_merge_segments is not None:
+            for index_name in index_names:
+                logger.info(F'Backfill mode: force-merging {index_name} to {force_merge_segments} segments')
+                es_client.indices.forcemerge(index=index_name, max_num_segments=force_merge_segments)
+
     @classmethod
     def es_create_diff_index_for_datetime(cls, index_datetime:datetime, es_client:OpenSearch) -> str:
         '''
         Ensure necessary index exists for vrp diff data created from new vrp cache at given datetime.
         Returns the datetime-appropriate index name, e.g. '198110'.
+        Each index is only created once per es_client; after that it is assumed to still exist.
         '''
         index_name = index_datetime.strftime('diff-%Y%m')
+        known_indices = cls._es_known_indices.setdefault(es_client, set())
+        if index_name in known_indices:
+            return index_name
         es_client.indices.create(
             index=index_name,
             body={
@@ -426,26 +1660,65 @@ class VrpDiff():
             },
             ignore=400,
         )
+        known_indices.add(index_name)
         return index_name
 
+    @classmethod
+    def get_cached_es_client(
+        cls,
+        es_endpoint: str,
+        es_username: str = None,
+        es_password: str = None,
+        es_ssl_verify: bool = True,
+        pool_maxsize: int = None,
+    ) -> OpenSearch:
+        """
+        Return the client get_es_client() made for the same arguments earlier in this process, or make one.  A run
+        importing many files, or a warm Lambda, then sets up auth and a connection pool and pings the cluster once,
+        and es_create_diff_index_for_datetime() only creates each index once.
+        """
+        key = (es_endpoint, es_username, es_password, es_ssl_verify, pool_maxsize)
+        es_client = cls._es_clients.get(key)
+        if es_client is None:
+            es_client = cls.get_es_client(
+                es_endpoint=es_endpoint,
+                es_username=es_username,
+                es_password=es_password,
+                es_ssl_verify=es_ssl_verify,
+                pool_maxsize=pool_maxsize,
+            )
+            cls._es_clients[key] = es_client
+        return es_client
+
     @classmethod
     def get_datetime_from_diff_filename(cls, summary_filename:str, with_timezone:bool=True) -> datetime:
         '''
         Returns a datetime object or raises a ValueError if the filename does not match our regex.
         '''
-        rem = re.search(r'(?P<datetime>(?P<date>\d{8})T(?P<time>\d{4,6})Z)\.vrpdiff\.json(\.bz2)?$', summary_filename)
+        rem = re.search(
+            r'(?P<datetime>(?P<date>\d{8})T(?P<time>\d{4,6})Z)\.vrpdiff\.(nd)?json(\.bz2)?$',
+            summary_filename,
+        )
         if not rem:
             raise ValueError(F'Input file name didnt match our regex: {summary_filename}')
         dt = dateutil.parser.parse(rem.group('datetime'))
         return(dt)
 
     @classmethod
-    def get_diff_filename_from_summary_filename(cls, summary_filename:str, diff_bzip2:bool=True):
+    def get_diff_filename_from_summary_filename(
+        cls,
+        summary_filename:str,
+        diff_bzip2:bool=True,
+        diff_format:DiffFormat=DiffFormat.JSON,
+    ):
         summary_filename = str(summary_filename)
-        rem = re.search(r'(?P<datetime>(?P<date>\d{8})T(?P<time>\d{4,6})Z)\.json(\.bz2)?$', summary_filename)
+        rem = re.search(
+            r'(?P<datetime>(?P<date>\d{8})T(?P<time>\d{4,6})Z)(\.json(\.bz2)?|\.rpkisnap)$',
+            summary_filename,
+        )
         if not rem:
             raise ValueError(F'Input file name didnt match our regex: {summary_filename}')
-        diff_filename = F'{rem.group("datetime")}.vrpdiff.json'
+        diff_filename = F'{rem.group("datetime")}.vrpdiff.{diff_format}'
         if diff_bzip2:
             diff_filename += '.bz2'
         return diff_filename
@@ -457,6 +1730,7 @@ class VrpDiff():
         es_username: str = None,
         es_password: str = None,
         es_ssl_verify: bool = True,
+        pool_maxsize: int = None,
     ):
         """
         Create and return an OpenSearch client, verified with a ping.
@@ -467,6 +1741,9 @@ class VrpDiff():
 
         Supply es_username/es_password for HTTP basic auth (dev OpenSearch).
         Omit both to use AWS IAM (AWS4Auth) — required for AWS-hosted OpenSearch.
+
+        pool_maxsize is the number of connections kept open for reuse, which should be at least the number of
+        threads sharing the client.  By default it is that of requests, 10.
         """
         if '://' not in es_endpoint:
             logger.warning(
@@ -511,6 +1788,7 @@ class VrpDiff():
             ssl_show_warn=es_ssl_verify,
             connection_class=RequestsHttpConnection,
             http_compress=True,
+            pool_maxsize=pool_maxsize,
         )
         if not es_client.ping():
             raise ConnectionError(
@@ -561,6 +1839,9 @@ class VrpDiff():
         """
         logger.info(f'rpkilog version {importlib.metadata.version("rpkilog")}')
         dst_bucket_name = os.getenv('diff_bucket')
+        diff_format = DiffFormat(os.getenv('diff_format', DiffFormat.JSON))
+        # set to run the differ in a Lambda configured with less memory than a snapshot needs; diffs are then streamed
+        max_memory_mb = int(os.getenv('max_memory_mb')) if os.getenv('max_memory_mb') else None
 
         s3_records = []
 
@@ -591,6 +1872,9 @@ class VrpDiff():
                 src_bucket_name=src_bucket_name,
                 new_file_key=new_file_key,
                 diff_bucket_name=dst_bucket_name,
+                diff_format=diff_format,
+                streaming=max_memory_mb is not None,
+                max_memory_mb=max_memory_mb,
             )
             retval.append(result)
         return retval
@@ -643,6 +1927,7 @@ class VrpDiff():
         """
         logger.info(f'rpkilog version {importlib.metadata.version("rpkilog")}')
         es_bulk_batch_size = int(os.getenv('es_bulk_batch_size', 200))
+        es_bulk_workers = int(os.getenv('es_bulk_workers', 1))
         es_endpoint = os.getenv('es_endpoint')
         if not es_endpoint:
             raise RuntimeError('missing es_endpoint environment variable')
@@ -683,6 +1968,7 @@ class VrpDiff():
             src_s3_key = s3_record['s3']['object']['key']
             result = cls.generic_entry_point_import(
                 es_bulk_batch_size=es_bulk_batch_size,
+                bulk_workers=es_bulk_workers,
                 es_endpoint=es_endpoint,
                 src_s3_bucket_name=src_s3_bucket_name,
                 src_s3_key=src_s3_key,
@@ -694,6 +1980,29 @@ class VrpDiff():
     @classmethod
     def cli_entry_point(cls):
         ap = argparse.ArgumentParser(argument_default=argparse.SUPPRESS)
+        ap.add_argument('--diff-engine', default=DiffEngine.MERGE, type=DiffEngine, choices=list(DiffEngine),
+                        help='Algorithm used to compute the diff.  All engines produce identical output.'
+                             '  "merge" (default) walks sorted lists of Roa objects; "hash-join" indexes the old'
+                             ' snapshot by primary key and sorts only the changes; "vectorized" uses NumPy.')
+        ap.add_argument('--streaming', default=False, action='store_true',
+                        help='Write each diff as it is produced instead of collecting them all first.  The metadata'
+                             ' is written after vrp_diffs instead of before it.')
+        ap.add_argument('--diff-format', default=DiffFormat.JSON, type=DiffFormat, choices=list(DiffFormat),
+                        help='Format of diff files named by the program (not --output-file, whose format follows its'
+                             ' name).  "json" (default) writes one JSON document; "ndjson" writes a header line and'
+                             ' then one diff per line, which importers can stream.  Readers detect either format.')
+        ap.add_argument('--workers', default=1, type=int,
+                        help='Number of processes used to load the snapshots and compute the diff (default: 1).'
+                             '  The output is identical for any number of workers.')
+        ap.add_argument('--max-memory-mb', type=int,
+                        help='Keep the diff within roughly this many MB beyond the interpreter\'s own memory by'
+                             ' spilling each snapshot to sorted runs in a temporary directory and merging them from'
+                             ' disk.  Values below about 30 use the smallest runs.  Overrides --diff-engine and'
+                             ' --workers, and is best combined with --streaming.  The output is identical.')
+        ap.add_argument('--fingerprint-sidecars', default=False, action='store_true',
+                        help='Keep the fingerprint of each summary in a .fingerprint.json file next to it, so a'
+                             ' summary with the same VRPs as its predecessor is diffed without loading the'
+                             ' predecessor.  Most useful with --summary-cache or --summary-dir.')
         ag1 = ap.add_argument_group('Use S3 for I/O to simulate AWS Lambda workflow')
         ag1.add_argument('--summary-bucket', help='S3 bucket containing VRP cache summaries')
         ag1.add_argument('--diff-bucket', help='Destination S3 bucket for VRP cache diff output')
@@ -701,15 +2010,22 @@ class VrpDiff():
         ag1.add_argument('--new-file-key', help='S3 key of "new" file key to use for generating a diff')
         ag1.add_argument('--reprocess-all-s3-summary-files', action='store_true', help='Invoke diff process on all summary files')
         ag1.add_argument('--invoke-lambda-on-all-s3-summary-files', type=str, help='Invoke given lambda (asynchronously) on all summary files')
-        ag1.add_argument('--reprocess-max-files', type=int, help='Stop reprocessing after first N files')
+        ag1.add_argument('--reprocess-max-files', type=int,
+                         help='Stop reprocessing after first N files, each diffed against its predecessor')
         ag1.add_argument('--diff-collision-behavior', default='overwrite', choices=['error', 'overwrite', 'retain'],
                          help='If "error", exit with an error upon collision.  If "overwrite", overwrite'
                               ' if a pre-existing diff is found.  If "retain", calculate new diff but'
                               ' do not upload it; retain the old file.')
         ag2 = ap.add_argument_group('Use local files')
-        ag2.add_argument('--old-file', type=Path, help='Path to the "old" file used for diffing')
+        ag2.add_argument('--old-file', type=Path, help='Path to the "old" file used for diffing.  JSON summary'
+                                                        ' (optionally .bz2) or .rpkisnap')
         ag2.add_argument('--new-file', type=Path, help='Path to the "new" file')
         ag2.add_argument('--output-file', type=Path, help='Output file')
+        ag2.add_argument('--summary-dir', type=Path,
+                         help='Diff every consecutive pair of summary files in this directory, loading each file only'
+                              ' once.  Writes one diff per file after the first into --output-dir.'
+                              '  --reprocess-max-files limits the number of summary files used.')
+        ag2.add_argument('--output-dir', type=Path, help='Output directory for --summary-dir')
         ag3 = ap.add_argument_group('Debug options')
         ag3.add_argument('--debugger', default=False, action='store_true', help='If specified, invoke pdb.set_break()')
         ag3.add_argument('--log-level', type=str, help='Log level.  Try CRITICAL, ERROR, INFO (default) or DEBUG.')
@@ -743,6 +2059,12 @@ class VrpDiff():
                 diff_bucket_name=args['diff_bucket'],
                 diff_collision_behavior=diff_collision_behavior,
                 summary_cache=args['summary_cache'],
+                diff_engine=args['diff_engine'],
+                streaming=args['streaming'],
+                workers=args['workers'],
+                fingerprint_sidecars=args['fingerprint_sidecars'],
+                max_memory_mb=args.get('max_memory_mb'),
+                diff_format=args['diff_format'],
             )
             print(json.dumps(metadata, indent=4, sort_keys=True))
         elif 'old_file' in args:
@@ -751,21 +2073,51 @@ class VrpDiff():
                 new_file_path=args['new_file'],
                 output_file_path=args['output_file'],
                 realtime_initial=time.time(),
+                diff_engine=args['diff_engine'],
+                streaming=args['streaming'],
+                workers=args['workers'],
+                fingerprint_sidecars=args['fingerprint_sidecars'],
+                max_memory_mb=args.get('max_memory_mb'),
             )
             print(json.dumps(metadata, indent=4, sort_keys=True))
+        elif 'summary_dir' in args:
+            # Diff every consecutive pair of local summary files, loading each one only once.
+            summary_paths = sorted(
+                (
+                    path for path in Path(args['summary_dir']).iterdir()
+                    if re.search(r'\d{8}T\d{4,6}Z(\.json(\.bz2)?|\.rpkisnap)$', path.name)
+                ),
+                key=lambda path: re.search(r'\d{8}T\d{4,6}Z', path.name).group(),
+            )
+            steps = cls.vrp_diff_chain_from_files(
+                file_paths=summary_paths[:args.get('reprocess_max_files', len(summary_paths))],
+                output_dir=args['output_dir'],
+                diff_engine=args['diff_engine'],
+                streaming=args['streaming'],
+                workers=args['workers'],
+                fingerprint_sidecars=args['fingerprint_sidecars'],
+                max_memory_mb=args.get('max_memory_mb'),
+                diff_format=args['diff_format'],
+            )
+            for _, new_file_path, output_file_path, metadata in steps:
+                logger.info(F'Wrote {output_file_path} for {new_file_path}')
+                print(json.dumps(metadata, indent=4, sort_keys=True))
         elif 'reprocess_all_s3_summary_files' in args:
-            # Get a list of all the VRP cache diff summary files in S3 and invoke vrp_diff_from_files()
-            # on every one of those.  This is used for re-building all diffs from our summary archive.
-            files_processed = 0
-            diff_bucket = boto3.resource('s3').Bucket(args['diff_bucket'])
+            # Get a list of all the VRP cache diff summary files in S3 and diff each one against its predecessor.
+            # This is used for re-building all diffs from our summary archive.
+            summary_keys = []
             summary_bucket = boto3.resource('s3').Bucket(args['summary_bucket'])
             for buckobj in summary_bucket.objects.all():
                 rem = re.search(r'(?P<datetime>(?P<date>\d{8})T(?P<time>\d{4,6})Z)\.json(\.bz2)?$', buckobj.key)
                 if not rem:
                     logger.info(F'Skipping S3 key {buckobj.key} which does not match our regex')
                     continue
-                if args.get('invoke_lambda_on_all_s3_summary_files', False):
-                    logger.info(F'INVOKING_LAMBDA on {buckobj.key}')
+                summary_keys.append(buckobj.key)
+            summary_keys.sort(key=lambda key: re.search(r'\d{8}T\d{4,6}Z', key).group())
+            summary_keys = summary_keys[:args.get('reprocess_max_files', len(summary_keys))]
+            if args.get('invoke_lambda_on_all_s3_summary_files', False):
+                for files_processed, summary_key in enumerate(summary_keys, start=1):
+                    logger.info(F'INVOKING_LAMBDA on {summary_key}')
                     invoke_payload = {
                         'Records': [
                             {
@@ -774,7 +2126,7 @@ class VrpDiff():
                                         'name': str(args['summary_bucket'])
                                     },
                                     'object': {
-                                        'key': str(buckobj.key)
+                                        'key': str(summary_key)
                                     }
                                 }
                             }
@@ -786,21 +2138,28 @@ class VrpDiff():
                         Payload=json.dumps(invoke_payload),
                     )
                     logger.info(F'LAMBDA_ASYNC_INVOKE_RESULT StatusCode {invoke_result["StatusCode"]} payload: {invoke_result["Payload"].read()}')
-                else:
-                    logger.info(F'Invoking generic_entry_point() for summary key {buckobj.key}...')
-                    metadata = cls.generic_entry_point(
-                        src_bucket_name=args['summary_bucket'],
-                        new_file_key=buckobj.key,
-                        diff_bucket_name=args['diff_bucket'],
-                        diff_collision_behavior=diff_collision_behavior,
-                        summary_cache=args['summary_cache'],
-                    )
+                    logger.info(F'Completed processing summary number {files_processed} key {summary_key}')
+            else:
+                # Each summary is downloaded and parsed once, then reused as the "old" side of the next diff.
+                logger.info(F'Diff-ing {len(summary_keys)} summary keys as a chain...')
+                metadata_iter = cls.generic_entry_point_chain(
+                    src_bucket_name=args['summary_bucket'],
+                    summary_keys=cls._s3_chain_keys(summary_bucket, summary_keys),
+                    diff_bucket_name=args['diff_bucket'],
+                    diff_collision_behavior=diff_collision_behavior,
+                    summary_cache=args['summary_cache'],
+                    diff_engine=args['diff_engine'],
+                    streaming=args['streaming'],
+                    workers=args['workers'],
+                    fingerprint_sidecars=args['fingerprint_sidecars'],
+                    max_memory_mb=args.get('max_memory_mb'),
+                    diff_format=args['diff_format'],
+                )
+                for files_processed, metadata in enumerate(metadata_iter, start=1):
                     print(json.dumps(metadata, indent=4, sort_keys=True))
-                files_processed += 1
-                logger.info(F'Completed processing summary number {files_processed} key {buckobj.key}')
-                if args.get('reprocess_max_files', 1000000000) <= files_processed:
-                    logger.info(F'Reprocessed max number of files per CLI.  Job complete.')
-                    break
+                    logger.info(F'Completed processing summary number {files_processed} key'
+                                F' {metadata["vrp_cache_new"]["filename"]}')
+            logger.info('Reprocessing complete.')
         else:
             raise KeyError('Command line arguments missing')
 
@@ -814,12 +2173,22 @@ class VrpDiff():
         source.add_argument('--all-files', action='store_true',
                             help='Import all diff files in the S3 bucket, youngest first (requires --bucket)')
         source.add_argument('--import-from-disk', type=str, metavar='PATTERN',
-                            help='Glob pattern of local diff files to import, e.g. /data/s3-rpkilog-diff/*.vrpdiff.json.bz2')
+                            help='Glob pattern of local diff files to import, e.g. /data/s3-rpkilog-diff/*.vrpdiff.*json.bz2')
         ap.add_argument('--bucket', help='S3 bucket containing diff file (used with --key or --all-files)')
         ap.add_argument('--all-limit', type=int, help='Max number of files to import (used with --all-files or --import-from-disk)')
         ap.add_argument('--all-date-min', type=dateutil.parser.parse, help='Import files only on-or-after this date')
         ap.add_argument('--all-date-max', type=dateutil.parser.parse, help='Import files only on-or-before this date')
         ap.add_argument('--bulk-batch-size', type=int, default=200, help='Number of records inserted per ES _bulk operation')
+        ap.add_argument('--bulk-workers', type=int, default=1,
+                        help='Number of _bulk operations kept in flight at once, each on its own thread (default: 1)')
+        ap.add_argument('--file-workers', type=int, default=1,
+                        help='Number of files imported at once, each in its own process (default: 1)')
+        ap.add_argument('--month-order', action=argparse.BooleanOptionalAction, default=False,
+                        help="With --file-workers, finish each month's files before starting on the next month's")
+        ap.add_argument('--backfill-mode', action=argparse.BooleanOptionalAction, default=False,
+                        help='Disable refresh on the target indices while importing, then restore their settings')
+        ap.add_argument('--force-merge-segments', type=int,
+                        help='With --backfill-mode, force-merge the target indices to N segments after the import')
         ap.add_argument('--es-endpoint', help='OpenSearch endpoint e.g. https://es-prod.rpkilog.com')
         ap.add_argument('--es-username',
                         help='OpenSearch username for HTTP basic auth (dev only)')
@@ -859,6 +2228,18 @@ class VrpDiff():
                 # Add time zone information to the argument
                 args[argname] = args[argname].replace(tzinfo=timezone.utc)
 
+        if args['file_workers'] > 1 and 'limit_cpu' in args:
+            ap.error('--limit-cpu cannot be combined with --file-workers, whose CPU time is not counted')
+        import_kwargs = {
+            'es_bulk_batch_size': args['bulk_batch_size'],
+            'bulk_workers': args['bulk_workers'],
+            'es_endpoint': args['es_endpoint'],
+            # concurrent imports would draw over one another's progress bars, so only the file count is logged
+            'progress_bar_enable': args['progress'] and args['file_workers'] == 1,
+            'es_username': es_username,
+            'es_password': es_password,
+            'es_ssl_verify': es_ssl_verify,
+        }
         if 'import_from_disk' in args:
             matched_strs = glob.glob(str(args['import_from_disk']))
             if not matched_strs:
@@ -873,7 +2254,7 @@ class VrpDiff():
                     continue
                 file_list.append((dt, path))
             file_list.sort(key=operator.itemgetter(0), reverse=not args['sort_ascending'])
-            import_file_count = 0
+            import_jobs = []
             for dt, path in file_list:
                 if 'all_date_min' in args and dt < args['all_date_min']:
                     logger.debug('SKIP %s: earlier than --all-date-min', path)
@@ -881,28 +2262,13 @@ class VrpDiff():
                 if 'all_date_max' in args and args['all_date_max'] < dt:
                     logger.debug('SKIP %s: later than --all-date-max', path)
                     continue
-                logger.info('Importing %s', path)
-                result = cls.generic_entry_point_import(
-                    es_bulk_batch_size=args['bulk_batch_size'],
-                    es_endpoint=args['es_endpoint'],
-                    progress_bar_enable=args['progress'],
-                    src_local_path=path,
-                    es_username=es_username,
-                    es_password=es_password,
-                    es_ssl_verify=es_ssl_verify,
-                )
-                import_file_count += 1
-                logger.info('Imported file count %d name %s result: %s', import_file_count, path, json.dumps(result))
-                if args.get('all_limit', 1000000000) <= import_file_count:
-                    break
-                if 'limit_cpu' in args:
-                    cls.limit_cpu_sleep(invocation_time=invocation_time, limit=args['limit_cpu'] / 100)
+                import_jobs.append((dt, str(path), dict(import_kwargs, src_local_path=path)))
         elif args.get('all_files', False):
             if 'bucket' not in args:
                 ap.error('--bucket is required with --all-files')
             # Invoke cls.generic_entry_point_import() on every file in the bucket, youngest first.
             diff_bucket = boto3.resource('s3').Bucket(args['bucket'])
-            import_file_count = 0
+            import_jobs = []
             diff_bucket_objects = sorted(diff_bucket.objects.all(), key=operator.attrgetter('key'), reverse=not args['sort_ascending'])
             for buckobj in diff_bucket_objects:
                 dt = cls.get_datetime_from_diff_filename(summary_filename=buckobj.key)
@@ -914,38 +2280,59 @@ class VrpDiff():
                     if args['all_date_max'] < dt:
                         logger.debug(F'SKIP file {buckobj.key} because it is later than --all-date-max argument')
                         continue
-                logger.info(F'Importing {buckobj.key}')
+                import_jobs.append((
+                    dt,
+                    buckobj.key,
+                    dict(import_kwargs, src_s3_bucket_name=args['bucket'], src_s3_key=buckobj.key),
+                ))
+        if 'key' in args:
+            if 'bucket' not in args:
+                ap.error('--bucket is required with --key')
+        else:
+            import_jobs = import_jobs[:args.get('all_limit', 1000000000)]
+        if args['backfill_mode']:
+            if 'key' in args:
+                index_datetimes = [cls.get_datetime_from_diff_filename(summary_filename=str(args['key']))]
+            else:
+                index_datetimes = [dt for dt, name, kwargs in import_jobs]
+            # a client of its own, which the --file-workers processes don't inherit from get_cached_es_client()
+            backfill_es_client = cls.get_es_client(
+                es_endpoint=args['es_endpoint'],
+                es_username=es_username,
+                es_password=es_password,
+                es_ssl_verify=es_ssl_verify,
+            )
+            backfill_mode = cls.es_backfill_mode(
+                es_client=backfill_es_client,
+                index_datetimes=index_datetimes,
+                force_merge_segments=args.get('force_merge_segments'),
+            )
+        elif 'force_merge_segments' in args:
+            ap.error('--force-merge-segments requires --backfill-mode')
+        else:
+            backfill_mode = nullcontext()
+        with backfill_mode:
+            if 'key' in args:
                 result = cls.generic_entry_point_import(
                     es_bulk_batch_size=args['bulk_batch_size'],
+                    bulk_workers=args['bulk_workers'],
                     es_endpoint=args['es_endpoint'],
-                    progress_bar_enable=args['progress'],
                     src_s3_bucket_name=args['bucket'],
-                    src_s3_key=buckobj.key,
+                    src_s3_key=args['key'],
                     es_username=es_username,
                     es_password=es_password,
                     es_ssl_verify=es_ssl_verify,
                 )
-                import_file_count += 1
-                logger.info(F'Imported file count {import_file_count} name {buckobj.key} result: {json.dumps(result)}')
-                if args.get('all_limit', 1000000000) <= import_file_count:
-                    # reached --all-limit max file count
-                    break
-                if 'limit_cpu' in args:
-                    cls.limit_cpu_sleep(invocation_time=invocation_time, limit=args['limit_cpu']/100)
-        else:
-            # --key branch
-            if 'bucket' not in args:
-                ap.error('--bucket is required with --key')
-            result = cls.generic_entry_point_import(
-                es_bulk_batch_size=args['bulk_batch_size'],
-                es_endpoint=args['es_endpoint'],
-                src_s3_bucket_name=args['bucket'],
-                src_s3_key=args['key'],
-                es_username=es_username,
-                es_password=es_password,
-                es_ssl_verify=es_ssl_verify,
-            )
-            print(json.dumps(result))
+                print(json.dumps(result))
+            else:
+                # --all-files or --import-from-disk
+                cls._import_files(
+                    import_jobs=import_jobs,
+                    file_workers=args['file_workers'],
+                    month_order=args['month_order'],
+                    limit_cpu=args['limit_cpu'] / 100 if 'limit_cpu' in args else None,
+                    invocation_time=invocation_time,
+                )
 
     @classmethod
     def cli_entry_point_diff_import_from_sqs(cls):
@@ -967,6 +2354,8 @@ class VrpDiff():
                         help='SQS queue name to consume (e.g. diff_dev)')
         ap.add_argument('--bulk-batch-size', type=int, default=200,
                         help='Number of records per OpenSearch _bulk operation (default: 200)')
+        ap.add_argument('--bulk-workers', type=int, default=1,
+                        help='Number of _bulk operations kept in flight at once, each on its own thread (default: 1)')
         ap.add_argument('--es-endpoint',
                         help='OpenSearch endpoint hostname e.g. https://localhost:9200 (required unless --dry-run)')
         ap.add_argument('--es-username',
@@ -1021,6 +2410,7 @@ class VrpDiff():
                 logger.info('Importing key %s from bucket %s', key, bucket)
                 result = cls.generic_entry_point_import(
                     es_bulk_batch_size=args['bulk_batch_size'],
+                    bulk_workers=args['bulk_workers'],
                     es_endpoint=args['es_endpoint'],
                     src_s3_bucket_name=bucket,
                     src_s3_key=key,
@@ -1058,6 +2448,12 @@ class VrpDiff():
         diff_collision_behavior: Exception | CollisionBehavior = CollisionBehavior.OVERWRITE,
         summary_cache:Path=None,
         tmp_dir:Path=None,
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+        streaming:bool=False,
+        workers:int=1,
+        fingerprint_sidecars:bool=False,
+        diff_format:DiffFormat=DiffFormat.JSON,
+        max_memory_mb:int=None,
     ):
         '''
         Invoke by cli_entry_point or aws_lambda_entry_point.
@@ -1073,23 +2469,14 @@ class VrpDiff():
             raise ValueError(F'Input file name didnt match our regex: {new_file_key}')
         new_file_datestr = rem.group('datetime')
         new_file_datetime = dateutil.parser.parse(rem.group('datetime'))
-        output_file_key=F'{new_file_datestr}.vrpdiff.json.bz2'
+        output_file_key=F'{new_file_datestr}.vrpdiff.{diff_format}.bz2'
         output_file_path=Path(tmp_dir, output_file_key)
-        collision = False
-        if diff_collision_behavior is not CollisionBehavior.OVERWRITE:
-            try:
-                s3.head_object(Bucket=diff_bucket_name, Key=output_file_key)
-                collision = True
-            except ClientError as exc:
-                if exc.response['Error']['Code'] not in ('404', 'NoSuchKey'):
-                    raise
-            if collision:
-                if isinstance(diff_collision_behavior, Exception):
-                    raise diff_collision_behavior
-                logger.info(
-                    F'Collision: {output_file_key} already exists in {diff_bucket_name}; '
-                    F'diff will be generated but not uploaded (diff_collision_behavior={diff_collision_behavior})'
-                )
+        collision = cls._s3_diff_collision(
+            s3=s3,
+            diff_bucket_name=diff_bucket_name,
+            output_file_key=output_file_key,
+            diff_collision_behavior=diff_collision_behavior,
+        )
         src_bucket = boto3.resource('s3').Bucket(src_bucket_name)
         try:
             old_file_key = list_s3_object_previous(bucket=src_bucket, subject_datetime=new_file_datetime)
@@ -1097,28 +2484,31 @@ class VrpDiff():
             logger.warning(f'No file found in {src_bucket_name} older than {new_file_datetime}. Cannot produce diff.')
             return
 
-        if summary_cache:
-            new_file_path = Path(summary_cache, new_file_key)
-            old_file_path = Path(summary_cache, old_file_key)
-        else:
-            new_file_path = Path(tmp_dir, new_file_key)
-            old_file_path = Path(tmp_dir, old_file_key)
-        if summary_cache and old_file_path.exists():
-            logger.info(F'Using cache to access {old_file_key}')
-        else:
-            logger.info(F'Downloading {old_file_key} from S3')
-            s3.download_file(Bucket=src_bucket_name, Key=old_file_key, Filename=str(old_file_path))
-        if summary_cache and new_file_path.exists():
-            logger.info(F'Using cache to access {new_file_key}')
-        else:
-            logger.info(F'Downloading {new_file_key} from S3')
-            s3.download_file(Bucket=src_bucket_name, Key=new_file_key, Filename=str(new_file_path))
+        old_file_path = cls._s3_fetch_summary(
+            s3=s3,
+            src_bucket_name=src_bucket_name,
+            key=old_file_key,
+            summary_cache=summary_cache,
+            tmp_dir=tmp_dir,
+        )
+        new_file_path = cls._s3_fetch_summary(
+            s3=s3,
+            src_bucket_name=src_bucket_name,
+            key=new_file_key,
+            summary_cache=summary_cache,
+            tmp_dir=tmp_dir,
+        )
 
         metadata = cls.vrp_diff_from_files(
             old_file_path=old_file_path,
             new_file_path=new_file_path,
             output_file_path=output_file_path,
             realtime_initial=realtime_initial,
+            diff_engine=diff_engine,
+            streaming=streaming,
+            workers=workers,
+            fingerprint_sidecars=fingerprint_sidecars,
+            max_memory_mb=max_memory_mb,
         )
         if collision:
             logger.info(F'Skipping upload of {output_file_key}: collision with pre-existing object in {diff_bucket_name}')
@@ -1130,11 +2520,79 @@ class VrpDiff():
                 Key=output_file_key,
             )
         if summary_cache==None:
-            os.remove(old_file_path)
-            os.remove(new_file_path)
+            remove_summary_file(old_file_path)
+            remove_summary_file(new_file_path)
         os.remove(output_file_path)
         return metadata
 
+    @classmethod
+    def generic_entry_point_chain(
+        cls,
+        src_bucket_name:str,
+        summary_keys:list[str],
+        diff_bucket_name:str,
+        diff_collision_behavior: Exception | CollisionBehavior = CollisionBehavior.OVERWRITE,
+        summary_cache:Path=None,
+        tmp_dir:Path=None,
+        diff_engine:DiffEngine=DiffEngine.MERGE,
+        streaming:bool=False,
+        workers:int=1,
+        fingerprint_sidecars:bool=False,
+        diff_format:DiffFormat=DiffFormat.JSON,
+        max_memory_mb:int=None,
+    ) -> Iterator[dict]:
+        '''
+        Like calling generic_entry_point() for each of summary_keys[1:], but using vrp_diff_chain_from_files() so
+        each summary is downloaded and parsed once instead of twice.  summary_keys must be in chronological order
+        with no gaps, e.g. every summary in the bucket.  Yields the result metadata of each diff.
+        '''
+        s3 = boto3.client('s3')
+        if tmp_dir is None:
+            tmp_dir = Path('/tmp')
+
+        def fetch_summaries():
+            for key in summary_keys:
+                yield cls._s3_fetch_summary(
+                    s3=s3,
+                    src_bucket_name=src_bucket_name,
+                    key=key,
+                    summary_cache=summary_cache,
+                    tmp_dir=tmp_dir,
+                )
+
+        new_file_path = None
+        steps = cls.vrp_diff_chain_from_files(
+            file_paths=fetch_summaries(),
+            output_dir=tmp_dir,
+            output_open_mode='wt',
+            diff_engine=diff_engine,
+            streaming=streaming,
+            workers=workers,
+            fingerprint_sidecars=fingerprint_sidecars,
+            diff_format=diff_format,
+            max_memory_mb=max_memory_mb,
+        )
+        for old_file_path, new_file_path, output_file_path, metadata in steps:
+            output_file_key = output_file_path.name
+            collision = cls._s3_diff_collision(
+                s3=s3,
+                diff_bucket_name=diff_bucket_name,
+                output_file_key=output_file_key,
+                diff_collision_behavior=diff_collision_behavior,
+            )
+            if collision:
+                logger.info(F'Skipping upload of {output_file_key}: collision with pre-existing object in'
+                            F' {diff_bucket_name}')
+            else:
+                logger.info(F'Uploading vrp diff {output_file_key} to S3, replacing existing object of same key')
+                s3.upload_file(Filename=str(output_file_path), Bucket=diff_bucket_name, Key=output_file_key)
+            if summary_cache is None:
+                remove_summary_file(old_file_path)
+            os.remove(output_file_path)
+            yield metadata
+        if summary_cache is None and new_file_path is not None:
+            remove_summary_file(new_file_path)
+
     @classmethod
     def generic_entry_point_import(
         cls,
@@ -1148,6 +2606,7 @@ class VrpDiff():
         es_username: str = None,
         es_password: str = None,
         es_ssl_verify: bool = True,
+        bulk_workers: int = 1,
     ):
         """
         Invoked by cli_entry_point_import or aws_lambda_entry_point_import.
@@ -1157,6 +2616,12 @@ class VrpDiff():
 
         When dry_run=True, file parsing is performed but no OpenSearch calls are made and no
         index is created.  Returns 'records_would_insert' instead of 'records_inserted'.
+
+        With bulk_workers > 1, up to that many bulk requests are kept in flight at once by
+        _es_parallel_bulk().  The first failure still stops the import with an exception.
+
+        The OpenSearch client comes from get_cached_es_client(), so later imports in the same
+        process (or warm Lambda) reuse it and its connections, and skip creating known indices.
         """
         logging.basicConfig(
             datefmt='%Y-%m-%dT%H:%M:%S',
@@ -1170,81 +2635,82 @@ class VrpDiff():
         else:
             tmpdir = tempfile.TemporaryDirectory()
             diff_file_path = Path(tmpdir.name, Path(src_s3_key).name)
-        if '.json' not in diff_file_path.suffixes:
-            raise ValueError(f'Diff file does not have .json in its suffixes: {diff_file_path}')
+        if not {'.json', '.ndjson'} & set(diff_file_path.suffixes):
+            raise ValueError(f'Diff file does not have .json or .ndjson in its suffixes: {diff_file_path}')
         rem = re.match(r'^(?P<datetime>\d{8}T\d{6}Z)', diff_file_path.name)
         diff_datetime = dateutil.parser.parse(rem.group('datetime'))
         if not dry_run:
-            es_client = cls.get_es_client(
+            es_client = cls.get_cached_es_client(
                 es_endpoint=es_endpoint,
                 es_username=es_username,
                 es_password=es_password,
                 es_ssl_verify=es_ssl_verify,
+                pool_maxsize=bulk_workers if bulk_workers > 1 else None,
             )
             es_index = cls.es_create_diff_index_for_datetime(index_datetime=diff_datetime, es_client=es_client)
         if src_local_path is None:
             s3 = boto3.client('s3')
             s3.download_file(Bucket=src_s3_bucket_name, Key=str(src_s3_key), Filename=str(diff_file_path))
-        if diff_file_path.suffix == '.bz2':
-            diff_file = bz2.open(diff_file_path)
-        elif diff_file_path.suffix == '.json':
-            diff_file = open(diff_file_path)
-        else:
+        if diff_file_path.suffix not in ('.bz2', '.json', '.ndjson'):
             raise ValueError(F'Invoked upon a file with a Path().suffix I cannot open: {diff_file_path}')
-        diff_data = json.load(diff_file)
-        logger.info(f'diff contains {len(diff_data["vrp_diffs"])} records')
-        records_count = 0
-        if dry_run:
-            records_count = len(diff_data['vrp_diffs'])
-        elif es_bulk_batch_size > 1:
-            #BEGIN bulk insert records
-            progress_bar = tqdm(total=len(diff_data["vrp_diffs"]), unit="records", disable=not progress_bar_enable)
-            for batch_base_index in range(0, len(diff_data['vrp_diffs']), es_bulk_batch_size):
-                bulk_actions = []
-                if batch_base_index + es_bulk_batch_size <= len(diff_data['vrp_diffs']):
-                    batch_max_index = batch_base_index + es_bulk_batch_size
+        # The diffs are read a batch at a time, so memory use doesn't depend on the size of the diff.  The reader is
+        # closed even if the import fails, or a long-lived Lambda or --file-workers process would leak its file.
+        with VrpDiffReader.new_from_path(diff_file_path) as diff_reader:
+            # diff_count is only known up front if the metadata is in the file's header
+            diff_count = (diff_reader.metadata or {}).get('diff_count')
+            logger.info(f'{diff_reader.diff_format} diff contains {diff_count or "an unknown number of"} records')
+            records_count = 0
+            if dry_run:
+                for batch in diff_reader.iter_batches():
+                    records_count += len(batch)
+            elif es_bulk_batch_size > 1:
+                #BEGIN bulk insert records
+                # One streaming_bulk() call consumes a lazy generator of actions, so the first request is sent as soon
+                # as its chunk has been read rather than after the whole file, and only that chunk is held in memory.
+                bulk_actions = cls._es_bulk_actions(
+                    diff_batches=diff_reader.iter_batches(es_bulk_batch_size),
+                    es_index=es_index,
+                    diff_datetime=diff_datetime,
+                )
+                if bulk_workers > 1:
+                    bulk_generator = cls._es_parallel_bulk(
+                        es_client=es_client,
+                        actions=bulk_actions,
+                        chunk_size=es_bulk_batch_size,
+                        workers=bulk_workers,
+                    )
                 else:
-                    batch_max_index = len(diff_data['vrp_diffs'])
-                for vrpd_index in range(batch_base_index, batch_max_index):
-                    vrpd_record = diff_data['vrp_diffs'][vrpd_index]
-                    vrpd_obj = VrpDiff.from_json_obj(vrpd_record)
-                    insertable = vrpd_obj.es_bulk_insertable_dict(
+                    # https://elasticsearch-py.readthedocs.io/en/7.x/helpers.html#elasticsearch.helpers.streaming_bulk
+                    bulk_generator = opensearchpy.helpers.streaming_bulk(
+                        client=es_client,
+                        actions=bulk_actions,
+                        chunk_size=es_bulk_batch_size,
+                        **cls.es_bulk_retry_kwargs,
+                    )
+                with tqdm(total=diff_count, unit="records", disable=not progress_bar_enable) as progress_bar:
+                    for ok, bulk_action_result in bulk_generator:
+                        if not ok:
+                            raise ValueError(F'bulk insert returned an unsuccessful result: {bulk_action_result}')
+                        records_count += 1
+                        progress_bar.update(1)
+                #DONE bulk insert records
+            else:
+                for vrp_diff_record in diff_reader.iter_diffs():
+                    vrp_diff_obj = VrpDiff.from_json_obj(vrp_diff_record)
+                    vrp_diff_obj.es_insert(
                         diff_datetime=diff_datetime,
+                        es_client=es_client,
                         es_index=es_index,
                     )
-                    bulk_actions.append(insertable)
-                # https://elasticsearch-py.readthedocs.io/en/7.x/helpers.html#elasticsearch.helpers.streaming_bulk
-                bulk_generator = opensearchpy.helpers.streaming_bulk(
-                    client=es_client,
-                    actions=bulk_actions,
-                    chunk_size=es_bulk_batch_size,
-                    initial_backoff=5,
-                    max_backoff=20,
-                    max_retries=5,
-                )
-                records_inserted_this_batch = 0
-                for ok, bulk_action_result in bulk_generator:
-                    if ok:
-                        records_inserted_this_batch += 1
-                        records_count += 1
-                    else:
-                        raise ValueError(F'bulk insert returned an unsuccessful result: {bulk_action_result}')
-                progress_bar.update(records_inserted_this_batch)
-            progress_bar.close()
-            #DONE bulk insert records
-        else:
-            for vrp_diff_record in diff_data['vrp_diffs']:
-                vrp_diff_obj = VrpDiff.from_json_obj(vrp_diff_record)
-                vrp_diff_obj.es_insert(
-                    diff_datetime=diff_datetime,
-                    es_client=es_client,
-                    es_index=es_index,
-                )
-                records_count += 1
+                    records_count += 1
         runtime = time.time() - realtime_initial
+        records_per_second = records_count / runtime if runtime > 0 else 0.0
         count_key = 'records_would_insert' if dry_run else 'records_inserted'
+        logger.info(F'{count_key} {records_count} in {runtime:.1f}s: {records_per_second:.0f} records/sec'
+                    F' with {bulk_workers} bulk workers')
         retdict = {
             count_key: records_count,
+            'records_per_second': records_per_second,
             'runtime': runtime,
             'src_s3_bucket_name': src_s3_bucket_name,
             'src_s3_key': src_s3_key,
@@ -0,0 +1,132 @@
+from itertools import islice
+import json
+from pathlib import Path
+from typing import IO, Iterator
+
+from rpkilog.diff_format import DiffFormat
+from rpkilog.parallel_bz2 import open_bz2_for_read
+from rpkilog.summary_reader import SummaryReader
+
+
+class VrpDiffReader():
+    """
+    Incremental reader for VRP diff files in either DiffFormat.  The format is detected from the first line: an
+    NDJSON header is a complete JSON object on its own, while a JSON document's first line is not (or, if the whole
+    document is on one line, has vrp_diffs in it).
+
+    NDJSON files are read a line at a time.  JSON documents are streamed by SummaryReader, so memory use is bounded
+    by the batch size either way.  metadata is available as soon as the reader is constructed if the file has it
+    before the diffs, and otherwise once iter_batches() has been exhausted.
+
+    The diffs can only be iterated once:
+
+        with VrpDiffReader.new_from_path(path) as reader:
+            for batch in reader.iter_batches():
+                vrp_diffs = VrpDiff.batch_from_json_obj(batch)
+    """
+    batch_size = 1024
+
+    def __init__(self, fh: IO[bytes]):
+        self.fh = fh
+        self._diffs_consumed = False
+        first_line = fh.readline()
+        header = self._ndjson_header(first_line)
+        if header is None:
+            self.diff_format = DiffFormat.JSON
+            self._document_reader = _VrpDiffDocumentReader(_PrefixedFile(first_line, fh))
+            self._metadata = None
+        else:
+            self.diff_format = DiffFormat.NDJSON
+            self._document_reader = None
+            self._metadata = header.get('metadata')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def new_from_path(cls, path: Path):
+        """
+        Open a diff file, bzip2-decompressing it (in parallel) if the name ends in .bz2.
+        """
+        if Path(path).suffix == '.bz2':
+            fh = open_bz2_for_read(path, mode='rb')
+        else:
+            fh = open(path, mode='rb')
+        return cls(fh)
+
+    @property
+    def metadata(self) -> dict | None:
+        if self._document_reader is not None:
+            return self._document_reader.metadata
+        return self._metadata
+
+    def close(self):
+        self.fh.close()
+
+    def iter_batches(self, batch_size: int = None) -> Iterator[list[dict]]:
+        """
+        Yield lists of up to batch_size diff dicts, suitable for VrpDiff.batch_from_json_obj().
+        """
+        if self._diffs_consumed:
+            raise RuntimeError('VrpDiffReader diffs can only be iterated once')
+        self._diffs_consumed = True
+        if batch_size is None:
+            batch_size = self.batch_size
+        if self._document_reader is not None:
+            yield from self._document_reader.iter_batches(batch_size)
+            return
+        while True:
+            lines = list(islice(self.fh, batch_size))
+            if not lines:
+                return
+            # one loads() per batch rather than per line
+            batch = json.loads(b'[' + b','.join(lines) + b']')
+            if 'verb' not in batch[-1]:
+                self._metadata = batch.pop()['metadata']
+            if batch:
+                yield batch
+
+    def iter_diffs(self) -> Iterator[dict]:
+        """
+        Yield each diff dict in file order.
+        """
+        for batch in self.iter_batches():
+            yield from batch
+
+    @staticmethod
+    def _ndjson_header(line: bytes) -> dict | None:
+        try:
+            header = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(header, dict) or 'object_type' not in header or 'vrp_diffs' in header:
+            return None
+        return header
+
+
+class _PrefixedFile():
+    """
+    A binary file whose first read() returns prefix, i.e. the part of fh already consumed, and later reads go to fh.
+    """
+    def __init__(self, prefix: bytes, fh: IO[bytes]):
+        self.prefix = prefix
+        self.fh = fh
+
+    def close(self):
+        self.fh.close()
+
+    def read(self, size: int = -1) -> bytes:
+        if self.prefix:
+            retval, self.prefix = self.prefix, b''
+            return retval
+        return self.fh.read(size)
+
+
+class _VrpDiffDocumentReader(SummaryReader):
+    """
+    SummaryReader for diff sets in the JSON DiffFormat, yielding the elements of vrp_diffs instead of roas.
+    """
+    array_key = 'vrp_diffs'
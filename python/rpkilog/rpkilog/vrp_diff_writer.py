@@ -0,0 +1,150 @@
+import json
+from typing import IO, Iterable
+
+
+class VrpDiffWriter():
+    """
+    Writes an rpkilog_vrp_cache_diff_set JSON document one diff at a time, so the diffs never have to be collected
+    in memory.  Diffs are buffered and written write_batch_size at a time, rather than one small write each, which
+    matters when output_file is a bz2 file.
+
+    If metadata is passed to the constructor it is written before vrp_diffs, as vrp_diff_from_files always has.
+    Otherwise it is passed to close() and written after vrp_diffs as a trailer, which lets it include counts that are
+    only known once every diff has been written.  Either way the document has the same keys, so readers which load
+    the whole document are unaffected:
+
+        writer = VrpDiffWriter(output_file)
+        writer.write_all(diff_generator)
+        writer.close(metadata={'diff_count': writer.diff_count, ...})
+    """
+    object_type = 'rpkilog_vrp_cache_diff_set'
+    write_batch_size = 1024
+
+    def __init__(self, output_file: IO[str], metadata: dict = None):
+        self.output_file = output_file
+        self.diff_count = 0
+        self.metadata_in_header = metadata is not None
+        self._pending = []
+        self._write_header(metadata)
+
+    def close(self, metadata: dict = None):
+        """
+        Finish the document and close output_file.  metadata is required if it was not given to the constructor.
+        """
+        if self.metadata_in_header == (metadata is not None):
+            raise ValueError('metadata must be passed to exactly one of VrpDiffWriter() and VrpDiffWriter.close()')
+        self._flush()
+        self._write_trailer(metadata)
+        self.output_file.close()
+
+    @classmethod
+    def serialize_body(cls, diffs: Iterable) -> str:
+        """
+        Return what write_all(diffs) and close() write after a header with the metadata in it.  Along with
+        serialize_header() this lets a document's diffs be serialized, and compressed, before its metadata is known.
+        """
+        retval = ',\n    '.join(diff.as_json_str() for diff in diffs)
+        if retval:
+            retval = '    ' + retval + '\n'
+        retval += ']\n}\n'
+        return retval
+
+    @classmethod
+    def serialize_header(cls, metadata: dict) -> str:
+        """
+        Return what the constructor writes when it is given metadata.
+        """
+        retval = (
+            F'{{\n"object_type": "{cls.object_type}",\n'
+            F'"metadata": {cls._metadata_json(metadata)},\n'
+            F'"vrp_diffs": [\n'
+        )
+        return retval
+
+    def write(self, diff):
+        """
+        Append one VrpDiff (or anything else with an as_json_str() method).
+        """
+        self._pending.append(self._serialize_diff(diff))
+        self.diff_count += 1
+        if len(self._pending) >= self.write_batch_size:
+            self._flush()
+
+    def write_all(self, diffs: Iterable) -> int:
+        """
+        Append every diff from an iterable, such as one of the VrpDiff.vrp_diff_*_iter() generators.  Returns the
+        total number of diffs written so far.
+        """
+        for diff in diffs:
+            self.write(diff)
+        return self.diff_count
+
+    def _flush(self):
+        if self._pending:
+            self.output_file.write(''.join(self._pending))
+            self._pending = []
+
+    def _serialize_diff(self, diff) -> str:
+        """
+        Return the text write() appends for one diff, including any separator from the diff before it.
+        """
+        separator = ',\n    ' if self.diff_count else '    '
+        retval = separator + diff.as_json_str()
+        return retval
+
+    def _write_header(self, metadata: dict = None):
+        """
+        Write what comes before the first diff.  metadata is None if it will be passed to close() instead.
+        """
+        if metadata is not None:
+            self.output_file.write(self.serialize_header(metadata))
+        else:
+            self.output_file.write(F'{{\n"object_type": "{self.object_type}",\n"vrp_diffs": [\n')
+
+    def _write_trailer(self, metadata: dict = None):
+        """
+        Write what comes after the last diff.  metadata is None if it was already written by _write_header().
+        """
+        if self.diff_count:
+            self.output_file.write('\n')
+        if metadata is None:
+            self.output_file.write(']\n}\n')
+        else:
+            self.output_file.write(F'],\n"metadata": {self._metadata_json(metadata)}\n}}\n')
+
+    @staticmethod
+    def _metadata_json(metadata: dict) -> str:
+        retval = json.dumps(metadata, indent=4, sort_keys=True)
+        return retval
+
+
+class VrpDiffNdjsonWriter(VrpDiffWriter):
+    """
+    Writes a diff set as newline-delimited JSON, so readers can stream it a line at a time instead of loading one
+    large document.  The first line is a header, `{"metadata": {...}, "object_type": ...}`, and each following line
+    is one diff.  If metadata is passed to close() instead of the constructor, the header has no metadata and a
+    trailer line `{"metadata": {...}}` follows the last diff.  Used the same way as VrpDiffWriter.
+    """
+    @classmethod
+    def serialize_body(cls, diffs: Iterable) -> str:
+        retval = ''.join(diff.as_json_str() + '\n' for diff in diffs)
+        return retval
+
+    @classmethod
+    def serialize_header(cls, metadata: dict) -> str:
+        retval = json.dumps({'metadata': metadata, 'object_type': cls.object_type}, sort_keys=True) + '\n'
+        return retval
+
+    def _serialize_diff(self, diff) -> str:
+        retval = diff.as_json_str() + '\n'
+        return retval
+
+    def _write_header(self, metadata: dict = None):
+        if metadata is not None:
+            self.output_file.write(self.serialize_header(metadata))
+        else:
+            self.output_file.write(json.dumps({'object_type': self.object_type}, sort_keys=True) + '\n')
+
+    def _write_trailer(self, metadata: dict = None):
+        if metadata is not None:
+            self.output_file.write(json.dumps({'metadata': metadata}, sort_keys=True) + '\n')
@@ -0,0 +1,262 @@
+"""
+Reconstruct the VRP set as it was at any point in time from keyframes plus diffs, without fetching summaries.
+
+A keyframe is an .rpkisnap file named after the snapshot it holds, e.g. 20250720T093135Z.rpkisnap, as written by
+`rpkilog-rpkisnap 20250720T093135Z.json.bz2 20250720T093135Z.rpkisnap` or by VrpHistory.build_keyframes().  Diffs are
+the differ's .vrpdiff.json(.bz2) or .vrpdiff.ndjson(.bz2) files, each named after its new snapshot.  Both directories
+may be populated by syncing the S3 buckets.
+
+The VRP set at time T is the snapshot with the latest datetime at or before T.  It is rebuilt from whichever keyframe
+is fewer diffs away: the last keyframe at or before T, replaying the diffs after it, or the first keyframe after T,
+undoing the diffs back to T.  Every ROA a diff removes or adds is in the diff file, so the diffs are applied as
+multisets of rows, all at once, with one lexsort instead of one per diff.
+
+    history = VrpHistory(keyframe_dir=Path('keyframes'), diff_dir=Path('s3-rpkilog-diff'))
+    history.build_keyframes(interval=timedelta(days=1))
+    table = history.vrp_set_at(datetime(2025, 7, 20, 10, 0, tzinfo=timezone.utc))
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+import logging
+from pathlib import Path
+import re
+import time
+
+import dateutil.parser
+import numpy as np
+
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import RPKISNAP_SUFFIX, is_rpkisnap_path, read_rpkisnap, write_rpkisnap, write_summary_json
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_reader import VrpDiffReader
+
+logger = logging.getLogger(__name__)
+
+DATETIME_PATTERN = re.compile(r'\d{8}T\d{4,6}Z')
+
+
+class VrpHistory():
+    """
+    A directory of keyframes and a directory of diffs, which together hold the VRP set at every snapshot.  The
+    directories are listed when needed, so files may be added while a VrpHistory exists.
+    """
+    def __init__(self, keyframe_dir: Path, diff_dir: Path):
+        self.keyframe_dir = Path(keyframe_dir)
+        self.diff_dir = Path(diff_dir)
+
+    @classmethod
+    def apply_changes(cls, table: RoaTable, removed: RoaTable, added: RoaTable) -> RoaTable:
+        """
+        Return table with the rows of removed taken out and the rows of added put in, sorted.  Rows are whole
+        records (primary key and expires) and are counted as multisets, so the changes of any number of consecutive
+        diffs may be applied at once, in any order.  Raises ValueError if removed has more copies of a record than
+        table and added together.
+        """
+        stacked = RoaTable.new_from_tables([table, added, removed])
+        side = np.concatenate([
+            np.zeros(len(table) + len(added), dtype=np.uint8),
+            np.ones(len(removed), dtype=np.uint8),
+        ])
+        record_columns = [getattr(stacked, cname) for cname in RoaTable.key_columns] + [stacked.expires]
+        # np.lexsort uses the LAST key as the primary sort key.  Within a record, rows to keep come first.
+        order = np.lexsort([side] + record_columns[::-1])
+        side = side[order]
+        same_as_previous = np.ones(max(len(order) - 1, 0), dtype=bool)
+        for column in record_columns:
+            column = column[order]
+            same_as_previous &= column[1:] == column[:-1]
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = ~same_as_previous
+        group = np.cumsum(group_start) - 1
+        group_count = int(group[-1]) + 1 if len(group) else 0
+        plus_count = np.bincount(group[side == 0], minlength=group_count)
+        minus_count = np.bincount(group[side == 1], minlength=group_count)
+        missing = np.flatnonzero(minus_count > plus_count)
+        if len(missing):
+            first_missing = stacked[int(order[np.flatnonzero(group_start)[missing[0]]])]
+            raise ValueError(F'{len(missing)} removed records are not present, e.g. {first_missing.as_json_str()}')
+        rank = np.arange(len(order)) - np.flatnonzero(group_start)[group]
+        keep = (side == 0) & (rank < (plus_count - minus_count)[group])
+        retval = stacked.take(order[keep])
+        retval.is_sorted = True
+        return retval
+
+    def build_keyframes(self, interval: timedelta = timedelta(days=1)) -> list[Path]:
+        """
+        Write a keyframe for the first snapshot at least interval after the latest keyframe, and so on through the
+        last diff.  There must be at least one keyframe to start from.  Returns the paths written.
+        """
+        keyframes = self.keyframes()
+        if not keyframes:
+            raise ValueError(F'No keyframes in {self.keyframe_dir}; convert a summary with rpkilog-rpkisnap first')
+        keyframe_datetime, keyframe_path = keyframes[-1]
+        table = read_rpkisnap(keyframe_path)
+        retlist = []
+        pending = []
+        for diff_datetime, diff_path in self.diffs():
+            if diff_datetime <= keyframe_datetime:
+                continue
+            pending.append((diff_datetime, diff_path))
+            if diff_datetime - keyframe_datetime >= interval:
+                table, keyframe_datetime = self._replay(table, keyframe_datetime, pending, backward=False)
+                keyframe_path = self.keyframe_dir / F'{keyframe_datetime:%Y%m%dT%H%M%SZ}{RPKISNAP_SUFFIX}'
+                write_rpkisnap(table, keyframe_path)
+                logger.info(F'Wrote keyframe {keyframe_path} after replaying {len(pending)} diffs')
+                retlist.append(keyframe_path)
+                pending = []
+        return retlist
+
+    def diffs(self) -> list[tuple[datetime, Path]]:
+        """
+        Return (datetime, path) of every diff file, in datetime order.
+        """
+        retlist = []
+        for path in self.diff_dir.iterdir():
+            try:
+                retlist.append((VrpDiff.get_datetime_from_diff_filename(path.name), path))
+            except ValueError:
+                continue
+        retlist.sort()
+        return retlist
+
+    def keyframes(self) -> list[tuple[datetime, Path]]:
+        """
+        Return (datetime, path) of every keyframe, in datetime order.
+        """
+        retlist = [
+            (dateutil.parser.parse(rem.group()), path)
+            for path in self.keyframe_dir.iterdir()
+            if is_rpkisnap_path(path) and (rem := DATETIME_PATTERN.match(path.name))
+        ]
+        retlist.sort()
+        return retlist
+
+    def vrp_set_at(self, when: datetime) -> RoaTable:
+        """
+        Return the VRP set of the latest snapshot at or before when, as a sorted RoaTable whose metadata is that
+        snapshot's rpki-client metadata.  Raises ValueError if no keyframe and diffs cover when, or if a diff needed
+        to get there is missing.
+        """
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        keyframes = self.keyframes()
+        diffs = self.diffs()
+        candidates = []
+        earlier_keyframes = [(dt, path) for dt, path in keyframes if dt <= when]
+        if earlier_keyframes:
+            keyframe_datetime, keyframe_path = earlier_keyframes[-1]
+            steps = [(dt, path) for dt, path in diffs if keyframe_datetime < dt <= when]
+            candidates.append((len(steps), False, keyframe_datetime, keyframe_path, steps))
+        later_keyframes = [(dt, path) for dt, path in keyframes if dt > when]
+        if later_keyframes:
+            keyframe_datetime, keyframe_path = later_keyframes[0]
+            steps = [(dt, path) for dt, path in diffs if when < dt <= keyframe_datetime]
+            # undoing diffs only reaches when if they run right up to the keyframe
+            if steps and steps[-1][0] == keyframe_datetime:
+                candidates.append((len(steps), True, keyframe_datetime, keyframe_path, steps))
+        if not candidates:
+            raise ValueError(F'No keyframe at or before {when}, and none after it that diffs lead back from')
+        realtime_initial = time.time()
+        _, backward, keyframe_datetime, keyframe_path, steps = min(candidates, key=lambda candidate: candidate[:2])
+        table = read_rpkisnap(keyframe_path)
+        table, snapshot_datetime = self._replay(table, keyframe_datetime, steps, backward=backward)
+        if snapshot_datetime > when:
+            raise ValueError(F'The earliest snapshot in {self.diff_dir} is after {when}')
+        logger.info(
+            F'Rebuilt the {snapshot_datetime:%Y%m%dT%H%M%SZ} VRP set ({len(table)} records) from keyframe'
+            F' {keyframe_path.name} and {len(steps)} diffs {"undone" if backward else "replayed"}'
+            F' in {time.time() - realtime_initial:.2f}s'
+        )
+        return table
+
+    @classmethod
+    def _replay(
+        cls,
+        table: RoaTable,
+        table_datetime: datetime,
+        steps: list[tuple[datetime, Path]],
+        backward: bool,
+    ) -> tuple[RoaTable, datetime]:
+        """
+        Apply (or if backward, undo) the given consecutive diffs, in datetime order, to the snapshot table taken at
+        table_datetime.  Returns the resulting table and its snapshot datetime.  Raises ValueError if the diffs
+        don't form an unbroken chain from (or back to) table_datetime.
+        """
+        old_batches = []
+        new_batches = []
+        chain = []
+        for diff_datetime, diff_path in steps:
+            with VrpDiffReader.new_from_path(diff_path) as reader:
+                for batch in reader.iter_batches():
+                    old_batches.append([diff['old_roa'] for diff in batch if diff.get('old_roa')])
+                    new_batches.append([diff['new_roa'] for diff in batch if diff.get('new_roa')])
+                diff_metadata = reader.metadata or {}
+            old_filename = diff_metadata.get('vrp_cache_old', {}).get('filename')
+            old_datetime = None
+            if old_filename:
+                old_datetime = dateutil.parser.parse(DATETIME_PATTERN.search(old_filename).group())
+            chain.append((old_datetime, diff_datetime, diff_path, diff_metadata))
+        # Each diff must start where the previous one ended.  A diff without metadata can't be checked.
+        expected_old_datetime = None if backward else table_datetime
+        for old_datetime, diff_datetime, diff_path, _ in chain:
+            if None not in (old_datetime, expected_old_datetime) and old_datetime != expected_old_datetime:
+                raise ValueError(F'{diff_path} diffs against the {old_datetime:%Y%m%dT%H%M%SZ} snapshot, not'
+                                 F' {expected_old_datetime:%Y%m%dT%H%M%SZ}; a diff is missing')
+            expected_old_datetime = diff_datetime
+        old_table = RoaTable.new_from_rpkiclient_batches(old_batches)
+        new_table = RoaTable.new_from_rpkiclient_batches(new_batches)
+        if backward:
+            retval = cls.apply_changes(table, removed=new_table, added=old_table)
+        else:
+            retval = cls.apply_changes(table, removed=old_table, added=new_table)
+        if not chain:
+            retval.metadata = table.metadata
+            return retval, table_datetime
+        if backward:
+            old_datetime, _, diff_path, diff_metadata = chain[0]
+            if old_datetime is None:
+                raise ValueError(F'{diff_path} has no vrp_cache_old metadata, so the snapshot it undoes to is unknown')
+            retval.metadata = diff_metadata['vrp_cache_old'].get('metadata')
+            return retval, old_datetime
+        _, diff_datetime, _, diff_metadata = chain[-1]
+        retval.metadata = diff_metadata.get('vrp_cache_new', {}).get('metadata')
+        return retval, diff_datetime
+
+
+def cli_entry_point():
+    ap = argparse.ArgumentParser(
+        description='Rebuild the VRP set at any time from .rpkisnap keyframes plus VRP diff files.',
+        argument_default=argparse.SUPPRESS,
+    )
+    ap.add_argument('--keyframe-dir', required=True, type=Path,
+                    help='Directory of keyframes named like 20250720T093135Z.rpkisnap')
+    ap.add_argument('--diff-dir', required=True, type=Path, help='Directory of .vrpdiff files')
+    ap.add_argument('--at', type=dateutil.parser.parse,
+                    help='Rebuild the VRP set at this time, e.g. 2025-07-20T10:00:00Z (UTC if no time zone given)')
+    ap.add_argument('--output-file', type=Path,
+                    help='Where to write the VRP set given with --at: .rpkisnap, or a .json / .json.bz2 summary')
+    ap.add_argument('--overwrite', default=False, action='store_true', help='Overwrite --output-file if it exists')
+    ap.add_argument('--build-keyframes', default=False, action='store_true',
+                    help='Write keyframes from the latest existing keyframe through the last diff')
+    ap.add_argument('--keyframe-interval-hours', default=24.0, type=float,
+                    help='Time between keyframes written by --build-keyframes (default: 24)')
+    ap.add_argument('--log-level', default='INFO', help='Log level.  Try ERROR, INFO (default) or DEBUG.')
+    args = vars(ap.parse_args())
+    logging.basicConfig(
+        datefmt='%Y-%m-%dT%H:%M:%S',
+        format='%(asctime)s.%(msecs)03d %(filename)s %(lineno)d %(funcName)s %(levelname)s %(message)s',
+    )
+    logger.setLevel(args['log_level'])
+    history = VrpHistory(keyframe_dir=args['keyframe_dir'], diff_dir=args['diff_dir'])
+    if args['build_keyframes']:
+        history.build_keyframes(interval=timedelta(hours=args['keyframe_interval_hours']))
+    if 'at' in args:
+        if 'output_file' not in args:
+            ap.error('--output-file is required with --at')
+        table = history.vrp_set_at(args['at'])
+        if is_rpkisnap_path(args['output_file']):
+            write_rpkisnap(table, args['output_file'], open_mode='wb' if args['overwrite'] else 'xb')
+        else:
+            write_summary_json(table, args['output_file'], open_mode='wt' if args['overwrite'] else 'xt')
+    elif not args['build_keyframes']:
+        ap.error('Nothing to do; give --at and/or --build-keyframes')
@@ -0,0 +1,88 @@
+"""
+Helpers shared by several test modules.  They are fixtures which return a function, as the tests are imported with
+--import-mode=importlib and so can't import this module.
+"""
+import bz2
+from pathlib import Path
+import random
+from typing import Callable
+
+import pytest
+
+from rpkilog.diff_format import DiffFormat
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_writer import VrpDiffNdjsonWriter, VrpDiffWriter
+
+
+def _diff_objs(count: int = 500) -> list[VrpDiff]:
+    old_roas = [
+        {'asn': 64496, 'prefix': F'10.{i >> 8}.{i & 0xff}.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000}
+        for i in range(count)
+    ]
+    new_roas = [dict(roa, expires=2000) for roa in old_roas[::2]]
+    return VrpDiff.vrp_diff_list(old_roas=old_roas, new_roas=new_roas)
+
+
+def _write_diff_file(path: Path, diffs: list[VrpDiff], metadata: dict, metadata_in_header: bool = True) -> Path:
+    if DiffFormat.for_path(path) == DiffFormat.NDJSON:
+        writer_class = VrpDiffNdjsonWriter
+    else:
+        writer_class = VrpDiffWriter
+    output_file = bz2.open(path, 'xt') if path.suffix == '.bz2' else open(path, 'x')
+    if metadata_in_header:
+        writer = writer_class(output_file, metadata=metadata)
+        writer.write_all(diffs)
+        writer.close()
+    else:
+        writer = writer_class(output_file)
+        writer.write_all(diffs)
+        writer.close(metadata=metadata)
+    return path
+
+
+def _random_roas(rng: random.Random, count: int) -> list[dict]:
+    """
+    Return ROA dicts drawn from a small key space, so old and new lists overlap, mixing IPv4, IPv6, several TAs
+    and duplicate primary keys.
+    """
+    retlist = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            prefix = F'10.{rng.randrange(4)}.{rng.randrange(4)}.0/24'
+            maxLength = rng.choice([24, 32])
+        else:
+            prefix = F'2001:db8:{rng.randrange(4):x}::/48'
+            maxLength = rng.choice([48, 64])
+        retlist.append({
+            'asn': rng.choice([64496, 64497]),
+            'prefix': prefix,
+            'maxLength': maxLength,
+            'ta': rng.choice(['apnic', 'arin', 'ripe']),
+            'expires': rng.choice([1000000000, 2000000000, 3000000000]),
+        })
+    return retlist
+
+
+@pytest.fixture
+def diff_objs() -> Callable[..., list[VrpDiff]]:
+    """
+    diff_objs(count=500) returns count VrpDiffs, a mix of REPLACE and DELETE, from ROAs in 10.0.0.0/8.
+    """
+    return _diff_objs
+
+
+@pytest.fixture
+def write_diff_file() -> Callable[..., Path]:
+    """
+    write_diff_file(path, diffs, metadata, metadata_in_header=True) writes a diff file in the DiffFormat of its
+    name, bzip2 compressed if the name ends in .bz2, and returns path.
+    """
+    return _write_diff_file
+
+
+@pytest.fixture
+def random_roas() -> Callable[[random.Random, int], list[dict]]:
+    """
+    random_roas(rng, count) returns count ROA dicts drawn from a small key space with rng.
+    """
+    return _random_roas
@@ -1,8 +1,12 @@
+from datetime import datetime, timezone
 import json
 from pathlib import Path
 
+import dateutil.parser
+import netaddr
 import pytest
 
+from rpkilog.roa import canonical_prefix, format_utc_timestamp, parse_utc_timestamp, parse_utc_timestamps
 from rpkilog.vrp_diff import Roa
 
 
@@ -61,6 +65,78 @@ def test_rpkiclient_2023json():
         Roa(**rpkiclient_json_roa)
 
 
+@pytest.mark.parametrize('suffix', ['.rpkiclient2021_json', '.rpkiclient2023_json'])
+def test_batch_from_rpkiclient(suffix):
+    with open(Path(__file__).with_suffix(suffix)) as data_fh:
+        data_dict = json.load(data_fh)
+    batch = Roa.batch_from_rpkiclient(data_dict['roas'])
+    assert len(batch) == len(data_dict['roas'])
+    for roa_dict, batch_roa in zip(data_dict['roas'], batch):
+        assert batch_roa == Roa(**roa_dict)
+        assert batch_roa.as_json_str() == Roa(**roa_dict).as_json_str()
+
+
+@pytest.mark.parametrize('bad_field, bad_value, exception', [
+    ('maxLength', 8, ValueError),
+    ('asn', -1, ValueError),
+    ('asn', 'ASN64496', ValueError),
+    ('expires', -1, ValueError),
+    ('prefix', '192.0.2.0/24/24', ValueError),
+    ('ta', None, TypeError),
+])
+def test_batch_from_rpkiclient_invalid(bad_field, bad_value, exception):
+    roa_dicts = [{'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1}] * 3
+    roa_dicts = [dict(r) for r in roa_dicts]
+    roa_dicts[1][bad_field] = bad_value
+    with pytest.raises(exception, match='row 1'):
+        Roa.batch_from_rpkiclient(roa_dicts)
+
+
+def test_batch_from_routinator_jsonext():
+    with open(Path(__file__).with_suffix('.routinator_jsonext')) as data_fh:
+        data_dict = json.load(data_fh)
+    batch = Roa.batch_from_routinator_jsonext(data_dict['roas'])
+    assert len(batch) == len(data_dict['roas'])
+    for roa_dict, batch_roa in zip(data_dict['roas'], batch):
+        assert batch_roa == Roa.new_from_routinator_jsonext(routinator_json=roa_dict)
+        assert batch_roa.expires == int(dateutil.parser.parse(roa_dict['source'][0]['stale']).timestamp())
+
+
+@pytest.mark.parametrize('timestamp', [
+    '2025-03-15T14:17:31Z',
+    '1970-01-01T00:00:00Z',
+    '2024-02-29T23:59:59Z',
+    # not Routinator's fixed format, so parsed by dateutil
+    '2025-03-15T14:17:31+00:00',
+    '2025-03-15T16:17:31.5+02:00',
+])
+def test_parse_utc_timestamp(timestamp):
+    expected = int(dateutil.parser.parse(timestamp).timestamp())
+    assert parse_utc_timestamp(timestamp) == expected
+    assert parse_utc_timestamps(['2000-01-01T00:00:00Z', timestamp]) == [946684800, expected]
+
+
+@pytest.mark.parametrize('timestamp', ['2025-13-15T14:17:31Z', '2025-02-30T00:00:00Z'])
+def test_parse_utc_timestamp_invalid(timestamp):
+    with pytest.raises(ValueError):
+        parse_utc_timestamp(timestamp)
+    with pytest.raises(ValueError):
+        parse_utc_timestamps([timestamp])
+
+
+@pytest.mark.parametrize('timestamp', [0, 59, 86399, 86400, 951868799, 1742048251, 2 ** 32 + 12345])
+def test_format_utc_timestamp(timestamp):
+    expected = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    assert format_utc_timestamp(timestamp) == expected
+    assert parse_utc_timestamp(format_utc_timestamp(timestamp)) == timestamp
+
+
+@pytest.mark.parametrize('prefix', ['192.0.2.5/24', '10.0.0.0/8', '0.0.0.0/0', '2001:DB8:0:0::1/32', '::ffff:0:0/96'])
+def test_canonical_prefix(prefix):
+    roa = Roa(asn=64496, prefix=prefix, maxLength=int(prefix.split('/')[1]), ta='test')
+    assert canonical_prefix(prefix) == (roa.prefix_version, roa.prefixlen, str(roa.prefix))
+
+
 def test_as_json_obj(test_roa):
     """
     Ensure the returned object can be serialized by the Python json library w/o any special serializers
@@ -89,3 +165,46 @@ def test_primary_key(test_roa):
 def test_sortable(test_roa):
     sortable_tuple = test_roa.sortable()
     _ = sortable_tuple
+
+
+def test_prefix(test_roa):
+    """
+    The prefix is stored as integers and materialized on access; make sure it survives the round trip.
+    """
+    assert isinstance(test_roa.prefix, netaddr.IPNetwork)
+    assert test_roa.prefix.version == test_roa.prefix_version
+    assert test_roa.prefix.first == test_roa.prefix_network
+    assert test_roa.prefix.prefixlen == test_roa.prefixlen
+    assert test_roa.as_json_obj()['prefix'] == str(test_roa.prefix)
+
+
+def test_prefix_canonical_cidr():
+    roa = Roa(asn=64496, prefix='192.0.2.5/24', maxLength=24, ta='test', expires=1000000000)
+    assert str(roa.prefix) == '192.0.2.0/24'
+    assert roa == Roa(asn=64496, prefix='192.0.2.0/24', maxLength=24, ta='test', expires=1000000000)
+
+
+def test_sortable_order():
+    """
+    The packed sort key must order ROAs exactly like netaddr's sort_key() followed by the other fields.
+    """
+    roa_args = []
+    for prefix in ['0.0.0.0/0', '10.0.0.0/8', '10.0.0.0/16', '10.1.0.0/16', '255.255.255.255/32',
+                   '::/0', '2001:db8::/32', '2001:db8::/48', 'ffff::/16']:
+        for maxLength in {netaddr.IPNetwork(prefix).prefixlen, 32 if '.' in prefix else 64}:
+            for asn in [0, 64496, 2 ** 32 - 1]:
+                for ta in ['apnic', 'ripe']:
+                    roa_args.append({'asn': asn, 'prefix': prefix, 'maxLength': maxLength, 'ta': ta, 'expires': 1})
+    roas = [Roa(**args) for args in reversed(roa_args)]
+
+    def netaddr_key(roa):
+        return roa.prefix.sort_key() + (roa.maxLength, roa.asn, roa.ta, roa.expires)
+    assert sorted(roas, key=Roa.sortable) == sorted(roas, key=netaddr_key)
+    assert len({roa.primary_key() for roa in roas}) == len(roas)
+
+
+def test_slots(test_roa):
+    """
+    Roa objects are kept in memory by the hundreds of thousands; they must not carry a per-instance __dict__.
+    """
+    assert not hasattr(test_roa, '__dict__')
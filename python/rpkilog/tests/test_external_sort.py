@@ -0,0 +1,67 @@
+"""
+Tests for SortedRuns, the external merge sort behind vrp_diff_from_files(max_memory_mb=...).
+"""
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from rpkilog import external_sort
+from rpkilog.external_sort import SortedRuns, run_rows_for_memory
+from rpkilog.fingerprint import fingerprint_table
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import write_rpkisnap
+from rpkilog.summary_reader import SummaryReader
+
+
+@pytest.fixture
+def summary_path(tmp_path, random_roas) -> Path:
+    retval = tmp_path / '20250720T000000Z.json'
+    with open(retval, 'w') as fh:
+        json.dump({'metadata': {'buildtime': 'now'}, 'roas': random_roas(random.Random(1), 500)}, fh)
+    return retval
+
+
+def test_runs_merge_in_sortable_order(summary_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(SummaryReader, 'batch_size', 30)
+    runs = SortedRuns.new_from_file(summary_path, run_rows=100, tmp_dir=tmp_path)
+    table = RoaTable.new_from_file(summary_path)
+    assert len(runs.run_paths) == 5
+    assert len(runs) == 500
+    assert runs.metadata == {'buildtime': 'now'}
+    assert runs.fingerprint == fingerprint_table(table)
+    expected = [roa.as_json_str() for roa in sorted(table, key=Roa.sortable)]
+    assert [roa.as_json_str() for roa in runs] == expected
+    # iterating again merges the runs again
+    assert [roa.as_json_str() for roa in runs] == expected
+    run_dir = runs.run_paths[0].parent
+    runs.cleanup()
+    assert not run_dir.exists()
+
+
+def test_empty_summary(tmp_path):
+    summary_path = tmp_path / 'empty.json'
+    summary_path.write_text('{"metadata": {}, "roas": []}')
+    runs = SortedRuns.new_from_file(summary_path, run_rows=100, tmp_dir=tmp_path)
+    assert len(runs) == 0
+    assert list(runs) == []
+    assert runs.fingerprint == fingerprint_table(RoaTable.new_from_file(summary_path))
+
+
+def test_rpkisnap_is_a_single_run(summary_path, tmp_path):
+    rpkisnap_path = tmp_path / 'snapshot.rpkisnap'
+    write_rpkisnap(RoaTable.new_from_file(summary_path), rpkisnap_path)
+    runs = SortedRuns.new_from_file(rpkisnap_path, run_rows=100, tmp_dir=tmp_path)
+    assert runs.run_paths == [rpkisnap_path]
+    assert runs.run_dir is None
+    assert len(runs) == 500
+    runs.cleanup()
+    assert rpkisnap_path.exists()
+
+
+def test_run_rows_for_memory():
+    run_bytes = (256 - external_sort.FIXED_MEMORY_MB) * 1024 * 1024
+    assert run_rows_for_memory(256) == run_bytes // external_sort.RUN_BYTES_PER_ROW
+    assert run_rows_for_memory(0) == external_sort.MIN_RUN_ROWS
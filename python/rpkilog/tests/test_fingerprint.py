@@ -0,0 +1,190 @@
+"""
+Tests for VRP set fingerprints and the identical-snapshot short circuit in vrp_diff_from_files.
+"""
+import json
+import os
+import random
+import time
+
+import pytest
+
+from rpkilog.diff_engine import DiffEngine
+from rpkilog.fingerprint import (
+    RoaSetFingerprint,
+    fingerprint_sidecar_path,
+    fingerprint_table,
+    read_fingerprint_sidecar,
+    remove_summary_file,
+    write_fingerprint_sidecar,
+)
+from rpkilog.roa import Roa, rpkiclient_columns
+from rpkilog.roa_table import RoaTable
+from rpkilog.vrp_diff import VrpDiff
+
+TEST_ROAS = [
+    {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000},
+    {'asn': 64497, 'prefix': '2001:db8::/32', 'maxLength': 48, 'ta': 'other', 'expires': 2000000000},
+    {'asn': 64498, 'prefix': '198.51.100.0/24', 'maxLength': 32, 'ta': 'test', 'expires': 1500000000},
+]
+
+
+def columns_fingerprint(roas: list[dict], batch_size: int = 2) -> str:
+    fingerprint = RoaSetFingerprint()
+    for start in range(0, len(roas), batch_size):
+        fingerprint.update_columns(rpkiclient_columns(roas[start:start + batch_size]))
+    return fingerprint.hexdigest()
+
+
+def test_order_independent():
+    shuffled = TEST_ROAS.copy()
+    random.Random(1).shuffle(shuffled)
+    assert columns_fingerprint(shuffled) == columns_fingerprint(TEST_ROAS)
+
+
+def test_table_matches_columns():
+    # the TA names have different codes in these tables
+    table = RoaTable.new_from_rpkiclient_json({'roas': TEST_ROAS})
+    remapped_table = table.with_ta_names(['aaa', 'other', 'test'])
+    assert fingerprint_table(table) == columns_fingerprint(TEST_ROAS)
+    assert fingerprint_table(remapped_table) == columns_fingerprint(TEST_ROAS)
+    assert fingerprint_table(table.sorted()) == columns_fingerprint(TEST_ROAS)
+
+
+@pytest.mark.parametrize('field, value', [
+    ('asn', 64499),
+    ('prefix', '192.0.2.0/25'),
+    ('maxLength', 25),
+    ('ta', 'other'),
+    ('expires', 1000000001),
+])
+def test_any_field_changes_fingerprint(field, value):
+    changed = [dict(TEST_ROAS[0], **{field: value})] + TEST_ROAS[1:]
+    assert columns_fingerprint(changed) != columns_fingerprint(TEST_ROAS)
+
+
+def test_duplicates_counted():
+    assert columns_fingerprint(TEST_ROAS + TEST_ROAS[:1]) != columns_fingerprint(TEST_ROAS)
+    assert columns_fingerprint(TEST_ROAS[:1] * 2) != columns_fingerprint(TEST_ROAS[:1] * 4)
+
+
+def test_sidecar(tmp_path):
+    summary_path = tmp_path / '20250720T093135Z.json'
+    summary_path.write_text('{}')
+    assert read_fingerprint_sidecar(summary_path) is None
+    write_fingerprint_sidecar(summary_path, fingerprint='3-abc', metadata={'buildtime': 'x'})
+    assert fingerprint_sidecar_path(summary_path).name == '20250720T093135Z.json.fingerprint.json'
+    sidecar = read_fingerprint_sidecar(summary_path)
+    assert sidecar['fingerprint'] == '3-abc'
+    assert sidecar['metadata'] == {'buildtime': 'x'}
+    # a sidecar for a file of a different size is stale
+    summary_path.write_text('{ }')
+    assert read_fingerprint_sidecar(summary_path) is None
+    # so is one for a file of the same size but a different modification time
+    write_fingerprint_sidecar(summary_path, fingerprint='3-abc', metadata={'buildtime': 'x'})
+    summary_stat = summary_path.stat()
+    os.utime(summary_path, ns=(summary_stat.st_atime_ns, summary_stat.st_mtime_ns + 1))
+    assert read_fingerprint_sidecar(summary_path) is None
+
+
+def test_remove_summary_file(tmp_path):
+    summary_path = tmp_path / '20250720T093135Z.json'
+    summary_path.write_text('{}')
+    remove_summary_file(summary_path)
+    assert not summary_path.exists()
+    summary_path.write_text('{}')
+    write_fingerprint_sidecar(summary_path, fingerprint='3-abc', metadata={})
+    remove_summary_file(summary_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def write_summaries(tmp_path, old_roas: list[dict], new_roas: list[dict]):
+    old_path = tmp_path / '20250720T093135Z.json'
+    new_path = tmp_path / '20250720T100145Z.json'
+    with open(old_path, 'w') as fh:
+        json.dump({'metadata': {'buildtime': 'old'}, 'roas': old_roas}, fh)
+    with open(new_path, 'w') as fh:
+        json.dump({'metadata': {'buildtime': 'new'}, 'roas': new_roas}, fh)
+    return old_path, new_path
+
+
+@pytest.mark.parametrize('diff_engine', list(DiffEngine))
+def test_identical_snapshots_short_circuit(tmp_path, monkeypatch, diff_engine):
+    old_path, new_path = write_summaries(tmp_path, TEST_ROAS, TEST_ROAS[::-1])
+    monkeypatch.setattr(VrpDiff, 'vrp_diff_roas_iter', None)
+    monkeypatch.setattr(VrpDiff, 'vrp_diff_table_iter', None)
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=old_path,
+        new_file_path=new_path,
+        output_file_path=tmp_path / 'output.vrpdiff.json',
+        realtime_initial=time.time(),
+        diff_engine=diff_engine,
+    )
+    assert result_metadata['diff_count'] == 0
+    assert result_metadata['vrp_cache_old']['fingerprint'] == columns_fingerprint(TEST_ROAS)
+    assert result_metadata['vrp_cache_new']['fingerprint'] == columns_fingerprint(TEST_ROAS)
+    assert result_metadata['vrp_cache_old']['metadata'] == {'buildtime': 'old'}
+    with open(tmp_path / 'output.vrpdiff.json') as fh:
+        assert json.load(fh)['vrp_diffs'] == []
+
+
+@pytest.mark.parametrize('diff_engine', [DiffEngine.MERGE, DiffEngine.HASH_JOIN])
+def test_identical_snapshots_build_no_roas(tmp_path, monkeypatch, diff_engine):
+    old_path, new_path = write_summaries(tmp_path, TEST_ROAS, TEST_ROAS[::-1])
+
+    def no_roas(*args, **kwargs):
+        raise AssertionError('Roa objects built for identical snapshots')
+    monkeypatch.setattr(Roa, '__init__', no_roas)
+    monkeypatch.setattr(Roa, 'new_from_int_prefix', no_roas)
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=old_path,
+        new_file_path=new_path,
+        output_file_path=tmp_path / 'output.vrpdiff.json',
+        realtime_initial=time.time(),
+        diff_engine=diff_engine,
+    )
+    assert result_metadata['diff_count'] == 0
+    (tmp_path / 'chain').mkdir()
+    steps = list(VrpDiff.vrp_diff_chain_from_files(
+        file_paths=[old_path, new_path],
+        output_dir=tmp_path / 'chain',
+        diff_engine=diff_engine,
+    ))
+    assert steps[0][3]['diff_count'] == 0
+
+
+def test_sidecar_skips_loading_old(tmp_path, monkeypatch):
+    old_path, new_path = write_summaries(tmp_path, TEST_ROAS, TEST_ROAS[::-1])
+    write_fingerprint_sidecar(old_path, fingerprint=columns_fingerprint(TEST_ROAS), metadata={'buildtime': 'old'})
+    loaded_paths = []
+    original = VrpDiff.roa_columns_from_file
+    monkeypatch.setattr(
+        VrpDiff,
+        'roa_columns_from_file',
+        lambda path, **kwargs: loaded_paths.append(path) or original(path, **kwargs),
+    )
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=old_path,
+        new_file_path=new_path,
+        output_file_path=tmp_path / 'output.vrpdiff.json',
+        realtime_initial=time.time(),
+        fingerprint_sidecars=True,
+    )
+    assert loaded_paths == [new_path]
+    assert result_metadata['diff_count'] == 0
+    assert result_metadata['vrp_cache_old']['metadata'] == {'buildtime': 'old'}
+    assert read_fingerprint_sidecar(new_path)['fingerprint'] == columns_fingerprint(TEST_ROAS)
+
+
+def test_sidecars_written_and_diff_unaffected(tmp_path):
+    old_path, new_path = write_summaries(tmp_path, TEST_ROAS, TEST_ROAS[1:])
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=old_path,
+        new_file_path=new_path,
+        output_file_path=tmp_path / 'output.vrpdiff.json',
+        realtime_initial=time.time(),
+        fingerprint_sidecars=True,
+    )
+    assert result_metadata['diff_count'] == 1
+    assert read_fingerprint_sidecar(old_path)['fingerprint'] == columns_fingerprint(TEST_ROAS)
+    assert read_fingerprint_sidecar(new_path)['fingerprint'] == columns_fingerprint(TEST_ROAS[1:])
+    assert read_fingerprint_sidecar(new_path)['metadata'] == {'buildtime': 'new'}
@@ -0,0 +1,167 @@
+"""
+Tests for parallel multi-stream bzip2 compression and block-split decompression.
+"""
+import bz2
+import io
+import random
+
+import pytest
+
+from rpkilog.parallel_bz2 import (
+    ParallelBZ2Reader,
+    ParallelBZ2Writer,
+    bz2_block_spans,
+    open_bz2_for_read,
+    open_parallel_bz2,
+    parallel_bz2_compress,
+)
+
+
+@pytest.fixture
+def data() -> bytes:
+    rng = random.Random(1)
+    return ''.join(F'{{"asn": {rng.randrange(65536)}, "maxLength": 24}},\n' for _ in range(5000)).encode()
+
+
+@pytest.fixture
+def multi_block_data() -> bytes:
+    """
+    About 1.5 MB, which compresslevel=1 (100 kB blocks) splits into over a dozen blocks.
+    """
+    rng = random.Random(2)
+    return ''.join(F'{{"asn": {rng.randrange(65536)}, "prefix": "10.{rng.randrange(256)}.0.0/16"}},\n'
+                   for _ in range(30000)).encode()
+
+
+@pytest.mark.parametrize('block_size', [1000, 65536, 10 ** 7])
+def test_compress_round_trip(data, block_size):
+    compressed = parallel_bz2_compress(data, workers=3, block_size=block_size)
+    assert bz2.decompress(compressed) == data
+
+
+def test_compress_is_multi_stream(data):
+    compressed = parallel_bz2_compress(data, workers=2, block_size=len(data) // 4)
+    assert compressed.count(b'BZh9') >= 4
+
+
+@pytest.mark.parametrize('block_size', [1000, 10 ** 7])
+def test_binary_writer(tmp_path, data, block_size):
+    with open_parallel_bz2(tmp_path / 'out.bz2', 'xb', workers=2, block_size=block_size) as fh:
+        assert isinstance(fh, ParallelBZ2Writer)
+        # odd-sized writes straddle the block boundaries
+        for start in range(0, len(data), 777):
+            fh.write(data[start:start + 777])
+    with bz2.open(tmp_path / 'out.bz2', 'rb') as fh:
+        assert fh.read() == data
+
+
+def test_text_writer(tmp_path, data):
+    with open_parallel_bz2(tmp_path / 'out.json.bz2', 'wt', workers=2, block_size=4096) as fh:
+        fh.write(data.decode() + 'é')
+    with bz2.open(tmp_path / 'out.json.bz2', 'rt', encoding='utf-8') as fh:
+        assert fh.read() == data.decode() + 'é'
+
+
+def test_empty_output_is_valid(tmp_path):
+    with open_parallel_bz2(tmp_path / 'empty.bz2', 'xb'):
+        pass
+    assert bz2.decompress((tmp_path / 'empty.bz2').read_bytes()) == b''
+
+
+def test_exclusive_mode(tmp_path):
+    (tmp_path / 'exists.bz2').write_bytes(b'')
+    with pytest.raises(FileExistsError):
+        open_parallel_bz2(tmp_path / 'exists.bz2', 'xt')
+
+
+def test_read_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_parallel_bz2(tmp_path / 'out.bz2', 'rb')
+
+
+def test_block_spans(multi_block_data):
+    compressed = bz2.compress(multi_block_data, 1)
+    block_spans = bz2_block_spans(compressed)
+    assert len(block_spans) > 10
+    # each block starts just after the previous one ends, and the first just after the 4-byte stream header
+    assert block_spans[0][0] == 32
+    for (_, end_bit, _), (start_bit, _, _) in zip(block_spans, block_spans[1:]):
+        assert end_bit == start_bit
+
+
+@pytest.mark.parametrize('chunk_size', [12, 100, 4099])
+def test_block_spans_from_file(multi_block_data, chunk_size):
+    """
+    Searching a file a chunk at a time finds the same blocks as searching it all at once, wherever the chunks end.
+    """
+    compressed = parallel_bz2_compress(multi_block_data, block_size=len(multi_block_data) // 3, compresslevel=1)
+    assert bz2_block_spans(io.BytesIO(compressed), chunk_size=chunk_size) == bz2_block_spans(compressed)
+    assert bz2_block_spans(io.BytesIO(compressed[:-3]), chunk_size=chunk_size) is None
+
+
+@pytest.mark.parametrize('compress', ['single_stream', 'multi_stream'])
+def test_read_multi_block(tmp_path, multi_block_data, compress):
+    if compress == 'single_stream':
+        compressed = bz2.compress(multi_block_data, 1)
+    else:
+        compressed = parallel_bz2_compress(multi_block_data, block_size=len(multi_block_data) // 3, compresslevel=2)
+    (tmp_path / 'in.bz2').write_bytes(compressed)
+    with open_bz2_for_read(tmp_path / 'in.bz2', workers=3) as fh:
+        assert isinstance(fh.raw, ParallelBZ2Reader)
+        # small reads straddle the block boundaries
+        chunks = []
+        while chunk := fh.read(9999):
+            chunks.append(chunk)
+    assert b''.join(chunks) == multi_block_data
+
+
+def test_read_text(tmp_path, multi_block_data):
+    (tmp_path / 'in.json.bz2').write_bytes(bz2.compress(multi_block_data + 'é'.encode(), 1))
+    with open_bz2_for_read(tmp_path / 'in.json.bz2', 'rt', encoding='utf-8') as fh:
+        assert fh.read() == multi_block_data.decode() + 'é'
+
+
+def test_read_single_block_is_serial(tmp_path, data):
+    (tmp_path / 'in.bz2').write_bytes(bz2.compress(data))
+    with open_bz2_for_read(tmp_path / 'in.bz2', workers=3) as fh:
+        assert isinstance(fh, bz2.BZ2File)
+        assert fh.read() == data
+
+
+def test_read_few_blocks_or_one_worker_is_serial(tmp_path, multi_block_data):
+    (tmp_path / 'few.bz2').write_bytes(bz2.compress(multi_block_data[:300000], 1))
+    with open_bz2_for_read(tmp_path / 'few.bz2', workers=3) as fh:
+        assert isinstance(fh, bz2.BZ2File)
+        assert fh.read() == multi_block_data[:300000]
+    (tmp_path / 'many.bz2').write_bytes(bz2.compress(multi_block_data, 1))
+    with open_bz2_for_read(tmp_path / 'many.bz2', workers=1) as fh:
+        assert isinstance(fh, bz2.BZ2File)
+
+
+def test_crc_mismatch_is_serial(tmp_path, multi_block_data):
+    """
+    A block CRC which does not agree with the stream CRC, as when a magic number occurs by chance inside compressed
+    data, means the file can't be split.  bz2.open() then finds the corruption.
+    """
+    compressed = bytearray(bz2.compress(multi_block_data, 1))
+    start_bit = bz2_block_spans(bytes(compressed))[1][0]
+    compressed[(start_bit + 48) // 8 + 1] ^= 0xFF
+    assert bz2_block_spans(bytes(compressed)) is None
+    (tmp_path / 'in.bz2').write_bytes(compressed)
+    with open_bz2_for_read(tmp_path / 'in.bz2', workers=3) as fh:
+        assert isinstance(fh, bz2.BZ2File)
+        with pytest.raises(OSError):
+            fh.read()
+
+
+def test_read_not_bzip2(tmp_path):
+    (tmp_path / 'in.json').write_bytes(b'{"roas": []}')
+    assert bz2_block_spans(b'{"roas": []}') is None
+    with pytest.raises(OSError):
+        with open_bz2_for_read(tmp_path / 'in.json') as fh:
+            fh.read()
+
+
+def test_write_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_bz2_for_read(tmp_path / 'out.bz2', 'wb')
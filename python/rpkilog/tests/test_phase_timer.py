@@ -0,0 +1,82 @@
+"""
+Tests for PhaseTimer and the phases recorded in vrp_diff_from_files metadata.
+"""
+import bz2
+import io
+import json
+import time
+
+import pytest
+
+from rpkilog.diff_engine import DiffEngine
+from rpkilog.phase_timer import PhaseTimer
+from rpkilog.vrp_diff import VrpDiff
+
+
+def test_nested_phases_are_exclusive():
+    timer = PhaseTimer()
+    with timer.phase('outer'):
+        time.sleep(0.05)
+        with timer.phase('inner'):
+            time.sleep(0.1)
+    phases = timer.as_json_obj()
+    assert 0.1 <= phases['inner']['realtime'] < 0.15
+    assert 0.05 <= phases['outer']['realtime'] < 0.1
+    assert set(phases['inner']) == {'realtime', 'cpu', 'rss_mb', 'max_rss_mb'}
+
+
+def test_phases_accumulate():
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.phase('repeat'):
+            time.sleep(0.02)
+    assert timer.as_json_obj()['repeat']['realtime'] >= 0.06
+
+
+def test_iter_phase():
+    def slow_items():
+        for item in range(5):
+            time.sleep(0.01)
+            yield item
+
+    timer = PhaseTimer()
+    with timer.phase('consume'):
+        assert list(timer.iter_phase('produce', slow_items(), chunk_size=2)) == list(range(5))
+    phases = timer.as_json_obj()
+    assert phases['produce']['realtime'] >= 0.05
+    assert phases['consume']['realtime'] < 0.05
+
+
+def test_wrap_file():
+    timer = PhaseTimer()
+    fh = timer.wrap_file('io', io.StringIO('abc'))
+    assert fh.read(2) == 'ab'
+    fh.close()
+    assert set(timer.phases) == {'io'}
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('diff_engine', list(DiffEngine))
+def test_vrp_diff_phases(tmp_path, diff_engine, streaming):
+    roas = [
+        {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000},
+        {'asn': 64497, 'prefix': '2001:db8::/32', 'maxLength': 48, 'ta': 'other', 'expires': 2000000000},
+    ]
+    with open(tmp_path / 'old.json', 'w') as fh:
+        json.dump({'metadata': {}, 'roas': roas}, fh)
+    with open(tmp_path / 'new.json', 'w') as fh:
+        json.dump({'metadata': {}, 'roas': roas[1:]}, fh)
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=tmp_path / 'old.json',
+        new_file_path=tmp_path / 'new.json',
+        output_file_path=tmp_path / 'output.json.bz2',
+        realtime_initial=time.time(),
+        diff_engine=diff_engine,
+        streaming=streaming,
+    )
+    expected_phases = {'decompress', 'parse', 'construct', 'fingerprint', 'diff', 'serialize', 'compress'}
+    assert expected_phases <= set(result_metadata['phases'])
+    with bz2.open(tmp_path / 'output.json.bz2') as fh:
+        output_data = json.load(fh)
+    assert output_data['metadata']['phases'] == result_metadata['phases']
+    assert len(output_data['vrp_diffs']) == 1
@@ -0,0 +1,104 @@
+"""
+Tests for RoaTable, the columnar NumPy-backed snapshot representation.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+
+TESTS_DIR = Path(__file__).parent
+
+TEST_ROAS = [
+    {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000},
+    {'asn': 64497, 'prefix': '2001:db8::/32', 'maxLength': 48, 'ta': 'other', 'expires': 2000000000},
+    {'asn': 'AS64498', 'prefix': '198.51.100.0/24', 'maxLength': 32, 'ta': 'test', 'expires': 1500000000},
+]
+
+
+@pytest.mark.parametrize('data_filename', ['roa_test.rpkiclient2021_json', 'roa_test.rpkiclient2023_json'])
+def test_rpkiclient_json_matches_roa(data_filename):
+    with open(TESTS_DIR / data_filename) as data_fh:
+        data_dict = json.load(data_fh)
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json=data_dict)
+    assert len(table) == len(data_dict['roas'])
+    assert table.metadata == data_dict['metadata']
+    for roa_dict, table_roa in zip(data_dict['roas'], table):
+        roa = Roa(**roa_dict)
+        assert table_roa == roa
+        assert table_roa.as_json_str() == roa.as_json_str()
+
+
+def test_routinator_jsonext_matches_roa():
+    with open(TESTS_DIR / 'roa_test.routinator_jsonext') as data_fh:
+        data_dict = json.load(data_fh)
+    table = RoaTable.new_from_routinator_jsonext(routinator_json=data_dict)
+    assert len(table) == len(data_dict['roas'])
+    for roa_dict, table_roa in zip(data_dict['roas'], table):
+        assert table_roa == Roa.new_from_routinator_jsonext(routinator_json=roa_dict)
+
+
+def test_columns():
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': TEST_ROAS})
+    assert table.ta_names == ['other', 'test']
+    assert table.family.tolist() == [4, 6, 4]
+    assert table.network_hi.tolist() == [0, 0x20010db800000000, 0]
+    assert table.network_lo.tolist() == [0xc0000200, 0, 0xc6336400]
+    assert table.asn.tolist() == [64496, 64497, 64498]
+    assert table.ta_code.tolist() == [1, 0, 1]
+    for cname, dtype in RoaTable.column_dtypes.items():
+        assert getattr(table, cname).dtype == dtype
+    assert str(table[1].prefix) == '2001:db8::/32'
+    assert table[-1].asn == 64498
+
+
+def test_iteration_spans_chunks(monkeypatch):
+    monkeypatch.setattr(RoaTable, 'iter_chunk_size', 2)
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': TEST_ROAS})
+    assert [roa.as_json_obj() for roa in table] == [Roa(**r).as_json_obj() for r in TEST_ROAS]
+
+
+@pytest.mark.parametrize('bad_field, bad_value', [
+    ('maxLength', 16),
+    ('maxLength', 33),
+    ('asn', 2 ** 32),
+    ('expires', -1),
+    ('prefix', '192.0.2.0/33'),
+    ('prefix', 'not-a-prefix'),
+])
+def test_validation_reports_row(bad_field, bad_value):
+    roas = [dict(r) for r in TEST_ROAS]
+    roas[2][bad_field] = bad_value
+    with pytest.raises(ValueError, match='row 2'):
+        RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': roas})
+
+
+def test_shared_memory_round_trip():
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': TEST_ROAS}).sorted()
+    shm, spec = table.to_shared_memory()
+    try:
+        attached_shm, attached = RoaTable.new_from_shared_memory(spec)
+        assert attached.is_sorted
+        assert attached.ta_names == table.ta_names
+        assert list(attached) == list(table)
+        assert list(attached.slice(1, 3)) == list(table)[1:3]
+        del attached
+        attached_shm.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_shared_memory_empty():
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json={'roas': []})
+    shm, spec = table.to_shared_memory()
+    try:
+        attached_shm, attached = RoaTable.new_from_shared_memory(spec)
+        assert len(attached) == 0
+        del attached
+        attached_shm.close()
+    finally:
+        shm.close()
+        shm.unlink()
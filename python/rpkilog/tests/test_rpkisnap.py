@@ -0,0 +1,161 @@
+"""
+Tests for the .rpkisnap binary snapshot format.
+"""
+import bz2
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import time
+
+import numpy as np
+import pytest
+
+from rpkilog.data_file_super import DataFileSuper
+from rpkilog.local_storage_type import LocalStorageType
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import (
+    RECORD_ALIGNMENT,
+    iter_rpkisnap_chunks,
+    json_from_rpkisnap,
+    read_rpkisnap,
+    rpkisnap_from_json,
+    write_rpkisnap,
+)
+from rpkilog.vrp_diff import VrpDiff
+
+TESTS_DIR = Path(__file__).parent
+TEST_DATA_DIR = TESTS_DIR.parent.parent.parent / 'test_data'
+
+
+@pytest.fixture
+def rpkiclient_json():
+    with open(TESTS_DIR / 'roa_test.rpkiclient2023_json') as data_fh:
+        return json.load(data_fh)
+
+
+def test_round_trip(tmp_path, rpkiclient_json):
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json=rpkiclient_json)
+    write_rpkisnap(table=table, path=tmp_path / 'snap.rpkisnap')
+    snap = read_rpkisnap(tmp_path / 'snap.rpkisnap')
+    assert snap.is_sorted
+    assert snap.metadata == rpkiclient_json['metadata']
+    assert snap.ta_names == table.ta_names
+    assert list(snap) == sorted((Roa(**r) for r in rpkiclient_json['roas']), key=Roa.sortable)
+    for cname, dtype in RoaTable.column_dtypes.items():
+        column = getattr(snap, cname)
+        assert column.dtype == dtype
+        # columns are views into the memory-mapped records, not copies
+        assert not column.flags.owndata
+
+
+def test_record_alignment(tmp_path, rpkiclient_json):
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json=rpkiclient_json)
+    write_rpkisnap(table=table, path=tmp_path / 'snap.rpkisnap')
+    snap = read_rpkisnap(tmp_path / 'snap.rpkisnap')
+    assert snap.network_hi.__array_interface__['data'][0] % RECORD_ALIGNMENT == 0
+
+
+def test_empty(tmp_path):
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json={'metadata': {'roas': 0}, 'roas': []})
+    write_rpkisnap(table=table, path=tmp_path / 'empty.rpkisnap')
+    snap = read_rpkisnap(tmp_path / 'empty.rpkisnap')
+    assert len(snap) == 0
+    assert snap.metadata == {'roas': 0}
+
+
+def test_iter_chunks(tmp_path, rpkiclient_json):
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json=rpkiclient_json)
+    write_rpkisnap(table=table, path=tmp_path / 'snap.rpkisnap')
+    chunks = list(iter_rpkisnap_chunks(tmp_path / 'snap.rpkisnap', chunk_rows=3))
+    assert [len(chunk) for chunk in chunks[:-1]] == [3] * (len(chunks) - 1)
+    assert all(chunk.is_sorted and chunk.metadata == rpkiclient_json['metadata'] for chunk in chunks)
+    assert [roa for chunk in chunks for roa in chunk] == list(read_rpkisnap(tmp_path / 'snap.rpkisnap'))
+    # a file cut short is an error rather than a shorter snapshot
+    snap_bytes = (tmp_path / 'snap.rpkisnap').read_bytes()
+    (tmp_path / 'short.rpkisnap').write_bytes(snap_bytes[:-1])
+    with pytest.raises(ValueError, match='truncated'):
+        list(iter_rpkisnap_chunks(tmp_path / 'short.rpkisnap', chunk_rows=3))
+
+
+def test_bad_magic(tmp_path):
+    (tmp_path / 'bad.rpkisnap').write_bytes(b'{"metadata": {}, "roas": []}' * 4)
+    with pytest.raises(ValueError, match='not an rpkisnap file'):
+        read_rpkisnap(tmp_path / 'bad.rpkisnap')
+
+
+@pytest.mark.parametrize('json_filename', ['summary.json', 'summary.json.bz2'])
+def test_json_conversion(tmp_path, rpkiclient_json, json_filename):
+    with open(tmp_path / 'input.json', 'w') as fh:
+        json.dump(rpkiclient_json, fh)
+    rpkisnap_from_json(json_path=tmp_path / 'input.json', rpkisnap_path=tmp_path / 'snap.rpkisnap')
+    json_from_rpkisnap(rpkisnap_path=tmp_path / 'snap.rpkisnap', json_path=tmp_path / json_filename)
+    opener = bz2.open if json_filename.endswith('.bz2') else open
+    with opener(tmp_path / json_filename, 'rt') as fh:
+        output_json = json.load(fh)
+    assert output_json['metadata'] == rpkiclient_json['metadata']
+    input_roas = sorted((Roa(**r) for r in rpkiclient_json['roas']), key=Roa.sortable)
+    assert [Roa(**r) for r in output_json['roas']] == input_roas
+
+
+def test_sorted_flag_survives_ta_remap(rpkiclient_json):
+    table = RoaTable.new_from_rpkiclient_json(rpkiclient_json=rpkiclient_json).sorted()
+    remapped = table.with_ta_names(['aaa'] + table.ta_names + ['zzz'])
+    assert remapped.is_sorted
+    assert np.array_equal(remapped.sort_order(), np.arange(len(remapped)))
+
+
+class SummaryFile(DataFileSuper):
+    default_filename_strftime_expression = '%Y%m%dT%H%M%SZ.json.bz2'
+
+
+def test_data_file_rpkisnap_feeds_differ(tmp_path, rpkiclient_json):
+    """
+    DataFileSuper.write_rpkisnap() output must be named so that VrpDiff accepts it as a snapshot.
+    """
+    summary = SummaryFile(
+        datetimestamp=datetime(2025, 7, 20, 10, 1, 45, tzinfo=timezone.utc),
+        local_storage_dir=tmp_path,
+        local_storage_type=LocalStorageType.BZIP2,
+    )
+    summary.local_filepath_bz2 = tmp_path / summary.default_filename()
+    with bz2.open(summary.local_filepath_bz2, 'wt') as fh:
+        json.dump(rpkiclient_json, fh)
+    new_path = summary.write_rpkisnap()
+    assert new_path == tmp_path / '20250720T100145Z.rpkisnap'
+    old_path = tmp_path / '20250720T093135Z.json'
+    with open(old_path, 'w') as fh:
+        json.dump(dict(rpkiclient_json, roas=rpkiclient_json['roas'][1:]), fh)
+    output_path = tmp_path / VrpDiff.get_diff_filename_from_summary_filename(new_path.name, diff_bzip2=False)
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=old_path,
+        new_file_path=new_path,
+        output_file_path=output_path,
+        realtime_initial=time.time(),
+    )
+    with open(output_path) as fh:
+        output_data = json.load(fh)
+    assert [diff['verb'] for diff in output_data['vrp_diffs']] == ['NEW']
+
+
+@pytest.mark.slow
+def test_vrp_diff_from_rpkisnap_files(tmp_path):
+    for timestamp in ['20250720T093135Z', '20250720T100145Z']:
+        rpkisnap_from_json(
+            json_path=TEST_DATA_DIR / F'rpkiclient_summary_{timestamp}.json.bz2',
+            rpkisnap_path=tmp_path / F'{timestamp}.rpkisnap',
+        )
+    output_path = tmp_path / 'output.vrpdiff.json'
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=tmp_path / '20250720T093135Z.rpkisnap',
+        new_file_path=tmp_path / '20250720T100145Z.rpkisnap',
+        output_file_path=output_path,
+        realtime_initial=time.time(),
+    )
+    with open(output_path) as fh:
+        output_data = json.load(fh)
+    with bz2.open(TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2') as fh:
+        golden_data = json.load(fh)
+    assert output_data['metadata']['diff_engine'] == 'vectorized'
+    assert output_data['metadata']['vrp_cache_new']['metadata'] == golden_data['metadata']['vrp_cache_new']['metadata']
+    assert output_data['vrp_diffs'] == golden_data['vrp_diffs']
@@ -0,0 +1,92 @@
+"""
+Tests for SummaryReader, the incremental rpki-client summary JSON reader.
+"""
+import bz2
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from rpkilog.roa_table import RoaTable
+from rpkilog.summary_reader import SummaryReader
+
+TESTS_DIR = Path(__file__).parent
+
+TEST_DOCUMENT = {
+    'aspas': [{'customer_asid': 64496, 'providers': [64497, {'nested': '}'}]}, []],
+    'metadata': {'buildtime': '2025-07-20T09:31:35Z', 'note': 'café }'},
+    'roas': [
+        {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000},
+        {'asn': 'AS64497', 'prefix': '2001:db8::/32', 'maxLength': 48, 'ta': 'other', 'expires': 2000000000},
+        {'asn': 64498, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1500000000},
+    ],
+    'trailer': 123456789,
+}
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize('binary', [False, True])
+def test_block_boundaries(monkeypatch, read_size, binary):
+    monkeypatch.setattr(SummaryReader, 'read_size', read_size)
+    document = json.dumps(TEST_DOCUMENT, indent='\t', ensure_ascii=False)
+    fh = io.BytesIO(document.encode('utf-8')) if binary else io.StringIO(document)
+    with SummaryReader(fh) as reader:
+        assert reader.metadata == TEST_DOCUMENT['metadata']
+        assert list(reader.iter_roas()) == TEST_DOCUMENT['roas']
+    assert fh.closed
+
+
+def test_batches():
+    reader = SummaryReader(io.StringIO(json.dumps(TEST_DOCUMENT)))
+    assert list(reader.iter_batches(batch_size=2)) == [TEST_DOCUMENT['roas'][:2], TEST_DOCUMENT['roas'][2:]]
+    with pytest.raises(RuntimeError):
+        list(reader.iter_roas())
+
+
+def test_metadata_after_roas():
+    document = json.dumps({'roas': TEST_DOCUMENT['roas'], 'metadata': TEST_DOCUMENT['metadata']})
+    reader = SummaryReader(io.StringIO(document))
+    assert reader.metadata is None
+    assert list(reader.iter_roas()) == TEST_DOCUMENT['roas']
+    assert reader.metadata == TEST_DOCUMENT['metadata']
+
+
+@pytest.mark.parametrize('document', [
+    '{"metadata": {}, "roas": [{"asn": 1}',
+    '{"metadata": {}, "roas": [{"asn": 1} {"asn": 2}]}',
+    '{"metadata": {}, "roas": []} trailing',
+    '["not", "an", "object"]',
+])
+def test_invalid(document):
+    with pytest.raises(ValueError):
+        reader = SummaryReader(io.StringIO(document))
+        list(reader.iter_roas())
+
+
+@pytest.mark.parametrize('data_filename', ['roa_test.rpkiclient2021_json', 'roa_test.rpkiclient2023_json'])
+def test_matches_json_load(tmp_path, data_filename):
+    with open(TESTS_DIR / data_filename, 'rb') as data_fh:
+        data = data_fh.read()
+    with bz2.open(tmp_path / 'summary.json.bz2', 'wb') as bz2_fh:
+        bz2_fh.write(data)
+    with SummaryReader.new_from_path(tmp_path / 'summary.json.bz2') as reader:
+        assert reader.metadata == json.loads(data)['metadata']
+        assert list(reader.iter_roas()) == json.loads(data)['roas']
+
+
+def test_roa_table_from_batches(monkeypatch):
+    monkeypatch.setattr(SummaryReader, 'batch_size', 2)
+    reader = SummaryReader(io.StringIO(json.dumps(TEST_DOCUMENT)))
+    table = RoaTable.new_from_summary_reader(reader)
+    expected = RoaTable.new_from_rpkiclient_json(rpkiclient_json=TEST_DOCUMENT)
+    assert table.metadata == TEST_DOCUMENT['metadata']
+    assert table.ta_names == expected.ta_names == ['other', 'test']
+    assert list(table) == list(expected)
+
+
+def test_roa_table_batch_error_row():
+    roas = [dict(r) for r in TEST_DOCUMENT['roas']]
+    roas[2]['prefix'] = 'not-a-prefix'
+    with pytest.raises(ValueError, match='row 2'):
+        RoaTable.new_from_rpkiclient_batches([roas[:2], roas[2:]])
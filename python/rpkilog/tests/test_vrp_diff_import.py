@@ -0,0 +1,471 @@
+"""
+Tests for generic_entry_point_import(), with OpenSearch replaced by a fake bulk helper.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import functools
+import json
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+import weakref
+
+import opensearchpy.helpers
+import pytest
+from tqdm import tqdm
+
+from rpkilog import vrp_diff
+from rpkilog.diff_format import DiffFormat
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_reader import VrpDiffReader
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+DIFF_DATETIME = datetime(2025, 7, 20, 10, 1, 45, tzinfo=timezone.utc)
+ES_INDEX = 'diff-20250720'
+# the real one, which the fake_es fixture replaces
+ES_CREATE_DIFF_INDEX_FOR_DATETIME = VrpDiff.__dict__['es_create_diff_index_for_datetime']
+
+
+@pytest.fixture
+def fake_es(monkeypatch) -> dict:
+    """
+    Replace the OpenSearch client and streaming_bulk().  The returned dict collects the actions and chunk sizes
+    streaming_bulk() was given, and how many diff batches had been read before its first chunk was sent.
+    """
+    calls = {'actions': [], 'batches_read': [], 'chunk_size': []}
+    iter_batches = VrpDiffReader.iter_batches
+
+    def counting_iter_batches(self, batch_size=None):
+        calls['batches_read'].append(0)
+        for batch in iter_batches(self, batch_size):
+            calls['batches_read'][-1] += 1
+            yield batch
+
+    def streaming_bulk(client, actions, chunk_size, **kwargs):
+        calls['chunk_size'].append(chunk_size)
+        for action in actions:
+            if not calls['actions']:
+                calls['first_chunk_batches_read'] = calls['batches_read'][-1]
+            calls['actions'].append(action)
+            yield True, {'index': {'_id': action['_id'], 'status': 201}}
+
+    # tqdm starts a monitor thread even for a disabled bar, after which later tests which fork get warnings
+    monkeypatch.setattr(tqdm, 'monitor_interval', 0)
+    monkeypatch.setattr(VrpDiffReader, 'iter_batches', counting_iter_batches)
+    monkeypatch.setattr(opensearchpy.helpers, 'streaming_bulk', streaming_bulk)
+    monkeypatch.setattr(VrpDiff, 'get_es_client', classmethod(lambda cls, **kwargs: object()))
+    # don't let one test's clients be cached for another's
+    monkeypatch.setattr(VrpDiff, '_es_clients', {})
+    monkeypatch.setattr(VrpDiff, '_es_known_indices', weakref.WeakKeyDictionary())
+    monkeypatch.setattr(VrpDiff, 'es_create_diff_index_for_datetime', classmethod(lambda cls, **kwargs: ES_INDEX))
+    return calls
+
+
+@pytest.mark.parametrize('diff_format', list(DiffFormat))
+def test_import_streams_bulk_actions(tmp_path, fake_es, diff_objs, write_diff_file, diff_format):
+    diff_path = write_diff_file(tmp_path / F'20250720T100145Z.vrpdiff.{diff_format}', diff_objs(1000),
+                                {'diff_count': 1000})
+    result = VrpDiff.generic_entry_point_import(es_endpoint='https://localhost', src_local_path=diff_path,
+                                                es_bulk_batch_size=100)
+    assert result['records_inserted'] == 1000
+    assert fake_es['chunk_size'] == [100]
+    # the first action was made from the first batch, before the rest of the file was read
+    assert fake_es['first_chunk_batches_read'] == 1
+    assert fake_es['batches_read'] == [10]
+    expected = [
+        diff.es_bulk_insertable_dict(es_index=ES_INDEX, diff_datetime=DIFF_DATETIME)
+        for diff in diff_objs(1000)
+    ]
+    assert json.dumps(fake_es['actions']) == json.dumps(expected)
+
+
+def test_import_raises_on_failed_action(tmp_path, fake_es, diff_objs, write_diff_file, monkeypatch):
+    def failing_streaming_bulk(client, actions, chunk_size, **kwargs):
+        for action in actions:
+            yield False, {'index': {'_id': action['_id'], 'status': 400}}
+
+    closed = []
+    close = VrpDiffReader.close
+
+    def tracking_close(self):
+        closed.append(self)
+        close(self)
+
+    monkeypatch.setattr(opensearchpy.helpers, 'streaming_bulk', failing_streaming_bulk)
+    monkeypatch.setattr(VrpDiffReader, 'close', tracking_close)
+    diff_path = write_diff_file(tmp_path / '20250720T100145Z.vrpdiff.json', diff_objs(10), {'diff_count': 10})
+    with pytest.raises(ValueError, match='unsuccessful'):
+        VrpDiff.generic_entry_point_import(es_endpoint='https://localhost', src_local_path=diff_path)
+    # the reader isn't left open by the failed import
+    assert len(closed) == 1
+
+
+def test_import_bulk_workers(tmp_path, fake_es, diff_objs, write_diff_file, monkeypatch):
+    in_flight = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+    fake_streaming_bulk = opensearchpy.helpers.streaming_bulk
+
+    def slow_streaming_bulk(client, actions, chunk_size, **kwargs):
+        with lock:
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        time.sleep(0.01)
+        with lock:
+            results = list(fake_streaming_bulk(client, actions, chunk_size, **kwargs))
+            in_flight['now'] -= 1
+        yield from results
+
+    monkeypatch.setattr(opensearchpy.helpers, 'streaming_bulk', slow_streaming_bulk)
+    diff_path = write_diff_file(tmp_path / '20250720T100145Z.vrpdiff.ndjson', diff_objs(1000), {'diff_count': 1000})
+    result = VrpDiff.generic_entry_point_import(es_endpoint='https://localhost', src_local_path=diff_path,
+                                                es_bulk_batch_size=100, bulk_workers=4)
+    assert result['records_inserted'] == 1000
+    assert result['records_per_second'] > 0
+    assert fake_es['chunk_size'] == [100] * 10
+    assert 1 < in_flight['max'] <= 4
+    assert sorted(action['_id'] for action in fake_es['actions']) == sorted(
+        diff.es_id(diff_datetime=DIFF_DATETIME) for diff in diff_objs(1000)
+    )
+
+
+class FakeIndices():
+    """
+    Stand-in for OpenSearch.indices, holding each index's flat settings.
+    """
+    def __init__(self):
+        self.created = []
+        self.settings = {}
+        self.calls = []
+
+    def create(self, index, body, ignore):
+        self.created.append(index)
+        self.settings.setdefault(index, {})
+
+    def forcemerge(self, index, max_num_segments):
+        self.calls.append(('forcemerge', index, max_num_segments))
+
+    def get_settings(self, index, flat_settings):
+        assert flat_settings
+        return {index: {'settings': dict(self.settings[index])}}
+
+    def put_settings(self, index, body):
+        self.calls.append(('put_settings', index))
+        for name, value in body.items():
+            if value is None:
+                self.settings[index].pop(name, None)
+            else:
+                self.settings[index][name] = value
+
+    def refresh(self, index):
+        self.calls.append(('refresh', index))
+
+
+class FakeClient():
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.indices = FakeIndices()
+
+
+def test_import_reuses_client(tmp_path, fake_es, diff_objs, write_diff_file, monkeypatch):
+    clients = []
+
+    def get_es_client(cls, **kwargs):
+        clients.append(FakeClient(**kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(VrpDiff, 'get_es_client', classmethod(get_es_client))
+    monkeypatch.setattr(VrpDiff, 'es_create_diff_index_for_datetime', ES_CREATE_DIFF_INDEX_FOR_DATETIME)
+    diff_path = write_diff_file(tmp_path / '20250720T100145Z.vrpdiff.ndjson', diff_objs(10), {'diff_count': 10})
+    for datestr in ('20250720T100145Z', '20250721T100145Z', '20250801T000000Z'):
+        path = diff_path.with_name(diff_path.name.replace(diff_path.name[:16], datestr))
+        if path != diff_path:
+            path.write_bytes(diff_path.read_bytes())
+        for bulk_workers in (1, 1, 4):
+            VrpDiff.generic_entry_point_import(es_endpoint='https://localhost', src_local_path=path,
+                                               bulk_workers=bulk_workers)
+    # one client for each pool size, which creates each month's index once
+    assert [client.kwargs['pool_maxsize'] for client in clients] == [None, 4]
+    assert [client.indices.created for client in clients] == [['diff-202507', 'diff-202508']] * 2
+
+
+def test_parallel_bulk_preserves_order(monkeypatch):
+    def shuffled_streaming_bulk(client, actions, chunk_size, **kwargs):
+        # later chunks finish first
+        time.sleep(0.001 * (1000 - actions[0]) / 100)
+        return [(True, {'index': {'_id': action}}) for action in actions]
+
+    monkeypatch.setattr(opensearchpy.helpers, 'streaming_bulk', shuffled_streaming_bulk)
+    results = VrpDiff._es_parallel_bulk(es_client=None, actions=range(1000), chunk_size=10, workers=4)
+    assert [result['index']['_id'] for _, result in results] == list(range(1000))
+
+
+def test_parallel_bulk_fails_fast(monkeypatch):
+    submitted = []
+
+    def failing_streaming_bulk(client, actions, chunk_size, **kwargs):
+        submitted.append(actions[0])
+        if actions[0] == 30:
+            raise opensearchpy.helpers.BulkIndexError('1 document(s) failed to index.', [{'index': {}}])
+        return [(True, {'index': {'_id': action}}) for action in actions]
+
+    monkeypatch.setattr(opensearchpy.helpers, 'streaming_bulk', failing_streaming_bulk)
+    results = VrpDiff._es_parallel_bulk(es_client=None, actions=range(1000), chunk_size=10, workers=3)
+    with pytest.raises(opensearchpy.helpers.BulkIndexError):
+        for ok, result in results:
+            assert ok
+    # the chunks after the failed one which were in flight, but no more
+    assert max(submitted) <= 30 + 3 * 10
+
+
+def old_path_actions(json_objs: list[dict]) -> list[dict]:
+    return [
+        diff.es_bulk_insertable_dict(es_index=ES_INDEX, diff_datetime=DIFF_DATETIME)
+        for diff in VrpDiff.batch_from_json_obj(json_objs)
+    ]
+
+
+def test_bulk_insertable_dicts_from_json_obj():
+    roa = {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1742048251}
+    json_objs = [
+        {'verb': 'NEW', 'new_roa': roa},
+        {'verb': 'DELETE', 'old_roa': dict(roa, prefix='2001:DB8::1/32', maxLength=48)},
+        {'verb': 'REPLACE', 'old_roa': roa, 'new_roa': dict(roa, expires=1742134651)},
+        {'verb': 'UNCHANGED', 'old_roa': roa, 'new_roa': dict(roa, asn='AS64496', prefix='192.0.2.77/24')},
+        # no expires, host bits set, empty old_roa
+        {'verb': 'NEW', 'old_roa': {}, 'new_roa': {'asn': 'AS0', 'prefix': '10.1.2.3/8', 'maxLength': 8, 'ta': 'x'}},
+    ]
+    actions = VrpDiff.es_bulk_insertable_dicts_from_json_obj(json_objs, es_index=ES_INDEX, diff_datetime=DIFF_DATETIME)
+    assert json.dumps(actions) == json.dumps(old_path_actions(json_objs))
+    assert [action['_source']['verb'] for action in actions] == [j['verb'] for j in json_objs]
+
+
+@pytest.mark.parametrize('bad_field, bad_value, exception', [
+    ('prefix', '192.0.2.0/33', ValueError),
+    ('maxLength', 16, ValueError),
+    ('asn', 'ASN64496', ValueError),
+    ('asn', 2 ** 32, ValueError),
+    ('expires', -1, ValueError),
+    ('ta', 1, TypeError),
+])
+def test_bulk_insertable_dicts_invalid(bad_field, bad_value, exception):
+    roa = {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000}
+    json_objs = [{'new_roa': roa}, {'old_roa': roa, 'new_roa': dict(roa, **{bad_field: bad_value})}]
+    with pytest.raises(exception):
+        old_path_actions(json_objs)
+    with pytest.raises(exception):
+        VrpDiff.es_bulk_insertable_dicts_from_json_obj(json_objs, es_index=ES_INDEX, diff_datetime=DIFF_DATETIME)
+
+
+@pytest.mark.slow
+def test_bulk_insertable_dicts_golden():
+    with VrpDiffReader.new_from_path(TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2') as reader:
+        for batch in reader.iter_batches(1000):
+            actions = VrpDiff.es_bulk_insertable_dicts_from_json_obj(
+                batch,
+                es_index=ES_INDEX,
+                diff_datetime=DIFF_DATETIME,
+            )
+            assert json.dumps(actions) == json.dumps(old_path_actions(batch))
+
+
+def month_jobs(tmp_path: Path) -> list[tuple[datetime, str, dict]]:
+    """
+    Import jobs for three files in each of two months, in ascending order.  The fake import below logs to tmp_path.
+    """
+    retlist = []
+    for month in (6, 7):
+        for day in (1, 2, 3):
+            dt = datetime(2025, month, day, tzinfo=timezone.utc)
+            name = F'{dt:%Y%m%dT%H%M%SZ}.vrpdiff.ndjson.bz2'
+            retlist.append((dt, name, {'src_local_path': tmp_path / name}))
+    return retlist
+
+
+def fake_import(cls, src_local_path: Path, **kwargs) -> dict:
+    log_path = src_local_path.parent / 'imports.log'
+    with open(log_path, 'a') as fh:
+        fh.write(F'start {src_local_path.name} {os.getpid()}\n')
+    time.sleep(0.05)
+    if 'fail' in kwargs:
+        raise ValueError(F'failed to import {src_local_path.name}')
+    with open(log_path, 'a') as fh:
+        fh.write(F'end {src_local_path.name} {os.getpid()}\n')
+    return {'records_inserted': 1}
+
+
+# the process pool pickles VrpDiff.generic_entry_point_import by name
+fake_import.__name__ = 'generic_entry_point_import'
+
+
+def import_log(tmp_path: Path) -> list[list[str]]:
+    return [line.split() for line in (tmp_path / 'imports.log').read_text().splitlines()]
+
+
+@pytest.mark.parametrize('month_order', [False, True])
+def test_import_files_concurrently(tmp_path, monkeypatch, month_order):
+    monkeypatch.setattr(VrpDiff, 'generic_entry_point_import', classmethod(fake_import))
+    jobs = month_jobs(tmp_path)
+    assert VrpDiff._import_files(import_jobs=jobs, file_workers=3, month_order=month_order) == 6
+    log = import_log(tmp_path)
+    assert sorted(name for event, name, pid in log if event == 'end') == sorted(name for _, name, _ in jobs)
+    assert len({pid for event, name, pid in log}) > 1
+    if month_order:
+        # no July file is started until every June file has finished
+        first_july_start = min(i for i, (event, name, pid) in enumerate(log) if event == 'start' and '202507' in name)
+        last_june_end = max(i for i, (event, name, pid) in enumerate(log) if event == 'end' and '202506' in name)
+        assert last_june_end < first_july_start
+
+
+def test_import_files_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(VrpDiff, 'generic_entry_point_import', classmethod(fake_import))
+    jobs = month_jobs(tmp_path)
+    jobs[1][2]['fail'] = True
+    with pytest.raises(ValueError, match=jobs[1][1]):
+        VrpDiff._import_files(import_jobs=jobs, file_workers=2, month_order=True)
+    # the failure stopped the import before July
+    assert not any('202507' in name for event, name, pid in import_log(tmp_path))
+
+
+@pytest.mark.parametrize('log_level, logged_count', [(logging.INFO, 2), (logging.WARNING, 0)])
+def test_import_files_worker_logging(tmp_path, diff_objs, write_diff_file, monkeypatch, capfd, log_level,
+                                     logged_count):
+    # spawned workers, like forkserver ones, inherit nothing from this process but its file descriptors
+    monkeypatch.setattr(vrp_diff, 'ProcessPoolExecutor',
+                        functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn')))
+    monkeypatch.setattr(vrp_diff.logger, 'level', log_level)
+    jobs = []
+    for day in (1, 2):
+        dt = datetime(2025, 6, day, tzinfo=timezone.utc)
+        path = write_diff_file(tmp_path / F'{dt:%Y%m%dT%H%M%SZ}.vrpdiff.ndjson', diff_objs(10), {'diff_count': 10})
+        jobs.append((dt, path.name, {'es_endpoint': None, 'src_local_path': path, 'dry_run': True}))
+    assert VrpDiff._import_files(import_jobs=jobs, file_workers=2) == 2
+    # the workers log at the level this process was given, e.g. by --log-level
+    assert capfd.readouterr().err.count('records_would_insert 10') == logged_count
+
+
+def test_cli_import_from_disk(tmp_path, monkeypatch):
+    imported = []
+    monkeypatch.setattr(VrpDiff, '_import_files', classmethod(lambda cls, **kwargs: imported.append(kwargs)))
+    for _, name, _ in month_jobs(tmp_path):
+        (tmp_path / name).touch()
+    monkeypatch.setattr(sys, 'argv', [
+        'rpkilog-diff-import', '--es-endpoint', 'https://localhost',
+        '--import-from-disk', str(tmp_path / '*.vrpdiff.*'),
+        '--all-date-min', '2025-06-02', '--all-limit', '3', '--file-workers', '2', '--month-order', '--sort-ascending',
+    ])
+    VrpDiff.cli_entry_point_import()
+    assert [name for _, name, _ in imported[0]['import_jobs']] == [
+        str(tmp_path / name) for name in (
+            '20250602T000000Z.vrpdiff.ndjson.bz2',
+            '20250603T000000Z.vrpdiff.ndjson.bz2',
+            '20250701T000000Z.vrpdiff.ndjson.bz2',
+        )
+    ]
+    assert imported[0]['file_workers'] == 2
+    assert imported[0]['month_order'] is True
+    assert imported[0]['import_jobs'][0][2]['progress_bar_enable'] is False
+
+
+BACKFILL_DATETIMES = [datetime(2025, 7, 20, tzinfo=timezone.utc), datetime(2025, 7, 21, tzinfo=timezone.utc),
+                      datetime(2025, 8, 1, tzinfo=timezone.utc)]
+
+
+def test_backfill_mode():
+    es_client = FakeClient()
+    es_client.indices.settings['diff-202507'] = {'index.refresh_interval': '30s', 'index.number_of_shards': '3'}
+    with VrpDiff.es_backfill_mode(es_client, BACKFILL_DATETIMES, force_merge_segments=1) as index_names:
+        assert index_names == ['diff-202507', 'diff-202508']
+        for index_name in index_names:
+            assert es_client.indices.settings[index_name]['index.refresh_interval'] == '-1'
+            assert es_client.indices.settings[index_name]['index.translog.durability'] == 'async'
+        assert not [call for call in es_client.indices.calls if call[0] != 'put_settings']
+    assert es_client.indices.settings == {
+        'diff-202507': {'index.refresh_interval': '30s', 'index.number_of_shards': '3'},
+        'diff-202508': {},
+    }
+    assert [call for call in es_client.indices.calls if call[0] != 'put_settings'] == [
+        ('refresh', 'diff-202507'),
+        ('refresh', 'diff-202508'),
+        ('forcemerge', 'diff-202507', 1),
+        ('forcemerge', 'diff-202508', 1),
+    ]
+
+
+def test_backfill_mode_interrupted():
+    es_client = FakeClient()
+    with pytest.raises(KeyboardInterrupt):
+        with VrpDiff.es_backfill_mode(es_client, BACKFILL_DATETIMES, force_merge_segments=1):
+            raise KeyboardInterrupt
+    assert es_client.indices.settings == {'diff-202507': {}, 'diff-202508': {}}
+    # refreshed, but not force-merged
+    assert [call for call in es_client.indices.calls if call[0] != 'put_settings'] == [
+        ('refresh', 'diff-202507'),
+        ('refresh', 'diff-202508'),
+    ]
+
+
+@pytest.mark.parametrize('interrupted', [False, True])
+def test_backfill_mode_restore_failure(monkeypatch, interrupted):
+    es_client = FakeClient()
+    put_settings = es_client.indices.put_settings
+
+    def failing_put_settings(index, body):
+        # applying the backfill settings works, restoring the first index doesn't
+        if index == 'diff-202507' and body != VrpDiff.es_backfill_settings:
+            raise ConnectionError('restore failed')
+        put_settings(index=index, body=body)
+    monkeypatch.setattr(es_client.indices, 'put_settings', failing_put_settings)
+    expected_exception = KeyboardInterrupt if interrupted else ConnectionError
+    with pytest.raises(expected_exception):
+        with VrpDiff.es_backfill_mode(es_client, BACKFILL_DATETIMES, force_merge_segments=1):
+            if interrupted:
+                raise KeyboardInterrupt
+    # the other index is still restored and refreshed, and nothing is force-merged
+    assert es_client.indices.settings['diff-202508'] == {}
+    assert es_client.indices.calls == [
+        ('put_settings', 'diff-202507'),
+        ('put_settings', 'diff-202508'),
+        ('put_settings', 'diff-202508'),
+        ('refresh', 'diff-202508'),
+    ]
+
+
+def test_backfill_mode_restore_failure_in_except_handler(monkeypatch):
+    es_client = FakeClient()
+    put_settings = es_client.indices.put_settings
+
+    def failing_put_settings(index, body):
+        if body != VrpDiff.es_backfill_settings:
+            raise ConnectionError('restore failed')
+        put_settings(index=index, body=body)
+    monkeypatch.setattr(es_client.indices, 'put_settings', failing_put_settings)
+    # an exception being handled by the caller isn't mistaken for one raised by the block
+    try:
+        raise ValueError('handled by the caller')
+    except ValueError:
+        with pytest.raises(ConnectionError):
+            with VrpDiff.es_backfill_mode(es_client, BACKFILL_DATETIMES):
+                pass
+
+
+def test_cli_backfill_mode(tmp_path, monkeypatch):
+    es_client = FakeClient()
+    settings_during_import = []
+    monkeypatch.setattr(VrpDiff, 'get_es_client', classmethod(lambda cls, **kwargs: es_client))
+    monkeypatch.setattr(VrpDiff, '_import_files', classmethod(
+        lambda cls, **kwargs: settings_during_import.append(dict(es_client.indices.settings['diff-202506']))
+    ))
+    for _, name, _ in month_jobs(tmp_path):
+        (tmp_path / name).touch()
+    monkeypatch.setattr(sys, 'argv', [
+        'rpkilog-diff-import', '--es-endpoint', 'https://localhost', '--backfill-mode',
+        '--import-from-disk', str(tmp_path / '*.vrpdiff.*'), '--all-date-max', '2025-06-30',
+    ])
+    VrpDiff.cli_entry_point_import()
+    assert settings_during_import == [VrpDiff.es_backfill_settings]
+    assert es_client.indices.created == ['diff-202506']
+    assert es_client.indices.settings == {'diff-202506': {}}
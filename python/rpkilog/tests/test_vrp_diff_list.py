@@ -1,7 +1,8 @@
 """
 Tests for vrp_diff_list() and its wrapper (for e2e tests) vrp_diff_from_files()
 
-There are synthetic tests calling vrp_diff_list() using only data in this file.
+There are synthetic tests calling vrp_diff_list() using only data in this file.  Each test runs against every
+DiffEngine via vrp_diff_roas(); the engines must agree exactly, including output order.
 
 We also perform a vrp_diff_from_files() using the following golden test data files (slow):
   * old snapshot file rpkiclient_summary_20250720T093135Z.json.bz2
@@ -10,13 +11,20 @@ We also perform a vrp_diff_from_files() using the following golden test data fil
 """
 import bz2
 import copy
+from datetime import datetime, timezone
 import json
+import random
 import tempfile
 import time
 from pathlib import Path
 
 import pytest
 
+from rpkilog import external_sort, vrp_diff
+from rpkilog.diff_engine import DiffEngine
+from rpkilog.roa import Roa
+from rpkilog.roa_table import RoaTable
+from rpkilog.summary_reader import SummaryReader
 from rpkilog.vrp_diff import VrpDiff
 
 TEST_DATA_DIR = Path(__file__).parent.parent.parent.parent / 'test_data'
@@ -28,17 +36,24 @@ BASE_ROAS = [
 ]
 
 
-def test_identical_lists_return_empty():
-    result = VrpDiff.vrp_diff_list(
+@pytest.fixture(params=list(DiffEngine))
+def diff_engine(request) -> DiffEngine:
+    return request.param
+
+
+def test_identical_lists_return_empty(diff_engine):
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS),
         new_roas=copy.deepcopy(BASE_ROAS),
     )
     assert result == []
 
 
-def test_old_only_roa_emits_delete():
+def test_old_only_roa_emits_delete(diff_engine):
     delete_roa = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
-    result = VrpDiff.vrp_diff_list(
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS) + [delete_roa],
         new_roas=copy.deepcopy(BASE_ROAS),
     )
@@ -46,9 +61,10 @@ def test_old_only_roa_emits_delete():
     assert result[0].verb == 'DELETE'
 
 
-def test_new_only_roa_emits_new():
+def test_new_only_roa_emits_new(diff_engine):
     new_roa = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
-    result = VrpDiff.vrp_diff_list(
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS),
         new_roas=copy.deepcopy(BASE_ROAS) + [new_roa],
     )
@@ -56,10 +72,11 @@ def test_new_only_roa_emits_new():
     assert result[0].verb == 'NEW'
 
 
-def test_same_primary_key_different_expires_emits_replace():
+def test_same_primary_key_different_expires_emits_replace(diff_engine):
     old_roa = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
     new_roa = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 2000000000}
-    result = VrpDiff.vrp_diff_list(
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS) + [old_roa],
         new_roas=copy.deepcopy(BASE_ROAS) + [new_roa],
     )
@@ -67,10 +84,11 @@ def test_same_primary_key_different_expires_emits_replace():
     assert result[0].verb == 'REPLACE'
 
 
-def test_different_primary_keys_emits_delete_and_new():
+def test_different_primary_keys_emits_delete_and_new(diff_engine):
     old_extra = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
     new_extra = {'asn': 64498, 'prefix': '203.0.113.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
-    result = VrpDiff.vrp_diff_list(
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS) + [old_extra],
         new_roas=copy.deepcopy(BASE_ROAS) + [new_extra],
     )
@@ -85,12 +103,13 @@ def test_different_primary_keys_emits_delete_and_new():
     assert count_new == 1
 
 
-def test_mixed_batch_all_verbs():
+def test_mixed_batch_all_verbs(diff_engine):
     delete_roa = {'asn': 64497, 'prefix': '198.51.100.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
     new_roa = {'asn': 64498, 'prefix': '203.0.113.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
     replace_old = {'asn': 64499, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000}
     replace_new = {'asn': 64499, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 2000000000}
-    result = VrpDiff.vrp_diff_list(
+    result = VrpDiff.vrp_diff_roas(
+        diff_engine=diff_engine,
         old_roas=copy.deepcopy(BASE_ROAS) + [delete_roa, replace_old],
         new_roas=copy.deepcopy(BASE_ROAS) + [new_roa, replace_new],
     )
@@ -108,8 +127,257 @@ def test_mixed_batch_all_verbs():
     assert count_replace == 1
 
 
+def test_batch_from_json_obj(random_roas):
+    old_roas = random_roas(random.Random(0), 100)
+    new_roas = random_roas(random.Random(1), 100)
+    diff_objs = VrpDiff.vrp_diff_list(old_roas=old_roas, new_roas=new_roas)
+    json_objs = [json.loads(d.as_json_str()) for d in diff_objs]
+    batch = VrpDiff.batch_from_json_obj(json_objs)
+    assert [d.as_json_str() for d in batch] == [VrpDiff.from_json_obj(j).as_json_str() for j in json_objs]
+    assert [d.verb for d in batch] == [d.verb for d in diff_objs]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_engines_agree(diff_engine, seed, random_roas):
+    rng = random.Random(seed)
+    old_roas = random_roas(rng, rng.randrange(200))
+    new_roas = random_roas(rng, rng.randrange(200))
+    reference = VrpDiff.vrp_diff_list(old_roas=copy.deepcopy(old_roas), new_roas=copy.deepcopy(new_roas))
+    result = VrpDiff.vrp_diff_roas(old_roas=old_roas, new_roas=new_roas, diff_engine=diff_engine)
+    assert [d.as_json_str() for d in result] == [d.as_json_str() for d in reference]
+
+
+def test_engine_iter_is_lazy(diff_engine, random_roas):
+    old_roas = random_roas(random.Random(2), 100)
+    new_roas = random_roas(random.Random(3), 100)
+    diffs = VrpDiff.vrp_diff_roas_iter(old_roas=old_roas, new_roas=new_roas, diff_engine=diff_engine)
+    first_diff = next(diffs)
+    reference = VrpDiff.vrp_diff_list(old_roas=old_roas, new_roas=new_roas)
+    assert [d.as_json_str() for d in [first_diff, *diffs]] == [d.as_json_str() for d in reference]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_parallel_matches_serial(diff_engine, seed, random_roas, monkeypatch):
+    # many small partitions, so that some are empty on one side and duplicate primary keys straddle the bounds
+    monkeypatch.setattr(VrpDiff, 'parallel_partitions_per_worker', 8)
+    rng = random.Random(seed)
+    old_roas = random_roas(rng, rng.randrange(1, 300))
+    new_roas = random_roas(rng, rng.randrange(1, 300))
+    reference = VrpDiff.vrp_diff_list(old_roas=copy.deepcopy(old_roas), new_roas=copy.deepcopy(new_roas))
+    result = VrpDiff.vrp_diff_parallel_iter(
+        old_table=RoaTable.new_from_rpkiclient_json({'roas': old_roas}),
+        new_table=RoaTable.new_from_rpkiclient_json({'roas': new_roas}),
+        diff_engine=diff_engine,
+        workers=2,
+    )
+    assert [d.as_json_str() for d in result] == [d.as_json_str() for d in reference]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sorted_iter_matches_list(seed, random_roas):
+    rng = random.Random(seed)
+    old_roas = random_roas(rng, rng.randrange(200))
+    new_roas = random_roas(rng, rng.randrange(200))
+    reference = VrpDiff.vrp_diff_list(old_roas=copy.deepcopy(old_roas), new_roas=copy.deepcopy(new_roas))
+    result = VrpDiff.vrp_diff_sorted_iter(
+        old_roas=sorted(Roa.batch_from_rpkiclient(old_roas), key=Roa.sortable),
+        new_roas=sorted(Roa.batch_from_rpkiclient(new_roas), key=Roa.sortable),
+    )
+    assert [d.as_json_str() for d in result] == [d.as_json_str() for d in reference]
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_external_sort_matches_in_memory(tmp_path, random_roas, monkeypatch, streaming):
+    # several runs per snapshot
+    monkeypatch.setattr(external_sort, 'MIN_RUN_ROWS', 40)
+    monkeypatch.setattr(SummaryReader, 'batch_size', 16)
+    # and several chunks per run during the merge
+    monkeypatch.setattr(external_sort.SortedRuns, 'merge_chunk_rows', 7)
+    run_tmp_dir = tmp_path / 'runs'
+    run_tmp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(run_tmp_dir))
+    rng = random.Random(6)
+    summary_paths = []
+    for hour in range(3):
+        summary_path = tmp_path / F'20250720T{hour:02d}0000Z.json'
+        with open(summary_path, 'w') as fh:
+            json.dump({'metadata': {'hour': hour}, 'roas': random_roas(rng, 150)}, fh)
+        summary_paths.append(summary_path)
+    in_memory_path = tmp_path / 'in_memory.json'
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=summary_paths[0],
+        new_file_path=summary_paths[1],
+        output_file_path=in_memory_path,
+        realtime_initial=time.time(),
+    )
+    external_path = tmp_path / 'external.json'
+    result_metadata = VrpDiff.vrp_diff_from_files(
+        old_file_path=summary_paths[0],
+        new_file_path=summary_paths[1],
+        output_file_path=external_path,
+        realtime_initial=time.time(),
+        diff_engine=DiffEngine.VECTORIZED,
+        streaming=streaming,
+        workers=2,
+        max_memory_mb=0,
+    )
+    assert result_metadata['max_memory_mb'] == 0
+    assert result_metadata['diff_engine'] == DiffEngine.MERGE
+    with open(in_memory_path) as fh:
+        in_memory_data = json.load(fh)
+    with open(external_path) as fh:
+        external_data = json.load(fh)
+    assert external_data['vrp_diffs'] == in_memory_data['vrp_diffs']
+    # the runs are removed as soon as the diff is written
+    assert list(run_tmp_dir.iterdir()) == []
+
+    (tmp_path / 'chain').mkdir()
+    steps = list(VrpDiff.vrp_diff_chain_from_files(
+        file_paths=summary_paths,
+        output_dir=tmp_path / 'chain',
+        streaming=streaming,
+        max_memory_mb=0,
+    ))
+    with bz2.open(steps[0][2], 'rt') as fh:
+        assert json.load(fh)['vrp_diffs'] == in_memory_data['vrp_diffs']
+    assert len(steps) == 2
+    assert list(run_tmp_dir.iterdir()) == []
+
+
+def test_external_sort_runs_removed_on_failure(tmp_path, random_roas, monkeypatch):
+    run_tmp_dir = tmp_path / 'runs'
+    run_tmp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(run_tmp_dir))
+    rng = random.Random(7)
+    summary_paths = []
+    for hour in range(2):
+        summary_path = tmp_path / F'20250720T{hour:02d}0000Z.json'
+        with open(summary_path, 'w') as fh:
+            json.dump({'metadata': {'hour': hour}, 'roas': random_roas(rng, 50)}, fh)
+        summary_paths.append(summary_path)
+
+    def failing_diff(*args, **kwargs):
+        raise RuntimeError('diff failed')
+    monkeypatch.setattr(VrpDiff, 'vrp_diff_sorted_iter', failing_diff)
+    # excinfo's traceback keeps the runs referenced, so only an explicit cleanup removes them
+    with pytest.raises(RuntimeError, match='diff failed') as excinfo:
+        VrpDiff.vrp_diff_from_files(
+            old_file_path=summary_paths[0],
+            new_file_path=summary_paths[1],
+            output_file_path=tmp_path / 'output.json',
+            realtime_initial=time.time(),
+            max_memory_mb=0,
+        )
+    assert list(run_tmp_dir.iterdir()) == []
+    assert excinfo.traceback
+
+
+def test_partition_bounds_split_on_network(random_roas):
+    rng = random.Random(4)
+    old_table = RoaTable.new_from_rpkiclient_json({'roas': random_roas(rng, 150)}).sorted()
+    new_table = RoaTable.new_from_rpkiclient_json({'roas': random_roas(rng, 50)}).sorted()
+    bounds = VrpDiff._partition_bounds(old_table, new_table, partitions=6)
+    assert bounds[0][0] == 0 and bounds[0][2] == 0
+    assert bounds[-1][1] == len(old_table) and bounds[-1][3] == len(new_table)
+    for (_, old_stop, _, new_stop), (old_start, _, new_start, _) in zip(bounds, bounds[1:]):
+        assert (old_stop, new_stop) == (old_start, new_start)
+        # no network address appears on both sides of a bound
+        for table, bound in ((old_table, old_start), (new_table, new_start)):
+            if 0 < bound < len(table):
+                assert table[bound - 1].prefix != table[bound].prefix
+
+
+def test_chain_matches_pairwise(diff_engine, tmp_path, random_roas, monkeypatch):
+    rng = random.Random(5)
+    summary_paths = []
+    for hour in range(4):
+        summary_path = tmp_path / F'20250720T{hour:02d}0000Z.json'
+        with open(summary_path, 'w') as fh:
+            json.dump({'metadata': {'hour': hour}, 'roas': random_roas(rng, 100)}, fh)
+        summary_paths.append(summary_path)
+    (tmp_path / 'pairwise').mkdir()
+    for old_path, new_path in zip(summary_paths, summary_paths[1:]):
+        VrpDiff.vrp_diff_from_files(
+            old_file_path=old_path,
+            new_file_path=new_path,
+            output_file_path=tmp_path / 'pairwise' / VrpDiff.get_diff_filename_from_summary_filename(new_path.name),
+            realtime_initial=time.time(),
+            diff_engine=diff_engine,
+        )
+
+    loaded_paths = []
+    for loader in ('roa_table_from_file', 'roa_columns_from_file'):
+        original = getattr(VrpDiff, loader)
+        monkeypatch.setattr(
+            VrpDiff,
+            loader,
+            lambda path, loader=original, **kwargs: loaded_paths.append(path) or loader(path, **kwargs),
+        )
+    (tmp_path / 'chain').mkdir()
+    steps = list(VrpDiff.vrp_diff_chain_from_files(
+        file_paths=summary_paths,
+        output_dir=tmp_path / 'chain',
+        diff_engine=diff_engine,
+    ))
+    assert loaded_paths == summary_paths
+    assert [step[:2] for step in steps] == list(zip(summary_paths, summary_paths[1:]))
+    for _, _, output_path, result_metadata in steps:
+        with bz2.open(output_path, 'rt') as fh:
+            chain_data = json.load(fh)
+        with bz2.open(tmp_path / 'pairwise' / output_path.name, 'rt') as fh:
+            pairwise_data = json.load(fh)
+        assert chain_data['metadata'] == result_metadata
+        assert chain_data['metadata']['vrp_cache_old'] == pairwise_data['metadata']['vrp_cache_old']
+        assert chain_data['vrp_diffs'] == pairwise_data['vrp_diffs']
+
+
+def test_chain_hash_join_sorts_only_changes(tmp_path, monkeypatch):
+    old_roas = [
+        {'asn': 64496, 'prefix': F'10.{i // 256}.{i % 256}.0/24', 'maxLength': 24, 'ta': 'arin', 'expires': 1000000000}
+        for i in range(300)
+    ]
+    new_roas = old_roas[1:] + [dict(old_roas[0], asn=64497)]
+    summary_paths = []
+    for hour, roas in enumerate([old_roas, new_roas]):
+        summary_paths.append(tmp_path / F'20250720T{hour:02d}0000Z.json')
+        with open(summary_paths[-1], 'w') as fh:
+            json.dump({'metadata': {'hour': hour}, 'roas': roas}, fh)
+    sortable_calls = []
+    original = Roa.sortable
+    monkeypatch.setattr(Roa, 'sortable', lambda roa: sortable_calls.append(roa) or original(roa))
+    steps = list(VrpDiff.vrp_diff_chain_from_files(
+        file_paths=summary_paths,
+        output_dir=tmp_path,
+        diff_engine=DiffEngine.HASH_JOIN,
+    ))
+    assert steps[0][3]['diff_count'] == 2
+    # neither snapshot is sorted, and the unchanged ROAs are matched without their sort keys
+    assert len(sortable_calls) < 10
+
+
+def test_s3_chain_keys_start_from_predecessor(monkeypatch):
+    class FakeBucket():
+        name = 'summaries'
+    subjects = []
+
+    def fake_previous(bucket, subject_datetime):
+        subjects.append(subject_datetime)
+        if subject_datetime.hour == 0:
+            raise KeyError('nothing older')
+        return '20250720T003000Z.json.bz2'
+    monkeypatch.setattr(vrp_diff, 'list_s3_object_previous', fake_previous)
+    summary_keys = ['20250720T010000Z.json.bz2', '20250720T020000Z.json.bz2']
+    # every one of summary_keys is diffed, the first against the summary before it
+    assert VrpDiff._s3_chain_keys(FakeBucket(), summary_keys) == ['20250720T003000Z.json.bz2'] + summary_keys
+    assert subjects == [datetime(2025, 7, 20, 1, 0, tzinfo=timezone.utc)]
+    # the oldest summary has no predecessor to be diffed against
+    assert VrpDiff._s3_chain_keys(FakeBucket(), ['20250720T000000Z.json.bz2']) == ['20250720T000000Z.json.bz2']
+    assert VrpDiff._s3_chain_keys(FakeBucket(), []) == []
+
+
 @pytest.mark.slow
-def test_vrp_diff_from_files_golden():
+@pytest.mark.parametrize('streaming', [False, True])
+def test_vrp_diff_from_files_golden(diff_engine, streaming):
     old_file = TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2'
     new_file = TEST_DATA_DIR / 'rpkiclient_summary_20250720T100145Z.json.bz2'
     golden_file = TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2'
@@ -125,6 +393,8 @@ def test_vrp_diff_from_files_golden():
             new_file_path=new_file,
             output_file_path=output_path,
             realtime_initial=time.time(),
+            diff_engine=diff_engine,
+            streaming=streaming,
         )
 
         assert result_metadata['diff_count'] == golden_diff_count
@@ -135,3 +405,43 @@ def test_vrp_diff_from_files_golden():
         for diff in output_data['vrp_diffs']:
             verb_counts[diff['verb']] += 1
         assert sum(verb_counts.values()) == result_metadata['diff_count']
+        assert output_data['metadata'] == result_metadata
+        assert output_data['vrp_diffs'] == golden_data['vrp_diffs']
+
+
+@pytest.mark.slow
+def test_vrp_diff_from_files_external_golden(tmp_path):
+    golden_file = TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2'
+    output_path = tmp_path / 'test_output.json'
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2',
+        new_file_path=TEST_DATA_DIR / 'rpkiclient_summary_20250720T100145Z.json.bz2',
+        output_file_path=output_path,
+        realtime_initial=time.time(),
+        streaming=True,
+        max_memory_mb=32,
+    )
+    with open(output_path) as f:
+        output_data = json.load(f)
+    with bz2.open(golden_file, 'rt') as f:
+        golden_data = json.load(f)
+    assert output_data['vrp_diffs'] == golden_data['vrp_diffs']
+
+
+@pytest.mark.slow
+def test_vrp_diff_from_files_parallel_golden(diff_engine, tmp_path):
+    golden_file = TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2'
+    output_path = tmp_path / 'test_output.json'
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=TEST_DATA_DIR / 'rpkiclient_summary_20250720T093135Z.json.bz2',
+        new_file_path=TEST_DATA_DIR / 'rpkiclient_summary_20250720T100145Z.json.bz2',
+        output_file_path=output_path,
+        realtime_initial=time.time(),
+        diff_engine=diff_engine,
+        workers=4,
+    )
+    with open(output_path) as f:
+        output_data = json.load(f)
+    with bz2.open(golden_file, 'rt') as f:
+        golden_data = json.load(f)
+    assert output_data['vrp_diffs'] == golden_data['vrp_diffs']
@@ -0,0 +1,92 @@
+"""
+Tests for VrpDiffReader, which streams diff files in either DiffFormat.
+"""
+import bz2
+import json
+from pathlib import Path
+
+import pytest
+
+from rpkilog.diff_format import DiffFormat
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_reader import VrpDiffReader
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+METADATA = {'diff_count': 500, 'vrp_cache_old': {'filename': 'old.json'}}
+
+
+@pytest.mark.parametrize('file_name', ['20250720T100145Z.vrpdiff.json', '20250720T100145Z.vrpdiff.ndjson.bz2'])
+@pytest.mark.parametrize('metadata_in_header', [True, False])
+def test_round_trip(tmp_path, diff_objs, write_diff_file, file_name, metadata_in_header):
+    diffs = diff_objs()
+    path = write_diff_file(tmp_path / file_name, diffs, METADATA, metadata_in_header=metadata_in_header)
+    with VrpDiffReader.new_from_path(path) as reader:
+        assert reader.diff_format == DiffFormat.for_path(path)
+        assert reader.metadata == (METADATA if metadata_in_header else None)
+        batches = list(reader.iter_batches(batch_size=64))
+        assert reader.metadata == METADATA
+    assert [len(batch) for batch in batches[:-1]] == [64] * (len(batches) - 1)
+    assert [diff for batch in batches for diff in batch] == [json.loads(d.as_json_str()) for d in diffs]
+
+
+@pytest.mark.parametrize('file_name', ['empty.vrpdiff.json', 'empty.vrpdiff.ndjson'])
+def test_empty(tmp_path, write_diff_file, file_name):
+    path = write_diff_file(tmp_path / file_name, [], METADATA, metadata_in_header=False)
+    with VrpDiffReader.new_from_path(path) as reader:
+        assert list(reader.iter_diffs()) == []
+        assert reader.metadata == METADATA
+
+
+def test_single_line_json_document(tmp_path, diff_objs):
+    diffs = diff_objs(3)
+    document = {'object_type': 'rpkilog_vrp_cache_diff_set', 'metadata': METADATA,
+                'vrp_diffs': [json.loads(d.as_json_str()) for d in diffs]}
+    (tmp_path / 'diff.json').write_text(json.dumps(document))
+    with VrpDiffReader.new_from_path(tmp_path / 'diff.json') as reader:
+        assert reader.diff_format == DiffFormat.JSON
+        assert list(reader.iter_diffs()) == document['vrp_diffs']
+
+
+def test_golden_diff_file():
+    golden_file = TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2'
+    with bz2.open(golden_file) as fh:
+        golden_data = json.load(fh)
+    with VrpDiffReader.new_from_path(golden_file) as reader:
+        assert reader.metadata == golden_data['metadata']
+        assert list(reader.iter_diffs()) == golden_data['vrp_diffs']
+
+
+def test_diffs_iterated_once(tmp_path, diff_objs, write_diff_file):
+    path = write_diff_file(tmp_path / 'diff.vrpdiff.ndjson', diff_objs(3), METADATA)
+    with VrpDiffReader.new_from_path(path) as reader:
+        list(reader.iter_diffs())
+        with pytest.raises(RuntimeError):
+            list(reader.iter_diffs())
+
+
+@pytest.mark.parametrize('diff_format', list(DiffFormat))
+def test_vrp_diff_from_files_ndjson(tmp_path, diff_format):
+    roas = [
+        {'asn': 64496, 'prefix': '192.0.2.0/24', 'maxLength': 24, 'ta': 'test', 'expires': 1000000000},
+        {'asn': 64497, 'prefix': '2001:db8::/32', 'maxLength': 48, 'ta': 'test', 'expires': 2000000000},
+    ]
+    with open(tmp_path / '20250720T093135Z.json', 'w') as fh:
+        json.dump({'metadata': {}, 'roas': roas}, fh)
+    with open(tmp_path / '20250720T100145Z.json', 'w') as fh:
+        json.dump({'metadata': {}, 'roas': roas[1:]}, fh)
+    output_file_name = VrpDiff.get_diff_filename_from_summary_filename('20250720T100145Z.json', diff_format=diff_format)
+    assert output_file_name == F'20250720T100145Z.vrpdiff.{diff_format}.bz2'
+    VrpDiff.vrp_diff_from_files(
+        old_file_path=tmp_path / '20250720T093135Z.json',
+        new_file_path=tmp_path / '20250720T100145Z.json',
+        output_file_path=tmp_path / output_file_name,
+        realtime_initial=0,
+        streaming=True,
+    )
+    with VrpDiffReader.new_from_path(tmp_path / output_file_name) as reader:
+        assert reader.diff_format == diff_format
+        assert list(reader.iter_diffs()) == [{'verb': 'DELETE', 'old_roa': roas[0]}]
+        assert reader.metadata['diff_count'] == 1
+    result = VrpDiff.generic_entry_point_import(es_endpoint=None, src_local_path=tmp_path / output_file_name,
+                                                dry_run=True)
+    assert result['records_would_insert'] == 1
@@ -0,0 +1,122 @@
+"""
+Tests for VrpDiffWriter and VrpDiffNdjsonWriter, which write diff files one diff at a time.
+"""
+import io
+import json
+import random
+
+import pytest
+
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_diff_writer import VrpDiffNdjsonWriter, VrpDiffWriter
+
+METADATA = {'diff_count': 3, 'vrp_cache_old': {'filename': 'old.json'}}
+
+
+class UnclosableStringIO(io.StringIO):
+    def close(self):
+        pass
+
+
+def legacy_output(metadata: dict, diffs: list) -> str:
+    """
+    The document vrp_diff_from_files wrote before VrpDiffWriter existed.
+    """
+    retstr = (
+        F'{{\n'
+        F'"object_type": "rpkilog_vrp_cache_diff_set",\n'
+        F'"metadata": {json.dumps(metadata, indent=4, sort_keys=True)},\n'
+        F'"vrp_diffs": [\n'
+    )
+    for idx in range(len(diffs)):
+        separator = ',\n' if idx < len(diffs) - 1 else '\n'
+        retstr += '    ' + diffs[idx].as_json_str() + separator
+    retstr += ']\n}\n'
+    return retstr
+
+
+@pytest.mark.parametrize('diff_count', [0, 1, 3])
+@pytest.mark.parametrize('write_batch_size', [1, 2, 1024])
+def test_header_matches_legacy_output(monkeypatch, diff_objs, diff_count, write_batch_size):
+    monkeypatch.setattr(VrpDiffWriter, 'write_batch_size', write_batch_size)
+    diffs = diff_objs()[:diff_count]
+    output_file = UnclosableStringIO()
+    writer = VrpDiffWriter(output_file, metadata=METADATA)
+    writer.write_all(diffs)
+    writer.close()
+    assert output_file.getvalue() == legacy_output(METADATA, diffs)
+
+
+@pytest.mark.parametrize('diff_count', [0, 1, 3])
+def test_trailer(diff_objs, diff_count):
+    diffs = diff_objs()[:diff_count]
+    output_file = UnclosableStringIO()
+    writer = VrpDiffWriter(output_file)
+    assert writer.write_all(iter(diffs)) == diff_count
+    writer.close(metadata={'diff_count': writer.diff_count})
+    output_data = json.loads(output_file.getvalue())
+    header_data = json.loads(legacy_output({'diff_count': diff_count}, diffs))
+    assert output_data == header_data
+    assert list(output_data) == ['object_type', 'vrp_diffs', 'metadata']
+
+
+def test_metadata_given_twice_or_never():
+    writer = VrpDiffWriter(UnclosableStringIO(), metadata=METADATA)
+    with pytest.raises(ValueError):
+        writer.close(metadata=METADATA)
+    writer = VrpDiffWriter(UnclosableStringIO())
+    with pytest.raises(ValueError):
+        writer.close()
+
+
+def test_large_random_diff():
+    rng = random.Random(0)
+    old_roas = [
+        {'asn': rng.randrange(64496, 64512), 'prefix': F'10.{i >> 8}.{i & 0xff}.0/24', 'maxLength': 24, 'ta': 'test'}
+        for i in range(5000)
+    ]
+    new_roas = [r for r in old_roas if rng.random() < 0.9]
+    diffs = VrpDiff.vrp_diff_list(old_roas=old_roas, new_roas=new_roas)
+    output_file = UnclosableStringIO()
+    writer = VrpDiffWriter(output_file)
+    writer.write_all(VrpDiff.vrp_diff_list_iter(old_roas=old_roas, new_roas=new_roas))
+    writer.close(metadata={'diff_count': writer.diff_count})
+    output_data = json.loads(output_file.getvalue())
+    assert output_data['metadata']['diff_count'] == len(diffs)
+    assert output_data['vrp_diffs'] == [json.loads(d.as_json_str()) for d in diffs]
+
+
+@pytest.mark.parametrize('diff_count', [0, 1, 3])
+def test_ndjson_header(diff_objs, diff_count):
+    diffs = diff_objs()[:diff_count]
+    output_file = UnclosableStringIO()
+    writer = VrpDiffNdjsonWriter(output_file, metadata=METADATA)
+    writer.write_all(diffs)
+    writer.close()
+    lines = output_file.getvalue().splitlines()
+    assert json.loads(lines[0]) == {'object_type': 'rpkilog_vrp_cache_diff_set', 'metadata': METADATA}
+    assert [json.loads(line) for line in lines[1:]] == [json.loads(d.as_json_str()) for d in diffs]
+
+
+@pytest.mark.parametrize('diff_count', [0, 3])
+def test_ndjson_trailer(diff_objs, diff_count):
+    diffs = diff_objs()[:diff_count]
+    output_file = UnclosableStringIO()
+    writer = VrpDiffNdjsonWriter(output_file)
+    writer.write_all(diffs)
+    writer.close(metadata={'diff_count': writer.diff_count})
+    lines = output_file.getvalue().splitlines()
+    assert json.loads(lines[0]) == {'object_type': 'rpkilog_vrp_cache_diff_set'}
+    assert [json.loads(line) for line in lines[1:-1]] == [json.loads(d.as_json_str()) for d in diffs]
+    assert json.loads(lines[-1]) == {'metadata': {'diff_count': diff_count}}
+
+
+@pytest.mark.parametrize('writer_class', [VrpDiffWriter, VrpDiffNdjsonWriter])
+@pytest.mark.parametrize('diff_count', [0, 1, 3])
+def test_serialize_matches_writer(writer_class, diff_objs, diff_count):
+    diffs = diff_objs()[:diff_count]
+    output_file = UnclosableStringIO()
+    writer = writer_class(output_file, metadata=METADATA)
+    writer.write_all(diffs)
+    writer.close()
+    assert writer_class.serialize_header(METADATA) + writer_class.serialize_body(diffs) == output_file.getvalue()
@@ -0,0 +1,148 @@
+"""
+Tests for VrpHistory, which rebuilds past VRP sets from .rpkisnap keyframes plus diff files.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+from pathlib import Path
+
+import pytest
+
+from rpkilog.diff_format import DiffFormat
+from rpkilog.roa_table import RoaTable
+from rpkilog.rpkisnap import rpkisnap_from_json
+from rpkilog.vrp_diff import VrpDiff
+from rpkilog.vrp_history import VrpHistory
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent.parent.parent / 'test_data'
+SNAPSHOT_DATETIMES = ['20250720T000000Z', '20250720T060000Z', '20250720T120000Z', '20250721T000000Z']
+
+
+def roa(asn: int, prefix: str, expires: int = 1000, ta: str = 'test') -> dict:
+    return {'asn': asn, 'prefix': prefix, 'maxLength': int(prefix.split('/')[1]), 'ta': ta, 'expires': expires}
+
+
+def snapshot_roas() -> list[list[dict]]:
+    first = [roa(64496, '192.0.2.0/24'), roa(64497, '198.51.100.0/24'), roa(64498, '2001:db8::/32'),
+             roa(64498, '2001:db8::/32', expires=2000)]
+    second = first[:2] + [roa(64498, '2001:db8::/32', expires=3000), roa(64499, '203.0.113.0/24', ta='other')]
+    third = [roa(64496, '192.0.2.0/24', expires=5000)] + second[1:]
+    fourth = third + [roa(64500, '10.0.0.0/8', ta='aaa')]
+    return [first, second, third, fourth]
+
+
+@pytest.fixture
+def history_dirs(tmp_path) -> tuple[Path, Path, Path]:
+    """
+    Four summaries in tmp_path/summaries, the three diffs between them (alternating DiffFormat) in tmp_path/diffs,
+    and an empty tmp_path/keyframes.
+    """
+    for dirname in ('summaries', 'diffs', 'keyframes'):
+        (tmp_path / dirname).mkdir()
+    summary_paths = []
+    for datestr, roas in zip(SNAPSHOT_DATETIMES, snapshot_roas()):
+        summary_paths.append(tmp_path / 'summaries' / F'{datestr}.json')
+        with open(summary_paths[-1], 'w') as fh:
+            json.dump({'metadata': {'buildtime': datestr}, 'roas': roas}, fh)
+    for step, (old_path, new_path) in enumerate(zip(summary_paths, summary_paths[1:])):
+        diff_format = list(DiffFormat)[step % 2]
+        VrpDiff.vrp_diff_from_files(
+            old_file_path=old_path,
+            new_file_path=new_path,
+            output_file_path=tmp_path / 'diffs' / VrpDiff.get_diff_filename_from_summary_filename(
+                new_path.name,
+                diff_format=diff_format,
+            ),
+            realtime_initial=0,
+            streaming=bool(step % 2),
+        )
+    return tmp_path / 'summaries', tmp_path / 'diffs', tmp_path / 'keyframes'
+
+
+def add_keyframe(summary_dir: Path, keyframe_dir: Path, datestr: str):
+    rpkisnap_from_json(summary_dir / F'{datestr}.json', keyframe_dir / F'{datestr}.rpkisnap')
+
+
+def table_rows(table: RoaTable) -> list[str]:
+    return [roa.as_json_str() for roa in table]
+
+
+def expected_rows(summary_dir: Path, datestr: str) -> list[str]:
+    return table_rows(RoaTable.new_from_file(summary_dir / F'{datestr}.json').sorted())
+
+
+@pytest.mark.parametrize('keyframe_datestr', [SNAPSHOT_DATETIMES[0], SNAPSHOT_DATETIMES[-1]])
+def test_vrp_set_at(history_dirs, keyframe_datestr):
+    summary_dir, diff_dir, keyframe_dir = history_dirs
+    add_keyframe(summary_dir, keyframe_dir, keyframe_datestr)
+    history = VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir)
+    for datestr in SNAPSHOT_DATETIMES:
+        snapshot_datetime = datetime.strptime(datestr, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        # exactly at a snapshot, and just before the next one
+        for when in (snapshot_datetime, snapshot_datetime + timedelta(minutes=59)):
+            table = history.vrp_set_at(when)
+            assert table_rows(table) == expected_rows(summary_dir, datestr)
+            assert table.metadata == {'buildtime': datestr}
+
+
+def test_vrp_set_before_history(history_dirs):
+    summary_dir, diff_dir, keyframe_dir = history_dirs
+    add_keyframe(summary_dir, keyframe_dir, SNAPSHOT_DATETIMES[-1])
+    history = VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir)
+    with pytest.raises(ValueError):
+        history.vrp_set_at(datetime(2025, 7, 19, tzinfo=timezone.utc))
+
+
+def test_missing_diff(history_dirs):
+    summary_dir, diff_dir, keyframe_dir = history_dirs
+    add_keyframe(summary_dir, keyframe_dir, SNAPSHOT_DATETIMES[0])
+    VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir).diffs()[1][1].unlink()
+    history = VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir)
+    with pytest.raises(ValueError, match='a diff is missing'):
+        history.vrp_set_at(datetime(2025, 7, 21, tzinfo=timezone.utc))
+
+
+def test_build_keyframes(history_dirs):
+    summary_dir, diff_dir, keyframe_dir = history_dirs
+    add_keyframe(summary_dir, keyframe_dir, SNAPSHOT_DATETIMES[0])
+    history = VrpHistory(keyframe_dir=keyframe_dir, diff_dir=diff_dir)
+    written = history.build_keyframes(interval=timedelta(hours=12))
+    assert [path.name for path in written] == ['20250720T120000Z.rpkisnap', '20250721T000000Z.rpkisnap']
+    assert history.build_keyframes(interval=timedelta(hours=12)) == []
+    assert [path.name for _, path in history.keyframes()] == [F'{datestr}.rpkisnap' for datestr in
+                                                              [SNAPSHOT_DATETIMES[0]] + SNAPSHOT_DATETIMES[2:]]
+    for datestr in SNAPSHOT_DATETIMES[2:]:
+        add_keyframe(summary_dir, summary_dir, datestr)
+        assert (keyframe_dir / F'{datestr}.rpkisnap').read_bytes() == (summary_dir / F'{datestr}.rpkisnap').read_bytes()
+
+
+def test_apply_changes_missing_record():
+    table = RoaTable.new_from_rpkiclient_batches([[roa(64496, '192.0.2.0/24')]])
+    removed = RoaTable.new_from_rpkiclient_batches([[roa(64496, '192.0.2.0/24', expires=2000)]])
+    with pytest.raises(ValueError, match='not present'):
+        VrpHistory.apply_changes(table, removed=removed, added=RoaTable.new_from_rpkiclient_batches([]))
+
+
+@pytest.mark.slow
+def test_vrp_set_at_golden(tmp_path):
+    """
+    Rebuild each golden summary from a keyframe of the other one plus the golden diff.
+    """
+    (tmp_path / 'keyframes').mkdir()
+    (tmp_path / 'diffs').mkdir()
+    (tmp_path / 'diffs' / '20250720T100145Z.vrpdiff.json.bz2').symlink_to(
+        TEST_DATA_DIR / 'rpkiclient_vrpdiff_20250720T100145Z.json.bz2'
+    )
+    history = VrpHistory(keyframe_dir=tmp_path / 'keyframes', diff_dir=tmp_path / 'diffs')
+    for keyframe_datestr, rebuilt_datestr in [('20250720T093135Z', '20250720T100145Z'),
+                                              ('20250720T100145Z', '20250720T093135Z')]:
+        summary_path = TEST_DATA_DIR / F'rpkiclient_summary_{rebuilt_datestr}.json.bz2'
+        for keyframe in (tmp_path / 'keyframes').iterdir():
+            keyframe.unlink()
+        rpkisnap_from_json(TEST_DATA_DIR / F'rpkiclient_summary_{keyframe_datestr}.json.bz2',
+                           tmp_path / 'keyframes' / F'{keyframe_datestr}.rpkisnap')
+        table = history.vrp_set_at(datetime.strptime(rebuilt_datestr, '%Y%m%dT%H%M%SZ'))
+        expected = RoaTable.new_from_file(summary_path).sorted()
+        assert table.metadata == expected.metadata
+        assert table.ta_names == expected.ta_names
+        for cname in RoaTable.column_dtypes:
+            assert (getattr(table, cname) == getattr(expected, cname)).all()